@@ -0,0 +1,290 @@
+"""
+JSON HTTP API for the conversion math, mounted next to the Shiny app under /api.
+
+    POST /api/schedule   one household: curves, recommendation and additional tax
+    POST /api/batch      {"households": [...], "amounts": [...]}: the same for many households
+    POST /api/admin/reload   reload bracket data, with the X-Admin-Token header set to IRACONVERT_ADMIN_TOKEN
+
+A reload changes the process that handles it. When the bracket file is watched, the endpoint
+also touches it so every other worker process reloads too, so run multi worker deployments
+with IRACONVERT_BRACKETS_WATCH=1.
+
+Concurrent single household requests are collected for a few milliseconds and
+evaluated together, sharing schedules between identical households and computing
+additional tax for every household with the same brackets in one vectorized call.
+"""
+import asyncio
+import hmac
+import os
+from dataclasses import dataclass, field
+from typing import Optional, Tuple
+
+import numpy as np
+import orjson
+from starlette.applications import Starlette
+from starlette.concurrency import run_in_threadpool
+from starlette.exceptions import HTTPException
+from starlette.responses import JSONResponse
+from starlette.routing import Route
+
+import approx_cache
+import bracket_data
+import serialization
+import summary
+import taxes
+import vector_taxes
+
+MAX_BODY_BYTES = 1024 * 1024
+MAX_HOUSEHOLDS = 1000
+MAX_AMOUNTS = 200
+BATCH_WINDOW_SECONDS = 0.005
+MAX_MICRO_BATCH = 256
+
+
+class ORJSONResponse(JSONResponse):
+    def render(self, content):
+        return orjson.dumps(content, option=orjson.OPT_SERIALIZE_NUMPY)
+
+
+@dataclass(frozen=True)
+class Household:
+    pretax_income: float
+    assets: float
+    longterm_gains: float = 0.0
+    capital_income: float = 0.0
+    year: int = 2024
+    status: str = 'married'
+    state: str = 'CA'
+    deduction: Optional[float] = None
+    future_rate: float = .35
+    surcharges: Tuple[str, ...] = ()
+    amounts: Tuple[float, ...] = field(default=(), compare=False)
+
+    def schedule_args(self):
+        return (self.pretax_income, self.assets, self.longterm_gains, self.capital_income,
+                self.year, self.status, self.state, self.deduction, self.surcharges)
+
+    def bracket_key(self):
+        return (self.year, self.status, self.state, self.deduction)
+
+
+NUMBER_FIELDS = ['pretax_income', 'assets', 'longterm_gains', 'capital_income', 'future_rate']
+# states with brackets, and the ways to ask for no state tax
+KNOWN_STATES = [*taxes.STATE_BRACKETS, 'none', None]
+
+
+def parse_household(data, amounts=()):
+    if not isinstance(data, dict):
+        raise ValueError("A household must be an object")
+    unknown = set(data) - set(Household.__dataclass_fields__)
+    if unknown:
+        raise ValueError(f"Unknown fields {sorted(unknown)}")
+    for name in ['pretax_income', 'assets']:
+        if name not in data:
+            raise ValueError(f"Missing field {name}")
+    values = dict(data)
+    for name in NUMBER_FIELDS:
+        if name in values and (not isinstance(values[name], (int, float)) or isinstance(values[name], bool)):
+            raise ValueError(f"{name} must be a number")
+    if values.get('deduction') is not None and not isinstance(values['deduction'], (int, float)):
+        raise ValueError("deduction must be a number")
+    year = values.get('year', 2024)
+    if year not in taxes.FEDERAL_BRACKETS:
+        raise ValueError(f"No brackets for year {year}")
+    if values.get('status', 'married') not in taxes.STANDARD_DEDUCTIONS[year]:
+        raise ValueError(f"Unknown filing status {values.get('status')}")
+    if values.get('state', 'CA') not in KNOWN_STATES:
+        raise ValueError(f"Unknown state {values.get('state')}")
+    if values['assets'] < 0:
+        raise ValueError("assets must not be negative")
+    values['surcharges'] = tuple(values.get('surcharges', ()))
+    for name in values['surcharges']:
+        if name not in taxes.SURCHARGES:
+            raise ValueError(f"Unknown surcharge {name}")
+    values['amounts'] = tuple(float(amount) for amount in (values.get('amounts') or amounts))
+    if len(values['amounts']) > MAX_AMOUNTS:
+        raise ValueError(f"At most {MAX_AMOUNTS} amounts per household")
+    return Household(**values)
+
+
+def _curve_json(curve):
+    return {name: values.tolist() for name, values in serialization.curve_columns(curve).items()}
+
+
+def _additional_taxes(households, schedules):
+    """Additional tax at each household's amounts, vectorized over households that share brackets."""
+    results = [None] * len(households)
+    groups = {}
+    for idx, household in enumerate(households):
+        amounts = household.amounts or (household.assets,)
+        if household.surcharges:
+            # surcharges are not part of the vectorized engine, the schedule's composed tax function covers them
+            results[idx] = schedules[household.schedule_args()].additional_taxes(amounts).tolist()
+        else:
+            groups.setdefault((household.bracket_key(), len(amounts)), []).append(idx)
+
+    for ((year, status, state, custom_deduction), width), indices in groups.items():
+        brackets = taxes.raw_tax_brackets(year, status, state)
+        deduction = custom_deduction if custom_deduction is not None else taxes.deduction(status, year)
+        column = lambda name: np.array([getattr(households[idx], name) for idx in indices], dtype=float)[:, np.newaxis]
+        amounts = np.array([households[idx].amounts or (households[idx].assets,) for idx in indices], dtype=float)
+        args = (column('pretax_income'), column('capital_income'), column('longterm_gains'),
+                brackets['federal'], brackets['state'], brackets['nit'], brackets['longterm'], deduction, 0)
+        additional = (vector_taxes.total_tax(vector_taxes.schedule_taxes(*args, amounts))
+                      - vector_taxes.total_tax(vector_taxes.schedule_taxes(*args, 0.0)))
+        for row, idx in enumerate(indices):
+            results[idx] = additional[row].tolist()
+    return results
+
+
+def evaluate(households, include_curves=True):
+    # identical households share one schedule
+    schedules = {}
+    for household in households:
+        key = household.schedule_args()
+        if key not in schedules:
+            schedules[key] = approx_cache.schedule(*key)
+
+    additional_taxes = _additional_taxes(households, schedules)
+    results = []
+    for household, additional_tax in zip(households, additional_taxes):
+        schedule_ = schedules[household.schedule_args()]
+        result = {
+            'recommendation': summary.explain(schedule_, schedule_.max_conversion_amount, household.future_rate),
+            'amounts': list(household.amounts or (household.assets,)),
+            'additional_tax': additional_tax,
+        }
+        if include_curves:
+            result['curves'] = {
+                'income_only_curve': _curve_json(schedule_.income_only_curve),
+                'capital_taxes': _curve_json(schedule_.capital_taxes),
+                'entire_curve': _curve_json(schedule_.entire_curve),
+            }
+        results.append(result)
+    return results
+
+
+class MicroBatcher:
+    """Collect concurrent submissions for a short window and evaluate them in one call."""
+    def __init__(self, evaluate, window=BATCH_WINDOW_SECONDS, max_batch=MAX_MICRO_BATCH):
+        self.evaluate = evaluate
+        self.window = window
+        self.max_batch = max_batch
+        self._pending = []
+        self._timer = None
+        self.batches = 0
+
+    async def submit(self, item):
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((item, future))
+        if len(self._pending) >= self.max_batch:
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.window, self._flush)
+        return await future
+
+    def _flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        pending, self._pending = self._pending, []
+        if pending:
+            asyncio.get_running_loop().create_task(self._run(pending))
+
+    async def _run(self, pending):
+        self.batches += 1
+        try:
+            results = await run_in_threadpool(self.evaluate, [item for item, future in pending])
+        except Exception:
+            # one bad item must not fail the others that shared its batch, evaluate them one at a time
+            for item, future in pending:
+                try:
+                    result, = await run_in_threadpool(self.evaluate, [item])
+                except Exception as e:
+                    if not future.done():
+                        future.set_exception(e)
+                else:
+                    if not future.done():
+                        future.set_result(result)
+            return
+        for (item, future), result in zip(pending, results):
+            if not future.done():
+                future.set_result(result)
+
+
+batcher = MicroBatcher(evaluate)
+
+
+async def read_json(request):
+    length = request.headers.get('content-length')
+    if length is not None and not length.isdigit():
+        raise HTTPException(400, "Invalid Content-Length header")
+    if length is not None and int(length) > MAX_BODY_BYTES:
+        raise HTTPException(413, f"Request body is larger than {MAX_BODY_BYTES} bytes")
+    body = bytearray()
+    async for chunk in request.stream():
+        body.extend(chunk)
+        if len(body) > MAX_BODY_BYTES:
+            raise HTTPException(413, f"Request body is larger than {MAX_BODY_BYTES} bytes")
+    try:
+        return orjson.loads(body)
+    except orjson.JSONDecodeError as e:
+        raise HTTPException(400, f"Invalid JSON: {e}")
+
+
+async def schedule_endpoint(request):
+    data = await read_json(request)
+    try:
+        household = parse_household(data)
+    except (TypeError, ValueError) as e:
+        raise HTTPException(400, str(e))
+    return ORJSONResponse(await batcher.submit(household))
+
+
+async def batch_endpoint(request):
+    data = await read_json(request)
+    if not isinstance(data, dict) or not isinstance(data.get('households'), list):
+        raise HTTPException(400, "Expected an object with a list of households")
+    if len(data['households']) > MAX_HOUSEHOLDS:
+        raise HTTPException(413, f"At most {MAX_HOUSEHOLDS} households per request")
+    try:
+        households = [parse_household(household, data.get('amounts') or ()) for household in data['households']]
+    except (TypeError, ValueError) as e:
+        raise HTTPException(400, str(e))
+    results = await run_in_threadpool(evaluate, households, bool(data.get('include_curves', True)))
+    return ORJSONResponse({'results': results})
+
+
+async def reload_endpoint(request):
+    token = os.environ.get('IRACONVERT_ADMIN_TOKEN')
+    # without a token configured the endpoint does not exist
+    if not token:
+        raise HTTPException(404, "Not Found")
+    if not hmac.compare_digest(request.headers.get('x-admin-token', ''), token):
+        raise HTTPException(403, "Invalid admin token")
+    path = os.environ.get('IRACONVERT_BRACKETS_PATH')
+    try:
+        changed = await run_in_threadpool(bracket_data.reload, path)
+        # the other workers only see the file, their watchers reload when it is touched
+        broadcast = bracket_data.WATCHER is not None
+        if broadcast:
+            bracket_data.broadcast(bracket_data.WATCHER.path)
+    except (OSError, ValueError, TypeError) as e:
+        raise HTTPException(500, f"Could not reload bracket data: {e}")
+    return ORJSONResponse({'version': taxes.data_version(), 'changed': [{'year': year, 'state': state} for year, state in changed],
+                           'broadcast': broadcast})
+
+
+async def http_exception(request, exc):
+    return ORJSONResponse({'error': exc.detail}, status_code=exc.status_code)
+
+
+app = Starlette(
+    routes=[
+        Route('/schedule', schedule_endpoint, methods=['POST']),
+        Route('/batch', batch_endpoint, methods=['POST']),
+        Route('/admin/reload', reload_endpoint, methods=['POST']),
+    ],
+    exception_handlers={HTTPException: http_exception},
+)
@@ -1,11 +1,21 @@
-from shiny import App, render, ui, reactive
+from shiny import App, render, ui, reactive, req
+from shiny.types import SilentException
 from shinywidgets import render_plotly, output_widget
+from starlette.applications import Starlette
+from starlette.routing import Mount
 
 import myui.input_text_with_tooltip as uix
+import myui.numeric_grid as grid
 
-import taxes
 import graph
 import summary
+import sessions
+import api
+import approx_cache
+import regimes
+import harvest
+import breakeven
+import snapshots
 
 from shared import dollarize, remove_dollar_formatting, clean_df
 
@@ -31,6 +41,7 @@ app_ui = ui.page_sidebar(
         uix.input_text_with_tooltip("pretax_income", label="Wage Income", value="$100,000", tooltip="Wage income after adjustments eg 1040 box 1"),
         uix.input_text_with_tooltip("capital_income", label="Ordinary Capital Income", tooltip="Ordinary dividends and short term capital gains", value="$40,000"),
         uix.input_text_with_tooltip("longterm_gains", label="Qualified Capital Gains", value="$20,000", tooltip="Qualified dividends and longterm capital gains"),
+        uix.input_text_with_tooltip("unrealized_gains", label="Unrealized Capital Gains", value="$0", tooltip="Longterm gains you could sell this year to harvest at the 0% rate"),
         ui.input_select("tax_year", "Tax Year", {"2024": 2024, "2025": 2025}),
         ui.input_radio_buttons(
             "filing_status",
@@ -71,6 +82,8 @@ app_ui = ui.page_sidebar(
             ui.markdown("Enter custom state brackets in the bottom panel"),
         ),
         ui.input_numeric("future_tax_rate", "Expected future tax rate", 35, min=0, max=100),
+        ui.input_checkbox("compare_regimes", "Compare with TCJA sunset", value=False),
+        ui.input_checkbox("show_breakeven", "Break-even years", value=False),
     ),
     ui.layout_columns(
         output_widget("taxburden", height='500px'),
@@ -78,21 +91,41 @@ app_ui = ui.page_sidebar(
             ui.card_header("Analysis/Recommendation"),
             ui.output_text("text"),
             ui.output_text("text2"),
-            ui.output_text("text3")
+            ui.output_text("text3"),
+            ui.output_text("harvest_plan")
         ),
-        ui.output_data_frame("table"),
+        grid.numeric_grid("table"),
         col_widths={'md':(12, 3, 9), 'sm':(12, 12, 12) }
     ),
+    ui.panel_conditional(
+        "input.compare_regimes",
+        ui.layout_columns(
+            output_widget("regimes_plot", height='500px'),
+            grid.numeric_grid("regimes_table"),
+            col_widths={'md': (12, 12), 'sm': (12, 12)}
+        ),
+    ),
+    ui.panel_conditional(
+        "input.show_breakeven",
+        ui.layout_columns(
+            output_widget("breakeven_plot", height='500px'),
+            grid.numeric_grid("breakeven_table"),
+            col_widths={'md': (12, 12), 'sm': (12, 12)}
+        ),
+    ),
     title="After Tax Calculator",
 )
 
-DOLLARIZE_TERMS = ["pretax_income", "capital_income", "longterm_gains", "deduction", "assets"]
+DOLLARIZE_TERMS = ["pretax_income", "capital_income", "longterm_gains", "deduction", "assets", "unrealized_gains"]
 
 
     #session.send_input_message(term, numer)
 
 
 def server(input, output, session):
+    session_state = sessions.REGISTRY.register(session.id)
+    session.on_ended(lambda: sessions.REGISTRY.unregister(session.id))
+
     @reactive.effect
     def format_inputs():
 
@@ -121,20 +154,34 @@ def server(input, output, session):
         return float(input.window_width())
 
     @reactive.calc
-    def schedule():
+    def schedule_inputs():
         amounts = {term: remove_dollar_formatting(input[term]()) for term in DOLLARIZE_TERMS}
         filing_status = input.filing_status()
         tax_year = int(input.tax_year())
         custom_deduction = amounts['deduction'] if input.custom_deduction() else None
         state = input.state_tax_bracket()
 
-        return taxes.schedule(amounts['pretax_income'], amounts['assets'], amounts['longterm_gains'], amounts['capital_income'], tax_year, filing_status, state, custom_deduction)
+        return (amounts['pretax_income'], amounts['assets'], amounts['longterm_gains'], amounts['capital_income'], tax_year, filing_status, state, custom_deduction)
+
+    def artifact_key():
+        # reloaded bracket data for this year and state changes the key, other reloads leave the artifacts valid
+        return snapshots.artifact_key(schedule_inputs())
+
+    # large artifacts live in the session state so they can be evicted when the session is idle
+    def schedule():
+        inputs = schedule_inputs()
+        # while typing only one input changes at a time, so derive from the previous schedule when possible
+        key = artifact_key()
+        return session_state.get('schedule', key, lambda: snapshots.get('schedule', key, lambda: approx_cache.schedule(*inputs, previous=session_state.previous('schedule'))))
+
+    # moving the future rate only looks up the precomputed recommendations
+    def recommendations():
+        key = artifact_key()
+        return session_state.get('recommendations', key, lambda: snapshots.get('recommendations', key, lambda: snapshots.recommendations(schedule())))
 
     @reactive.calc
     def generate_text():
-        future_rate = input.future_tax_rate() / 100
-        schedule_ = schedule()
-        return summary.explain(schedule_, schedule_.max_conversion_amount, future_rate)
+        return recommendations().explain(future_rate())
 
     @render.text
     def text():
@@ -160,14 +207,33 @@ def server(input, output, session):
         else:
             return ''
 
-    @render.data_frame
-    def table():
-        schedule_ = schedule()
-        df = summary.table2(schedule_.entire_curve, schedule_.pretax_wage_income, schedule_.initial_tax)
+    TABLE_PAGE_SIZE = 25
 
-        df = df[["Conversion Amount", "Additional Tax", "Marginal Tax Rate", "Capital Gains Rate", "Net Investment Tax Rate"]]
+    def grid_input(name, default):
+        # the grid only sets its inputs once the user pages or sorts
+        try:
+            return input[name]()
+        except SilentException:
+            return default
 
-        return df
+    @reactive.effect
+    async def table():
+        key = artifact_key()
+        df = session_state.get('table', key, lambda: snapshots.get('table', key, lambda: snapshots.table(schedule())))
+        sort = grid_input('table_sort', None) or {}
+        page = summary.paginate(df, grid_input('table_page', 0), TABLE_PAGE_SIZE, sort.get('column'), sort.get('descending', False))
+        await session.send_custom_message('numeric_grid', grid.grid_message('table', page))
+
+    @render.text
+    def harvest_plan():
+        unrealized_gains = remove_dollar_formatting(input.unrealized_gains())
+        if unrealized_gains <= 0:
+            return ''
+        base_income, assets, longterm_gains, capital_income, year, status, state, custom_deduction = schedule_inputs()
+        plan = harvest.optimize(harvest.Household(base_income, assets, unrealized_gains, longterm_gains, capital_income, year, status, state,
+                                                  future_rate(), deduction=custom_deduction))
+        return (f"Converting ${plan.conversion:,.0f} and harvesting ${plan.harvest:,.0f} of gains together "
+                f"costs ${plan.additional_tax:,.0f} now and is worth ${plan.value:,.0f} after future taxes")
 
     @reactive.calc
     def future_rate():
@@ -176,13 +242,60 @@ def server(input, output, session):
 
     @render_plotly
     def taxburden():
-        schedule_ = schedule()
-        plot = graph.plot_tax_brackets(schedule_.pretax_wage_income, schedule_.qualified_capital_income, schedule_.ordinary_capital_income, schedule_.income_only_curve, schedule_.capital_taxes, future_rate(), schedule_.max_conversion_amount)
+        key = (artifact_key(), future_rate())
+        # a copy of the snapshot, the legend below is set on it
+        plot = session_state.get('figure', key, lambda: snapshots.get('figure', key, lambda: snapshots.figure(schedule(), future_rate())))
 
-        if size() in ('xs', 'sm'):
-            plot.update_layout(showlegend=False)
+        # the figure is cached across renders so set the legend both ways
+        plot.update_layout(showlegend=size() not in ('xs', 'sm'))
         # elapsed time
         return plot  #.update_layout(autosize=True, height=Noneb, width=None).update_traces(marker=dict(size=10))  # Ensure it adapts dynamically
 
+    @reactive.calc
+    def regime_comparison():
+        base_income, assets, longterm_gains, capital_income, year, status, state, custom_deduction = schedule_inputs()
+        return regimes.compare(regimes.default_regimes(year), base_income, assets, longterm_gains, capital_income,
+                               status, state, future_rate(), custom_deduction)
+
+    @render_plotly
+    def regimes_plot():
+        req(input.compare_regimes())
+        return graph.plot_regime_comparison(regime_comparison(), future_rate())
+
+    @reactive.effect
+    async def regimes_table():
+        req(input.compare_regimes())
+        df = regimes.recommendation_table(regime_comparison())
+        page = summary.paginate(df, 0, len(df))
+        await session.send_custom_message('numeric_grid', grid.grid_message('regimes_table', page))
+
+    # closed form over every growth rate and the future rates around the input, recomputed when either changes
+    @reactive.calc
+    def breakeven_grid():
+        return breakeven.grid(schedule(), future_rates=breakeven.future_rates_around(future_rate()))
+
+    @render_plotly
+    def breakeven_plot():
+        req(input.show_breakeven())
+        grid_ = breakeven_grid()
+        # the plot opens on the future rate the user entered
+        return graph.plot_breakeven(grid_, int(abs(grid_.future_rates - future_rate()).argmin()))
+
+    @reactive.effect
+    async def breakeven_table():
+        req(input.show_breakeven())
+        df = breakeven.table(breakeven_grid())
+        sort = grid_input('breakeven_table_sort', None) or {}
+        page = summary.paginate(df, grid_input('breakeven_table_page', 0), TABLE_PAGE_SIZE, sort.get('column'), sort.get('descending', False))
+        await session.send_custom_message('numeric_grid', grid.grid_message('breakeven_table', page))
+
+# new sessions on the default inputs are served from snapshots computed once at startup
+snapshots.start()
+# idle sessions are evicted even while no session is computing
+sessions.REGISTRY.start_sweeper()
 
-app = App(app_ui, server)
+# the JSON API is served next to the Shiny app
+app = Starlette(routes=[
+    Mount('/api', app=api.app),
+    Mount('/', app=App(app_ui, server)),
+])
@@ -0,0 +1,173 @@
+"""
+Schedules for arbitrary wages and assets cut out of one schedule per wage and asset bucket.
+
+Exact key caching rarely hits since users type any dollar amount. Every income and surcharge
+moves with the wage though, so the curves of wage w are the curves of the bucket's lower edge
+w0 = floor(w / bucket) * bucket moved left by w - w0, and a curve up to any max_convert is a
+prefix of a longer one. Each bucket computes one anchor schedule at w0 reaching the asset
+bucket's upper edge plus the wage bucket, and every wage and max_convert inside the bucket is
+cut out of it with TaxSchedule.shifted. A bucket with a keypoint inside its first bucket dollars,
+where the cut at the bottom lands, falls back to result_cache.schedule for every lookup, and so
+does a lookup whose cut at the top lands within a cent of a keypoint, or whose cliff thresholds
+a fresh schedule would place or evaluate a rounding error differently, so a keypoint never ends up
+a rounding error away from where a fresh schedule would put it.
+
+Enable it by setting IRACONVERT_APPROX_BUCKET to the wage bucket width in dollars, and optionally
+IRACONVERT_APPROX_ASSET_BUCKET, or by calling configure(bucket).
+"""
+import math
+import os
+import threading
+
+import instrumentation
+import result_cache
+import taxes
+
+DEFAULT_BUCKET = 1000.0
+DEFAULT_ASSET_BUCKET = 10000.0
+# a cut closer than this to a keypoint could land on either side of it
+CUT_TOLERANCE = .01
+DEFAULT_MAX_BUCKETS = 4096
+
+# stored for buckets that always fall back
+_FALLBACK = object()
+
+
+def bucket_key(inputs, bucket, asset_bucket=DEFAULT_ASSET_BUCKET):
+    """
+    (lower edge of the wage bucket, upper edge of the max_convert bucket, the other inputs to the
+    cent, their bracket data version).
+    """
+    return (math.floor(float(inputs[0]) / bucket) * bucket, math.ceil(float(inputs[1]) / asset_bucket) * asset_bucket,
+            *result_cache.normalize(inputs[2:]), taxes.data_version(inputs[4], inputs[6]))
+
+
+def has_seam_keypoint(anchor, bucket):
+    # the last upper is the end of the anchor's curve, not a keypoint
+    return any(0 < bracket.upper < bucket for bracket in anchor.entire_curve[:-1])
+
+
+def near_keypoint(anchor, amount):
+    return any(abs(bracket.upper - amount) < CUT_TOLERANCE for bracket in anchor.entire_curve[:-1])
+
+
+def fresh_cliffs(inputs, schedule_):
+    """The cliffs a fresh schedule of inputs places, None when schedule_'s wage is not exactly the requested one."""
+    if schedule_.pretax_wage_income != inputs[0]:
+        return None
+    wage, max_convert, longterm_gains, investment_income, year, status = inputs[:6]
+    surcharges = inputs[8] if len(inputs) > 8 else ()
+    return schedule_.cliffs()[:2] + taxes.surcharge_cliffs(surcharges, wage, longterm_gains, investment_income, year, status)
+
+
+def cliffs_agree(anchor, offset, cliffs, max_conversion_amount):
+    """
+    Whether every cliff threshold crossed below max_conversion_amount sits at the same conversion
+    amount, and is evaluated on the same side of the threshold, as in a fresh schedule with cliffs.
+    A cliff keypoint is the threshold less the income, adding them back can land a rounding error
+    below the threshold, which drops the whole pool into the rate below.
+    """
+    for cut, fresh in zip(anchor.cliffs(), cliffs):
+        for rate, bound in fresh.brackets[:-1]:
+            amount = bound - fresh.income
+            if not 0 <= amount < max_conversion_amount:
+                continue
+            keypoint = bound - cut.income
+            if keypoint - offset != amount or (cut.income + keypoint >= bound) != (fresh.income + amount >= bound):
+                return False
+    return True
+
+
+class ApproxCache:
+    def __init__(self, bucket=DEFAULT_BUCKET, max_buckets=DEFAULT_MAX_BUCKETS, asset_bucket=DEFAULT_ASSET_BUCKET):
+        if bucket <= 0 or asset_bucket <= 0:
+            raise ValueError("The buckets must be wider than 0")
+        self.bucket = bucket
+        self.asset_bucket = asset_bucket
+        self.max_buckets = max_buckets
+        self._lock = threading.Lock()
+        # insertion ordered, the least recently used bucket is first
+        self._anchors = {}
+        self.hits = 0
+        self.misses = 0
+        self.fallbacks = 0
+
+    def _anchor(self, key, inputs):
+        with self._lock:
+            anchor = self._anchors.pop(key, None)
+            if anchor is not None:
+                self._anchors[key] = anchor
+                self.hits += 1
+                return anchor
+            self.misses += 1
+        anchor = taxes.schedule(key[0], key[1] + self.bucket, *inputs[2:])
+        if has_seam_keypoint(anchor, self.bucket):
+            anchor = _FALLBACK
+        with self._lock:
+            self._anchors[key] = anchor
+            while len(self._anchors) > self.max_buckets:
+                del self._anchors[next(iter(self._anchors))]
+        return anchor
+
+    def get_or_compute(self, inputs, compute):
+        """The schedule of inputs cut out of its bucket's anchor, or compute() when the bucket falls back."""
+        key = bucket_key(inputs, self.bucket, self.asset_bucket)
+        anchor = self._anchor(key, inputs)
+        offset = float(inputs[0]) - key[0]
+        if anchor is _FALLBACK or near_keypoint(anchor, inputs[1] + offset):
+            return self._fall_back(compute)
+        schedule_ = anchor.shifted(offset, inputs[1])
+        cliffs = fresh_cliffs(inputs, schedule_)
+        if cliffs is None or not cliffs_agree(anchor, offset, cliffs, inputs[1]):
+            return self._fall_back(compute)
+        return schedule_
+
+    def _fall_back(self, compute):
+        with self._lock:
+            self.fallbacks += 1
+        return compute()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            exact = lookups - self.fallbacks
+            return {
+                "bucket": self.bucket,
+                "asset_bucket": self.asset_bucket,
+                "buckets": len(self._anchors),
+                "fallback_buckets": sum(anchor is _FALLBACK for anchor in self._anchors.values()),
+                "hits": self.hits,
+                "misses": self.misses,
+                "fallbacks": self.fallbacks,
+                # lookups served from an existing anchor
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                # lookups cut out of an anchor rather than computed
+                "shifted_rate": exact / lookups if lookups else 0.0,
+            }
+
+
+CACHE = None
+
+
+def configure(bucket, max_buckets=DEFAULT_MAX_BUCKETS, asset_bucket=DEFAULT_ASSET_BUCKET):
+    global CACHE
+    CACHE = ApproxCache(bucket, max_buckets, asset_bucket) if bucket else None
+    if CACHE is not None:
+        instrumentation.register_probe("approx_cache", CACHE.stats)
+    else:
+        instrumentation.unregister_probe("approx_cache")
+    return CACHE
+
+
+def schedule(*inputs, previous=None):
+    """result_cache.schedule, cut out of its bucket's anchor when the approximate cache is configured."""
+    compute = lambda: result_cache.schedule(*inputs, previous=previous)
+    if CACHE is None:
+        return compute()
+    return CACHE.get_or_compute(inputs, compute)
+
+
+if os.environ.get("IRACONVERT_APPROX_BUCKET"):
+    configure(float(os.environ["IRACONVERT_APPROX_BUCKET"]),
+              int(os.environ.get("IRACONVERT_APPROX_MAX_BUCKETS", DEFAULT_MAX_BUCKETS)),
+              float(os.environ.get("IRACONVERT_APPROX_ASSET_BUCKET", DEFAULT_ASSET_BUCKET)))
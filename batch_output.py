@@ -0,0 +1,238 @@
+"""
+Columnar output for large batch runs, written incrementally and read back with memory maps.
+
+Every column is a raw little endian file that chunks are appended to, so a run holds one
+chunk in memory at a time. manifest.json, written on close, lists the files with their
+dtype and shape. Ragged data such as curves, one variable length run of rows per household,
+is stored as flat value columns plus an offsets column.
+
+    with BatchOutput(directory) as output:
+        write_book(output, households)
+
+    tables = open_output(directory)
+    tables['households']['additional_tax']    # np.memmap, nothing is copied
+    tables['curves'][42]                        # columns of household 42's curve
+"""
+import itertools
+import json
+import os
+from typing import Dict, Iterable, Sequence
+
+import numpy as np
+
+import result_cache
+import serialization
+import vector_taxes
+import taxes
+
+FORMAT_VERSION = 1
+MANIFEST = 'manifest.json'
+DEFAULT_CHUNK_SIZE = 1024
+
+
+class _Column:
+    def __init__(self, directory, filename, dtype, shape=()):
+        self.filename = filename
+        self.dtype = np.dtype(dtype).newbyteorder('<')
+        self.shape = tuple(shape)
+        self.rows = 0
+        self._file = open(os.path.join(directory, filename), 'wb')
+
+    def append(self, values):
+        values = np.ascontiguousarray(values, dtype=self.dtype)
+        if values.shape[1:] != self.shape:
+            raise ValueError(f"{self.filename} expects rows of shape {self.shape}, got {values.shape[1:]}")
+        self._file.write(values.tobytes())
+        self.rows += len(values)
+
+    def close(self):
+        self._file.close()
+
+    def describe(self):
+        return {'file': self.filename, 'dtype': self.dtype.str, 'shape': list(self.shape)}
+
+
+class TableWriter:
+    """Fixed width rows. Columns may hold a vector per row, eg a grid of conversion amounts."""
+    def __init__(self, directory, name, schema):
+        self.name = name
+        self.columns = {column: _Column(directory, f'{name}.{column}.bin', *(spec if isinstance(spec, tuple) else (spec,)))
+                        for column, spec in schema.items()}
+
+    @property
+    def rows(self):
+        return next(iter(self.columns.values())).rows if self.columns else 0
+
+    def append(self, **values):
+        if set(values) != set(self.columns):
+            raise ValueError(f"{self.name} has columns {sorted(self.columns)}, got {sorted(values)}")
+        lengths = {len(value) for value in values.values()}
+        if len(lengths) > 1:
+            raise ValueError(f"Columns of {self.name} have different lengths {sorted(lengths)}")
+        for column, value in values.items():
+            self.columns[column].append(value)
+
+    def close(self):
+        for column in self.columns.values():
+            column.close()
+
+    def describe(self):
+        return {'kind': 'table', 'rows': self.rows, 'columns': {name: column.describe() for name, column in self.columns.items()}}
+
+
+class RaggedWriter:
+    """A variable number of rows per item, stored flat with the offset of every item's first row."""
+    def __init__(self, directory, name, schema):
+        self.name = name
+        self.values = TableWriter(directory, name, schema)
+        self.offsets = _Column(directory, f'{name}.offsets.bin', np.int64)
+        self.offsets.append([0])
+        self._end = 0
+
+    @property
+    def items(self):
+        return self.offsets.rows - 1
+
+    def append(self, items: Sequence[Dict[str, np.ndarray]]):
+        if not items:
+            return
+        lengths = [len(next(iter(item.values()))) for item in items]
+        self.values.append(**{column: np.concatenate([item[column] for item in items]) for column in self.values.columns})
+        self.offsets.append(self._end + np.cumsum(lengths))
+        self._end += sum(lengths)
+
+    def close(self):
+        self.values.close()
+        self.offsets.close()
+
+    def describe(self):
+        description = self.values.describe()
+        description.update(kind='ragged', items=self.items, offsets=self.offsets.describe())
+        return description
+
+
+class BatchOutput:
+    def __init__(self, directory, metadata=None):
+        self.directory = directory
+        self.metadata = metadata or {}
+        self.writers = {}
+        os.makedirs(directory, exist_ok=True)
+
+    def table(self, name, schema):
+        self.writers[name] = TableWriter(self.directory, name, schema)
+        return self.writers[name]
+
+    def ragged(self, name, schema):
+        self.writers[name] = RaggedWriter(self.directory, name, schema)
+        return self.writers[name]
+
+    def close(self, complete=True):
+        """Close every file, and mark the run complete with the manifest unless complete is False."""
+        for writer in self.writers.values():
+            writer.close()
+        if not complete:
+            return
+        manifest = {
+            'format_version': FORMAT_VERSION,
+            'data_version': taxes.data_version(),
+            'metadata': self.metadata,
+            'tables': {name: writer.describe() for name, writer in self.writers.items()},
+        }
+        # the manifest is written last so a directory without one is an incomplete run
+        with open(os.path.join(self.directory, MANIFEST), 'w') as f:
+            json.dump(manifest, f, indent=2)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        # a run that raised is incomplete, its files are closed but it gets no manifest
+        self.close(complete=exc_info[0] is None)
+
+
+def _memmap(directory, description, rows):
+    shape = (rows,) + tuple(description['shape'])
+    if rows == 0:
+        return np.zeros(shape, dtype=description['dtype'])
+    return np.memmap(os.path.join(directory, description['file']), dtype=description['dtype'], mode='r', shape=shape)
+
+
+class RaggedTable:
+    def __init__(self, columns, offsets):
+        self.columns = columns
+        self.offsets = offsets
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, idx):
+        start, end = self.offsets[idx], self.offsets[idx + 1]
+        return {name: values[start:end] for name, values in self.columns.items()}
+
+
+def open_output(directory):
+    """Memory map every table of a finished run, name -> {column: array} or RaggedTable."""
+    with open(os.path.join(directory, MANIFEST)) as f:
+        manifest = json.load(f)
+    if manifest['format_version'] != FORMAT_VERSION:
+        raise ValueError(f"Output has format {manifest['format_version']}, expected {FORMAT_VERSION}")
+    tables = {}
+    for name, description in manifest['tables'].items():
+        if description['kind'] == 'table':
+            tables[name] = {column: _memmap(directory, spec, description['rows']) for column, spec in description['columns'].items()}
+        else:
+            columns = {column: _memmap(directory, spec, description['rows']) for column, spec in description['columns'].items()}
+            tables[name] = RaggedTable(columns, _memmap(directory, description['offsets'], description['items'] + 1))
+    return tables
+
+
+HOUSEHOLD_COLUMNS = ['pretax_income', 'assets', 'longterm_gains', 'capital_income', 'year']
+CURVE_COLUMNS = ['lower', 'upper', 'state_rate', 'federal_rate', 'nit_rate', 'longterm_rate', 'state_amount', 'federal_amount',
+                 'nit_amount', 'longterm_amount']
+
+
+def _chunks(iterable, size):
+    iterator = iter(iterable)
+    while chunk := list(itertools.islice(iterator, size)):
+        yield chunk
+
+
+def write_book(output: BatchOutput, households: Iterable, chunk_size=DEFAULT_CHUNK_SIZE, include_curves=True):
+    """
+    Per household summaries and entire curves for an iterable of api.Household, evaluated
+    chunk_size households at a time.
+    """
+    summaries = output.table('households', {**{column: np.float64 for column in HOUSEHOLD_COLUMNS},
+                                            'tax': np.float64, 'additional_tax': np.float64, 'brackets': np.int32})
+    curves = output.ragged('curves', {column: np.float64 for column in CURVE_COLUMNS}) if include_curves else None
+    for chunk in _chunks(households, chunk_size):
+        schedules = [result_cache.schedule(*household.schedule_args()) for household in chunk]
+        summaries.append(
+            **{column: [getattr(household, column) for household in chunk] for column in HOUSEHOLD_COLUMNS},
+            tax=[schedule.initial_tax.total_tax() for schedule in schedules],
+            additional_tax=[schedule.additional_tax(household.assets) for household, schedule in zip(chunk, schedules)],
+            brackets=[len(schedule.entire_curve) for schedule in schedules])
+        if curves is not None:
+            items = []
+            for schedule in schedules:
+                columns = serialization.curve_columns(schedule.entire_curve)
+                items.append({column: columns[column] for column in CURVE_COLUMNS})
+            curves.append(items)
+    return summaries.rows
+
+
+def write_grid(output: BatchOutput, name, incomes, conversions, year, status, state, custom_deduction=None,
+               chunk_size=DEFAULT_CHUNK_SIZE):
+    """Additional tax of every wage income at every conversion amount, one row per income."""
+    conversions = np.asarray(conversions, dtype=float)
+    grid = output.table(name, {'income': np.float64, 'additional_tax': (np.float64, conversions.shape)})
+    brackets = taxes.raw_tax_brackets(year, status, state)
+    deduction = custom_deduction if custom_deduction is not None else taxes.deduction(status, year)
+    for chunk in _chunks(incomes, chunk_size):
+        income = np.asarray(chunk, dtype=float)[:, np.newaxis]
+        args = (income, 0.0, 0.0, brackets['federal'], brackets['state'], brackets['nit'], brackets['longterm'], deduction, 0)
+        additional = (vector_taxes.total_tax(vector_taxes.schedule_taxes(*args, conversions))
+                      - vector_taxes.total_tax(vector_taxes.schedule_taxes(*args, 0.0)))
+        grid.append(income=income[:, 0], additional_tax=additional)
+    output.metadata.setdefault(name, {})['conversions'] = conversions.tolist()
+    return grid.rows
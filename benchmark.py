@@ -0,0 +1,127 @@
+"""
+Throughput of the tax engines over a synthetic population, and how it scales across cores.
+
+    python population.py 1000000 population.npz
+    python benchmark.py population.npz [households] [workers ...]
+
+Every engine computes the additional tax of converting each household's whole balance. The
+population is split into one contiguous slice per worker process, each worker loads the file
+itself so nothing large is pickled, and times only its engine. A run takes as long as its slowest
+worker. Households per second per core at n workers over the same at one worker is the scaling efficiency.
+"""
+import multiprocessing
+import os
+import tempfile
+import time
+
+import numpy as np
+
+import dense_tables
+import population as population_
+import taxes
+import vector_taxes
+
+
+def schedule_engine(population, start, stop):
+    """taxes.schedule per household, the path the app and the single household API take."""
+    for household in population_.households(population, start, stop):
+        taxes.schedule(*household.schedule_args()).additional_tax(household.assets)
+
+
+def vectorized_engine(population, start, stop, tax_function=None):
+    """vector_taxes over every household with the same brackets at once, like the batch API."""
+    columns = {name: population[name][start:stop] for name in population_.COLUMNS}
+    keys = np.stack([columns['year'].astype(np.int64), columns['status'], columns['state']], axis=1)
+    for year, status, state in np.unique(keys, axis=0):
+        rows = (keys == (year, status, state)).all(axis=1)
+        status_name, state_name = population['statuses'][status], population['states'][state]
+        brackets = taxes.raw_tax_brackets(int(year), status_name, state_name)
+        args = (columns['pretax_income'][rows], columns['capital_income'][rows], columns['longterm_gains'][rows],
+                brackets['federal'], brackets['state'], brackets['nit'], brackets['longterm'],
+                taxes.deduction(status_name, int(year)), 0)
+        (vector_taxes.total_tax(vector_taxes.schedule_taxes(*args, columns['assets'][rows], tax_function))
+         - vector_taxes.total_tax(vector_taxes.schedule_taxes(*args, 0.0, tax_function)))
+
+
+def dense_engine(population, start, stop):
+    """The vectorized engine with income taxes looked up in the memory mapped dense tables."""
+    vectorized_engine(population, start, stop, dense_tables.income_tax)
+
+
+ENGINES = {
+    'schedule': schedule_engine,
+    'vectorized': vectorized_engine,
+    'dense': dense_engine,
+}
+
+
+def _worker(job):
+    path, engine, start, stop = job
+    population = population_.load(path)
+    started = time.perf_counter()
+    ENGINES[engine](population, start, stop)
+    return time.perf_counter() - started
+
+
+def _slices(count, workers):
+    bounds = np.linspace(0, count, workers + 1).astype(int)
+    return list(zip(bounds[:-1].tolist(), bounds[1:].tolist()))
+
+
+def measure(path, engine, count, workers):
+    """
+    Seconds for workers processes to run engine over the first count households, the slowest
+    worker's engine time. Loading the file is left out of every run, like the single worker one.
+    """
+    jobs = [(path, engine, start, stop) for start, stop in _slices(count, workers)]
+    if workers == 1:
+        return _worker(jobs[0])
+    with multiprocessing.get_context().Pool(workers) as pool:
+        return max(pool.map(_worker, jobs, chunksize=1))
+
+
+def run(population, engines=None, count=None, workers=(1,)):
+    """
+    One row per engine and worker count with households per second overall and per core, and the
+    efficiency against the single worker run. population is a dict of columns or a path to one.
+    """
+    if isinstance(population, dict):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'population.npz')
+            population_.save(path, population)
+            return run(path, engines, count or population_.size(population), workers)
+
+    count = count or population_.size(population_.load(population))
+    rows = []
+    for engine in engines or ENGINES:
+        single = None
+        for worker_count in workers:
+            seconds = measure(population, engine, count, worker_count)
+            per_core = count / seconds / worker_count
+            single = single or (per_core if worker_count == 1 else None)
+            rows.append({
+                'engine': engine,
+                'workers': worker_count,
+                'households': count,
+                'seconds': seconds,
+                'per_second': count / seconds,
+                'per_core': per_core,
+                'efficiency': per_core / single if single else float('nan'),
+            })
+    return rows
+
+
+def format_report(rows):
+    lines = [f"{'engine':<12} {'workers':>7} {'households':>10} {'seconds':>9} {'per second':>12} {'per core':>12} {'efficiency':>10}"]
+    for row in rows:
+        lines.append(f"{row['engine']:<12} {row['workers']:>7} {row['households']:>10,} {row['seconds']:>9.2f} "
+                     f"{row['per_second']:>12,.0f} {row['per_core']:>12,.0f} {100 * row['efficiency']:>9.0f}%")
+    return "\n".join(lines)
+
+
+if __name__ == '__main__':
+    import sys
+    count = int(sys.argv[2]) if len(sys.argv) > 2 else None
+    workers = tuple(int(arg) for arg in sys.argv[3:]) or tuple(sorted({1, os.cpu_count() or 1}))
+    print(f"{os.cpu_count()} cores")
+    print(format_report(run(sys.argv[1], count=count, workers=workers)))
@@ -0,0 +1,193 @@
+"""
+Reload bracket data at runtime from a JSON file of overrides on top of the tables in taxes.py.
+
+    {
+        "federal": {"2026": {"single": [[0.1, 12400], ..., [0.37, null]], ...}},
+        "state": {"CA": {"2026": {"married": [...]}}},
+        "deductions": {"2026": {"married": 32200}},
+        "state_deductions": {"CA": {"2026": {"married": 11400}}},
+        "longterm": {...}, "nit": {"married": [...]}, "irmaa": {...}
+    }
+
+Overrides are merged down to single bracket lists, a null bound is taxes.MAX_INCOME. A reload
+builds every table first and then swaps them all into taxes under taxes.DATA_LOCK.
+taxes.schedule, reschedule, raw_tax_brackets and data_version read their tables under the
+same lock, so each of them sees one version. Code that looks up several tables itself must
+hold the lock too. Cache keys carry taxes.data_version(year, state), so only results of the
+years and states that changed are recomputed.
+
+Point IRACONVERT_BRACKETS_PATH at the file to load it on startup, and set
+IRACONVERT_BRACKETS_WATCH=1 to reload whenever it changes. A reload only changes the process
+it runs in. With several worker processes, run them all in watch mode, and use broadcast()
+to make every worker reload by touching the file.
+"""
+import copy
+import os
+import threading
+
+import orjson
+
+import bracket_projection
+import instrumentation
+import taxes
+
+# file section -> table in taxes
+TABLES = {
+    'federal': 'FEDERAL_BRACKETS',
+    'state': 'STATE_BRACKETS',
+    'deductions': 'STANDARD_DEDUCTIONS',
+    'state_deductions': 'STATE_DEDUCTIONS',
+    'longterm': 'GAINS_RATE',
+    'nit': 'NII_BRACKETS',
+    'irmaa': 'IRMAA_BRACKETS',
+}
+POLL_SECONDS = 2.0
+
+# the tables as shipped, overrides always apply to these rather than to a previous reload
+_BUILTIN = {name: copy.deepcopy(getattr(taxes, name)) for name in TABLES.values()}
+_listeners = []
+
+
+def _key(key):
+    # JSON object keys are strings, years are ints everywhere else
+    return int(key) if isinstance(key, str) and key.isdigit() else key
+
+
+def _value(value):
+    if isinstance(value, list) and value and isinstance(value[0], list):
+        return [(rate, taxes.MAX_INCOME if bound is None else bound) for rate, bound in value]
+    return value
+
+
+def _merge(table, overrides):
+    for key, value in overrides.items():
+        key = _key(key)
+        if isinstance(value, dict):
+            _merge(table.setdefault(key, {}), value)
+        else:
+            table[key] = _value(value)
+
+
+def load(path):
+    """Every table with the overrides in path applied, nothing is swapped in yet."""
+    with open(path, 'rb') as f:
+        overrides = orjson.loads(f.read())
+    unknown = set(overrides) - set(TABLES)
+    if unknown:
+        raise ValueError(f"Unknown bracket tables {sorted(unknown)}, expected some of {sorted(TABLES)}")
+    tables = copy.deepcopy(_BUILTIN)
+    for section, values in overrides.items():
+        _merge(tables[TABLES[section]], values)
+    return tables
+
+
+def _datasets():
+    years = set(taxes.FEDERAL_BRACKETS) | set(taxes.STANDARD_DEDUCTIONS)
+    states = set(taxes.STATE_BRACKETS) | set(taxes.STATE_DEDUCTIONS) | {None}
+    return {(year, state): taxes.data_version(year, state) for year in years for state in states}
+
+
+def apply(tables):
+    """Swap tables into taxes and clear the caches derived from them. Returns the (year, state) datasets that changed."""
+    with taxes.DATA_LOCK:
+        before = _datasets()
+        for name, table in tables.items():
+            setattr(taxes, name, table)
+        taxes.data_version.cache_clear()
+        bracket_projection._project.cache_clear()
+        after = _datasets()
+    changed = sorted((key for key in before.keys() | after.keys() if before.get(key) != after.get(key)),
+                     key=lambda key: (key[0], key[1] or ''))
+    for listener in list(_listeners):
+        listener(changed)
+    return changed
+
+
+def reload(path=None):
+    """Reload the overrides in path, or the builtin tables without a path."""
+    return apply(load(path) if path else copy.deepcopy(_BUILTIN))
+
+
+def broadcast(path):
+    """Touch path so that every process watching it reloads, this one included."""
+    os.utime(path)
+
+
+def on_reload(listener):
+    """Call listener with the changed datasets after every reload."""
+    _listeners.append(listener)
+
+
+class Watcher:
+    """Reload path whenever it changes, with watchfiles when it is installed and by polling its mtime otherwise."""
+    def __init__(self, path, poll_seconds=POLL_SECONDS):
+        self.path = path
+        self.poll_seconds = poll_seconds
+        self.reloads = 0
+        self.last_error = None
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='bracket-data-watcher', daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join(timeout=self.poll_seconds + 1)
+
+    def _reload(self):
+        try:
+            reload(self.path)
+            self.reloads += 1
+            self.last_error = None
+        except (OSError, ValueError, TypeError) as e:
+            # a half written or invalid file keeps the current tables until it is fixed
+            self.last_error = repr(e)
+
+    def _changes(self):
+        try:
+            import watchfiles
+        except ImportError:
+            watchfiles = None
+        if watchfiles is not None:
+            # editors often replace the file rather than write to it, so watch its directory
+            path = os.path.abspath(self.path)
+            for _ in watchfiles.watch(os.path.dirname(path), watch_filter=lambda change, changed: os.path.abspath(changed) == path,
+                                      stop_event=self._stop, rust_timeout=int(self.poll_seconds * 1000)):
+                yield
+            return
+        mtime = os.stat(self.path).st_mtime_ns if os.path.exists(self.path) else None
+        while not self._stop.wait(self.poll_seconds):
+            current = os.stat(self.path).st_mtime_ns if os.path.exists(self.path) else None
+            if current != mtime and current is not None:
+                yield
+            mtime = current
+
+    def _run(self):
+        for _ in self._changes():
+            self._reload()
+
+    def stats(self):
+        return {'path': self.path, 'reloads': self.reloads, 'last_error': self.last_error, 'version': taxes.data_version()}
+
+
+WATCHER = None
+
+
+def configure(path, watch=False, poll_seconds=POLL_SECONDS):
+    """Load the overrides in path now, and keep reloading them if watch is set."""
+    global WATCHER
+    if WATCHER is not None:
+        WATCHER.stop()
+        WATCHER = None
+        instrumentation.unregister_probe("bracket_data")
+    changed = reload(path)
+    if path and watch:
+        WATCHER = Watcher(path, poll_seconds).start()
+        instrumentation.register_probe("bracket_data", WATCHER.stats)
+    return changed
+
+
+if os.environ.get("IRACONVERT_BRACKETS_PATH"):
+    configure(os.environ["IRACONVERT_BRACKETS_PATH"], os.environ.get("IRACONVERT_BRACKETS_WATCH") == "1")
@@ -0,0 +1,156 @@
+"""
+Bracket sets for future tax years, projected from the last year with data along an inflation path.
+
+Every schedule is indexed the way its statute indexes it:
+
+    federal brackets and capital gains thresholds   rounded down to a multiple of $25
+    standard deductions                              rounded down to a multiple of $50
+    IRMAA thresholds                                 rounded down to a multiple of $1,000
+    California brackets                              rounded to the nearest dollar
+    net investment income tax thresholds             not indexed
+
+The MAX_INCOME sentinel that closes every bracket list is never indexed. A path is a sequence
+of yearly inflation rates starting the year after the last data year, the last rate repeats
+for later years.
+
+    bracket_projection.raw_tax_brackets(2030, 'married', 'CA', (.025,))
+    lifetime.project(..., brackets_for_year=bracket_projection.brackets_for_year((.025,)))
+"""
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Sequence, Union
+
+import numpy as np
+
+import taxes
+
+DEFAULT_PATH = (.025,)
+
+
+@dataclass(frozen=True)
+class IndexingRule:
+    rounding: float = 1
+    indexed: bool = True
+    # 'down' rounds down to a multiple of rounding, 'nearest' to the nearest multiple
+    mode: str = 'down'
+
+    def apply(self, amounts, factor):
+        """Index amounts by factor, broadcasting a factor per scenario over the amounts."""
+        amounts = np.asarray(amounts, dtype=float)
+        if not self.indexed:
+            return np.broadcast_to(amounts, np.broadcast_shapes(np.shape(factor), amounts.shape)).copy()
+        scaled = np.multiply(factor, amounts)
+        rounded = np.floor(scaled / self.rounding) if self.mode == 'down' else np.round(scaled / self.rounding)
+        return np.where(amounts >= taxes.MAX_INCOME, amounts, rounded * self.rounding)
+
+
+RULES = {
+    'federal': IndexingRule(25),
+    'longterm': IndexingRule(25),
+    'deduction': IndexingRule(50),
+    'irmaa': IndexingRule(1000),
+    'state': IndexingRule(1, mode='nearest'),
+    'nit': IndexingRule(indexed=False),
+}
+
+
+def last_data_year():
+    return max(taxes.FEDERAL_BRACKETS)
+
+
+def _normalize_path(path: Union[float, Sequence[float]]):
+    if np.ndim(path) == 0:
+        return (float(path),)
+    return tuple(float(rate) for rate in path)
+
+
+def inflation_factor(year, path=DEFAULT_PATH):
+    """Cumulative inflation from the last data year to year."""
+    path = _normalize_path(path)
+    base = last_data_year()
+    rates = [path[min(idx, len(path) - 1)] for idx in range(max(year - base, 0))]
+    return float(np.prod([1 + rate for rate in rates]))
+
+
+def _index(brackets, rule, factor):
+    rates = [rate for rate, bound in brackets]
+    bounds = rule.apply([bound for rate, bound in brackets], factor)
+    return list(zip(rates, bounds.tolist()))
+
+
+@lru_cache(maxsize=512)
+def _project(year, path):
+    base = last_data_year()
+    if year <= base:
+        return {
+            'federal': taxes.get_federal_brackets(year),
+            'longterm': taxes.get_gains_brackets(year),
+            'nit': taxes.get_nii_brackets(),
+            'deductions': taxes.STANDARD_DEDUCTIONS[year],
+            'irmaa': taxes.IRMAA_BRACKETS[year],
+            'state': {state: years[year] for state, years in taxes.STATE_BRACKETS.items()},
+        }
+    factor = inflation_factor(year, path)
+    return {
+        'federal': {status: _index(brackets, RULES['federal'], factor) for status, brackets in taxes.get_federal_brackets(base).items()},
+        'longterm': {status: _index(brackets, RULES['longterm'], factor) for status, brackets in taxes.get_gains_brackets(base).items()},
+        'nit': taxes.get_nii_brackets(),
+        'deductions': {status: float(RULES['deduction'].apply(amount, factor)) for status, amount in taxes.STANDARD_DEDUCTIONS[base].items()},
+        # the surcharges are premiums and are not projected, only the income thresholds
+        'irmaa': {status: _index(brackets, RULES['irmaa'], factor) for status, brackets in taxes.IRMAA_BRACKETS[base].items()},
+        'state': {state: {status: _index(brackets, RULES['state'], factor) for status, brackets in years[base].items()}
+                  for state, years in taxes.STATE_BRACKETS.items()},
+    }
+
+
+def project(year, path=DEFAULT_PATH):
+    """Every bracket set of year, cached by (path, year). The result is shared, do not modify it."""
+    return _project(year, _normalize_path(path))
+
+
+def raw_tax_brackets(year, status, state, path=DEFAULT_PATH):
+    """Same as taxes.raw_tax_brackets for any year, with the standard deduction under 'deduction'."""
+    projected = project(year, path)
+    return {
+        'federal': projected['federal'][status],
+        'state': projected['state'][state][status] if state in projected['state'] else taxes.NO_INCOME_BRACKET,
+        'longterm': projected['longterm'][status],
+        'nit': projected['nit'][status],
+        'deduction': projected['deductions'][status],
+    }
+
+
+def brackets_for_year(path=DEFAULT_PATH):
+    """A brackets_for_year function for lifetime.project."""
+    return lambda year, status, state: raw_tax_brackets(year, status, state, path)
+
+
+def project_scenarios(year, paths):
+    """
+    Bracket bounds of year under many inflation paths at once, for simulations.
+    paths is shaped (scenarios, years after the last data year). Returns schedule -> status ->
+    (rates (brackets,), bounds (scenarios, brackets)), and deductions -> status -> (scenarios,).
+    """
+    paths = np.atleast_2d(np.asarray(paths, dtype=float))
+    base = last_data_year()
+    steps = max(year - base, 0)
+    columns = np.minimum(np.arange(steps), paths.shape[1] - 1)
+    factors = np.prod(1 + paths[:, columns], axis=1)[:, np.newaxis]
+    source = min(year, base)
+
+    def stack(brackets, name):
+        # data years keep their published values in every scenario
+        rule = RULES[name] if steps else IndexingRule(indexed=False)
+        rates = np.array([rate for rate, bound in brackets], dtype=float)
+        return rates, rule.apply([bound for rate, bound in brackets], factors)
+
+    return {
+        'federal': {status: stack(brackets, 'federal') for status, brackets in taxes.get_federal_brackets(source).items()},
+        'longterm': {status: stack(brackets, 'longterm') for status, brackets in taxes.get_gains_brackets(source).items()},
+        'nit': {status: stack(brackets, 'nit') for status, brackets in taxes.get_nii_brackets().items()},
+        'irmaa': {status: stack(brackets, 'irmaa') for status, brackets in taxes.IRMAA_BRACKETS[source].items()},
+        'state': {state: {status: stack(brackets, 'state') for status, brackets in years[source].items()}
+                  for state, years in taxes.STATE_BRACKETS.items()},
+        'deductions': {status: (RULES['deduction'] if steps else IndexingRule(indexed=False)).apply(amount, factors[:, 0])
+                       for status, amount in taxes.STANDARD_DEDUCTIONS[source].items()},
+    }
@@ -0,0 +1,86 @@
+"""
+Years until a conversion pays off compared with leaving the money in the traditional IRA.
+
+Converting c costs T, the additional tax on the schedule's curve, paid from a taxable account
+that would have grown at g_t. Both accounts hold c growing at g, but the traditional IRA still
+owes the future rate f on withdrawal, so after n years the conversion is ahead by
+
+    c f (1 + g)^n - T (1 + g_t)^n
+
+which turns positive at n = ln(T / (c f)) / ln((1 + g) / (1 + g_t)). A conversion whose tax is
+below c f is ahead from the start, and one that is not when the taxable account grows as fast
+as the IRA never catches up.
+"""
+from dataclasses import dataclass
+
+import numpy as np
+import pandas as pd
+
+DEFAULT_GROWTH_RATES = np.round(np.arange(.02, .105, .01), 2)
+DEFAULT_FUTURE_RATES = np.round(np.arange(.1, .455, .05), 2)
+# share of a taxable account's growth lost to taxes on dividends and gains every year
+DEFAULT_TAXABLE_DRAG = .15
+# future rates either side of the one the user entered
+FUTURE_RATE_STEP = .05
+FUTURE_RATE_STEPS = 3
+
+
+def breakeven_years(additional_tax, conversions, growth_rates, future_rates, taxable_drag=DEFAULT_TAXABLE_DRAG):
+    """Break-even years shaped (growth rates, future rates, conversions), inf where the conversion never pays off."""
+    growth = np.asarray(growth_rates, dtype=float)[:, np.newaxis, np.newaxis]
+    future = np.asarray(future_rates, dtype=float)[np.newaxis, :, np.newaxis]
+    conversions = np.asarray(conversions, dtype=float)[np.newaxis, np.newaxis, :]
+    additional_tax = np.asarray(additional_tax, dtype=float)[np.newaxis, np.newaxis, :]
+
+    saved = conversions * future
+    ratio = np.log1p(growth) - np.log1p(growth * (1 - taxable_drag))
+    with np.errstate(divide='ignore', invalid='ignore'):
+        years = np.log(additional_tax / saved) / ratio
+    ahead = additional_tax <= saved
+    years = np.where(ahead, 0.0, np.where((ratio > 0) & (saved > 0), years, np.inf))
+    return np.broadcast_to(years, np.broadcast_shapes(growth.shape, future.shape, conversions.shape))
+
+
+@dataclass
+class BreakevenGrid:
+    growth_rates: np.ndarray
+    future_rates: np.ndarray
+    conversions: np.ndarray
+    additional_tax: np.ndarray
+    # (growth rates, future rates, conversions)
+    years: np.ndarray
+
+
+def grid(schedule_, growth_rates=DEFAULT_GROWTH_RATES, future_rates=DEFAULT_FUTURE_RATES, conversions=None,
+         taxable_drag=DEFAULT_TAXABLE_DRAG):
+    """Break-even years of every conversion, by default where the schedule's rates change, over both rate grids."""
+    if conversions is None:
+        conversions = [bracket.upper for bracket in schedule_.entire_curve]
+    conversions = np.unique(np.asarray(conversions, dtype=float))
+    conversions = conversions[conversions > 0]
+    additional_tax = schedule_.additional_taxes(conversions)
+    years = breakeven_years(additional_tax, conversions, growth_rates, future_rates, taxable_drag)
+    return BreakevenGrid(np.asarray(growth_rates, dtype=float), np.asarray(future_rates, dtype=float), conversions, additional_tax, years)
+
+
+def future_rates_around(future_rate, step=FUTURE_RATE_STEP, steps=FUTURE_RATE_STEPS):
+    """future_rate and steps rates either side of it, kept between 0 and 1."""
+    rates = np.round(future_rate + step * np.arange(-steps, steps + 1), 4)
+    return rates[(rates >= 0) & (rates <= 1)]
+
+
+def table(grid_: BreakevenGrid, future_rate_idx=None):
+    """
+    One row per conversion amount with its break-even years at every growth rate, at one future rate,
+    or without future_rate_idx one row per conversion amount and future rate.
+    """
+    indices = range(len(grid_.future_rates)) if future_rate_idx is None else [future_rate_idx]
+    frames = []
+    for rate_idx in indices:
+        columns = {'Conversion Amount': grid_.conversions, 'Additional Tax': grid_.additional_tax}
+        if future_rate_idx is None:
+            columns['Future Rate'] = np.full(len(grid_.conversions), grid_.future_rates[rate_idx])
+        for idx, growth in enumerate(grid_.growth_rates):
+            columns[f'Years at {growth:.0%} Growth'] = grid_.years[idx, rate_idx]
+        frames.append(pd.DataFrame(columns))
+    return pd.concat(frames, ignore_index=True)
@@ -0,0 +1,127 @@
+"""
+Precomputed income tax at every step dollars of income, for bulk runs.
+
+A table holds the cumulative tax of one bracket list at 0, step, 2 step, ... up to a ceiling
+and is saved once as a .npy file named after the brackets' hash, then memory mapped so every
+worker process shares the same pages. A lookup is an array index and a linear interpolation,
+which is exact because tax is linear between bracket bounds. The few cells a bound falls
+inside, and incomes at or above the ceiling, are computed by vector_taxes instead.
+
+    dense_tables.income_tax(incomes, brackets)                    # drop in for vector_taxes.income_tax
+    vector_taxes.schedule_taxes(..., tax_function=dense_tables.income_tax)
+
+Tables live in IRACONVERT_TABLE_DIR, or a directory under the system temp directory.
+
+    python dense_tables.py [directory]
+
+generates the tables of every year, filing status and state ahead of time.
+"""
+import hashlib
+import os
+import tempfile
+import threading
+from dataclasses import dataclass
+
+import numpy as np
+import orjson
+
+import taxes
+import vector_taxes
+
+DEFAULT_STEP = 10
+DEFAULT_CEILING = 2000000
+DEFAULT_DIRECTORY = os.path.join(tempfile.gettempdir(), 'iraconvert-tables')
+
+_tables = {}
+_lock = threading.Lock()
+
+
+@dataclass(frozen=True, eq=False)
+class DenseTable:
+    step: int
+    ceiling: int
+    # tax at every multiple of step up to and including the ceiling
+    taxes: np.ndarray
+    # cells with a bracket bound strictly inside, where interpolating would cut the corner
+    kinked: np.ndarray
+    brackets: tuple
+
+    def income_tax(self, income):
+        """Same as vector_taxes.income_tax."""
+        income = np.maximum(np.asarray(income, dtype=float), 0)
+        cells = np.minimum(income * (1 / self.step), len(self.kinked) - 1).astype(np.int64)
+        lower = self.taxes[cells]
+        result = lower + (self.taxes[cells + 1] - lower) * (income * (1 / self.step) - cells)
+        exact = np.flatnonzero((income >= self.ceiling) | self.kinked[cells])
+        if len(exact):
+            result = np.asarray(result)
+            result.flat[exact] = vector_taxes.income_tax(income.flat[exact], self.brackets)
+        return result if result.ndim else float(result)
+
+
+def version(brackets):
+    return hashlib.sha256(orjson.dumps([list(bracket) for bracket in brackets])).hexdigest()[:16]
+
+
+def _kinked(brackets, step, ceiling):
+    cells = np.zeros(ceiling // step, dtype=bool)
+    bounds = np.array([bound for rate, bound in brackets], dtype=float)
+    inside = bounds[(bounds > 0) & (bounds < ceiling) & (bounds % step != 0)]
+    cells[(inside // step).astype(np.int64)] = True
+    return cells
+
+
+def generate(path, brackets, step, ceiling):
+    incomes = np.arange(0, ceiling + step, step, dtype=float)
+    # write to a temporary file first so a worker never maps a half written table
+    fd, temporary = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.npy')
+    with os.fdopen(fd, 'wb') as f:
+        np.save(f, vector_taxes.income_tax(incomes, brackets))
+    os.replace(temporary, path)
+
+
+def table(brackets, step=DEFAULT_STEP, ceiling=DEFAULT_CEILING, directory=None, name='brackets'):
+    """The table of brackets, generated on first use and memory mapped after that."""
+    if ceiling % step or ceiling >= taxes.MAX_INCOME:
+        raise ValueError(f"The ceiling must be a multiple of the step below {taxes.MAX_INCOME}")
+    brackets = tuple(tuple(bracket) for bracket in brackets)
+    key = (brackets, step, ceiling)
+    table_ = _tables.get(key)
+    if table_ is not None:
+        return table_
+    with _lock:
+        if key not in _tables:
+            directory = directory or os.environ.get('IRACONVERT_TABLE_DIR', DEFAULT_DIRECTORY)
+            os.makedirs(directory, exist_ok=True)
+            path = os.path.join(directory, f'{name}-{step}-{ceiling}-{version(brackets)}.npy')
+            if not os.path.exists(path):
+                generate(path, brackets, step, ceiling)
+            _tables[key] = DenseTable(step, ceiling, np.load(path, mmap_mode='r'), _kinked(brackets, step, ceiling), brackets)
+        return _tables[key]
+
+
+def table_for(year, status, jurisdiction, step=DEFAULT_STEP, ceiling=DEFAULT_CEILING, directory=None):
+    """The table of the federal brackets, or of a state's when jurisdiction is a state."""
+    if jurisdiction == 'federal':
+        brackets = taxes.get_federal_brackets(year)[status]
+    else:
+        brackets = taxes.get_state_brackets(jurisdiction, year, status)
+    return table(brackets, step, ceiling, directory, f'{jurisdiction}-{year}-{status}')
+
+
+def income_tax(income, brackets):
+    return table(brackets).income_tax(income)
+
+
+def generate_all(directory=None, step=DEFAULT_STEP, ceiling=DEFAULT_CEILING):
+    tables = []
+    for year, statuses in taxes.FEDERAL_BRACKETS.items():
+        for status in statuses:
+            for jurisdiction in ['federal'] + [state for state, years in taxes.STATE_BRACKETS.items() if year in years]:
+                tables.append(table_for(year, status, jurisdiction, step, ceiling, directory))
+    return tables
+
+
+if __name__ == '__main__':
+    import sys
+    print(f"{len(generate_all(sys.argv[1] if len(sys.argv) > 1 else None))} tables")
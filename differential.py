@@ -0,0 +1,356 @@
+"""
+Randomized differential testing between tax engines.
+
+Every engine is a function from a Case to a dict of component -> list of values,
+one value per conversion amount in the case. Engines only report the components they
+can compute; components reported by two or more engines are compared. Disagreements
+are shrunk to a minimal case that still disagrees.
+"""
+import random
+import time
+from dataclasses import dataclass, field, replace
+from typing import Callable, Dict, List, Tuple
+
+import numpy as np
+
+import compute_taxes
+import piecewise
+import simple_taxes
+import vector_taxes
+
+MAX_INCOME = 9999999
+TOLERANCE = 1e-6
+
+COMPONENTS = ['federal_tax', 'state_tax', 'nit_tax', 'longterm_tax', 'total_tax', 'income_rate']
+
+
+@dataclass(frozen=True)
+class Case:
+    pretax_wage_income: float
+    ordinary_capital_income: float
+    qualified_capital_income: float
+    federal_brackets: Tuple[Tuple[float, float], ...]
+    state_brackets: Tuple[Tuple[float, float], ...]
+    nit_brackets: Tuple[Tuple[float, float], ...]
+    longterm_brackets: Tuple[Tuple[float, float], ...]
+    federal_deduction: float
+    state_deduction: float
+    conversions: Tuple[float, ...]
+
+    def ordinary_income(self):
+        return self.pretax_wage_income + self.ordinary_capital_income - self.federal_deduction
+
+    def state_income(self):
+        return self.pretax_wage_income + self.ordinary_capital_income + self.qualified_capital_income - self.state_deduction
+
+    def capital_bracket_income(self):
+        return self.ordinary_income() + self.qualified_capital_income
+
+
+@dataclass
+class Engine:
+    name: str
+    evaluate: Callable
+    # batch engines take a list of cases and return a list of results
+    batch: bool = False
+
+    def run(self, cases):
+        if self.batch:
+            return self.evaluate(cases)
+        return [self.evaluate(case) for case in cases]
+
+
+@dataclass
+class Disagreement:
+    component: str
+    conversion: float
+    values: Dict[str, object]
+    case: Case
+
+
+@dataclass
+class Report:
+    cases: int
+    disagreements: List[Disagreement] = field(default_factory=list)
+    # evaluations (case x conversion) per second for each engine
+    throughput: Dict[str, float] = field(default_factory=dict)
+    reference: str = 'schedule'
+
+    def ratios(self):
+        base = self.throughput.get(self.reference)
+        if not base:
+            return {}
+        return {name: rate / base for name, rate in self.throughput.items()}
+
+    def summary(self):
+        lines = [f"{self.cases} cases, {len(self.disagreements)} disagreements"]
+        ratios = self.ratios()
+        for name, rate in sorted(self.throughput.items()):
+            lines.append(f"  {name}: {rate:,.0f} evaluations/s ({ratios.get(name, float('nan')):.2f}x {self.reference})")
+        for disagreement in self.disagreements:
+            lines.append(f"  {disagreement.component} at conversion {disagreement.conversion}: {disagreement.values}")
+            lines.append(f"    {disagreement.case}")
+        return "\n".join(lines)
+
+
+def schedule_engine(case):
+    schedule = simple_taxes.TaxSchedule(
+        case.pretax_wage_income, case.ordinary_capital_income, case.qualified_capital_income,
+        list(case.federal_brackets), list(case.state_brackets), list(case.nit_brackets), list(case.longterm_brackets),
+        case.federal_deduction, case.state_deduction)
+    result = {component: [] for component in COMPONENTS}
+    for conversion in case.conversions:
+        result['federal_tax'].append(schedule.federal_tax(conversion))
+        result['state_tax'].append(schedule.state_tax(conversion))
+        result['nit_tax'].append(schedule.nit_tax(conversion))
+        result['longterm_tax'].append(schedule.longterm_tax(conversion))
+        result['total_tax'].append(schedule._construct_bracket_from_one_point(conversion).total_tax())
+        result['income_rate'].append(schedule._construct_bracket_from_one_point(conversion).total_income_tax())
+    return result
+
+
+def compute_taxes_engine(case):
+    result = {component: [] for component in ['federal_tax', 'state_tax', 'nit_tax', 'longterm_tax']}
+    brackets = (case.federal_brackets, case.state_brackets, case.longterm_brackets, case.nit_brackets)
+    investment_income = case.ordinary_capital_income + case.qualified_capital_income
+    for conversion in case.conversions:
+        # compute_taxes applies one income to every schedule, so call it once per income base
+        federal_tax, _, _, _ = compute_taxes.compute_taxes(case.ordinary_income() + conversion, 0, 0, *brackets)
+        _, state_tax, _, _ = compute_taxes.compute_taxes(case.state_income() + conversion, 0, 0, *brackets)
+        _, _, nit_tax, longterm_tax = compute_taxes.compute_taxes(
+            case.capital_bracket_income() + conversion, case.qualified_capital_income, investment_income, *brackets)
+        result['federal_tax'].append(federal_tax)
+        result['state_tax'].append(state_tax)
+        result['nit_tax'].append(nit_tax)
+        result['longterm_tax'].append(longterm_tax)
+    return result
+
+
+def _rate_from_rates(base_income, conversion, federal_brackets, state_brackets, case):
+    # rates starts its brackets at zero income, so a negative base needs a longer range
+    max_convert = conversion + 1 - min(base_income, 0)
+    brackets = compute_taxes.rates(base_income, max_convert, federal_brackets, state_brackets,
+                                   case.longterm_brackets, case.nit_brackets, bracket_mode='split')
+    income = max(base_income + conversion, 0)
+    for bracket in brackets:
+        if bracket.nit == 0 and bracket.longterm == 0 and bracket.lower <= income < bracket.upper:
+            return bracket.total_income_tax()
+    raise ValueError(f"No bracket for income {income}")
+
+
+def rates_engine(case):
+    no_tax = [(0, MAX_INCOME)]
+    rates = []
+    for conversion in case.conversions:
+        # rates uses a single base income, so federal and state are looked up separately
+        federal = _rate_from_rates(case.ordinary_income(), conversion, case.federal_brackets, no_tax, case)
+        state = _rate_from_rates(case.state_income(), conversion, no_tax, case.state_brackets, case)
+        rates.append(federal + state)
+    return {'income_rate': rates}
+
+
+def vectorized_engine(case):
+    conversions = np.array(case.conversions, dtype=float)
+    taxes = vector_taxes.schedule_taxes(
+        case.pretax_wage_income, case.ordinary_capital_income, case.qualified_capital_income,
+        case.federal_brackets, case.state_brackets, case.nit_brackets, case.longterm_brackets,
+        case.federal_deduction, case.state_deduction, conversions)
+    result = {component: values.tolist() for component, values in taxes.items()}
+    result['total_tax'] = vector_taxes.total_tax(taxes).tolist()
+    return result
+
+
+def piecewise_engine(case):
+    schedule = simple_taxes.TaxSchedule(
+        case.pretax_wage_income, case.ordinary_capital_income, case.qualified_capital_income,
+        list(case.federal_brackets), list(case.state_brackets), list(case.nit_brackets), list(case.longterm_brackets),
+        case.federal_deduction, case.state_deduction)
+    components = piecewise.schedule_components(schedule)
+    conversions = np.array(case.conversions, dtype=float)
+    result = {component: function(conversions).tolist() for component, function in components.items()}
+    # the composed function additional_tax and the bulk callers read from
+    result['total_tax'] = schedule.total_tax_function()(conversions).tolist()
+    return result
+
+
+ENGINES: Dict[str, Engine] = {}
+
+
+def register_engine(name, evaluate, batch=False):
+    ENGINES[name] = Engine(name, evaluate, batch)
+
+
+register_engine('schedule', schedule_engine)
+register_engine('compute_taxes', compute_taxes_engine)
+register_engine('rates', rates_engine)
+register_engine('vectorized', vectorized_engine)
+register_engine('piecewise', piecewise_engine)
+
+
+def _random_brackets(rng, count, max_rate):
+    bounds = sorted(rng.sample(range(1000, 2000000, 25), count - 1))
+    rates = sorted(round(rng.uniform(0, max_rate), 3) for _ in range(count))
+    return tuple(zip(rates, bounds + [MAX_INCOME]))
+
+
+def random_case(rng):
+    federal_brackets = _random_brackets(rng, rng.randint(2, 8), .4)
+    state_brackets = _random_brackets(rng, rng.randint(1, 10), .14) if rng.random() < .8 else ((0, MAX_INCOME),)
+    nit_brackets = ((0, rng.choice([125000, 200000, 250000])), (.038, MAX_INCOME))
+    longterm_brackets = ((0, rng.randrange(20000, 100000, 25)), (.15, rng.randrange(400000, 700000, 25)), (.2, MAX_INCOME))
+    case = Case(
+        pretax_wage_income=round(rng.lognormvariate(11.5, 1), 2),
+        ordinary_capital_income=round(rng.expovariate(1 / 20000), 2) if rng.random() < .7 else 0,
+        qualified_capital_income=round(rng.expovariate(1 / 30000), 2) if rng.random() < .7 else 0,
+        federal_brackets=federal_brackets,
+        state_brackets=state_brackets,
+        nit_brackets=nit_brackets,
+        longterm_brackets=longterm_brackets,
+        federal_deduction=rng.choice([0, 14600, 29200, 21900, round(rng.uniform(0, 60000))]),
+        state_deduction=rng.choice([0, 5540, 11080]),
+        conversions=(),
+    )
+    # probe the kinks as well as random amounts
+    conversions = {0.0, round(rng.uniform(0, 2000000), 2)}
+    for rate, bound in federal_brackets[:-1]:
+        conversions.add(bound - case.ordinary_income())
+    for rate, bound in longterm_brackets[:-1] + nit_brackets[:-1]:
+        conversions.add(bound - case.capital_bracket_income())
+    conversions = tuple(sorted(amount for amount in conversions if 0 <= amount < 3000000))
+    return replace(case, conversions=conversions)
+
+
+def generate_cases(count, seed=0):
+    rng = random.Random(seed)
+    return [random_case(rng) for _ in range(count)]
+
+
+def _close(a, b):
+    return abs(a - b) <= TOLERANCE * max(1.0, abs(a), abs(b))
+
+
+def _evaluate(engine, case):
+    try:
+        return engine.run([case])[0]
+    except Exception as e:
+        return e
+
+
+def compare_case(case, engines):
+    """Return the disagreements between engines on a single case."""
+    results = {engine.name: _evaluate(engine, case) for engine in engines}
+    return _compare_results(case, results)
+
+
+def _compare_results(case, results):
+    errors = {name: result for name, result in results.items() if isinstance(result, Exception)}
+    if errors:
+        return [Disagreement('error', case.conversions[0] if case.conversions else 0,
+                             {name: repr(result) for name, result in errors.items()}, case)]
+    disagreements = []
+    for component in COMPONENTS:
+        reported = {name: result[component] for name, result in results.items() if component in result}
+        if len(reported) < 2:
+            continue
+        for idx, conversion in enumerate(case.conversions):
+            values = {name: values[idx] for name, values in reported.items()}
+            first = next(iter(values.values()))
+            if not all(_close(first, value) for value in values.values()):
+                disagreements.append(Disagreement(component, conversion, values, case))
+    return disagreements
+
+
+def _still_fails(case, engines, component):
+    return any(d.component == component for d in compare_case(case, engines))
+
+
+def _shrink_candidates(case):
+    numeric = ['pretax_wage_income', 'ordinary_capital_income', 'qualified_capital_income', 'federal_deduction', 'state_deduction']
+    if len(case.conversions) > 1:
+        for conversion in case.conversions:
+            yield replace(case, conversions=(conversion,))
+    for name in numeric + ['conversions']:
+        value = getattr(case, name)
+        if name == 'conversions':
+            for simpler in (0, round(value[0], -3), round(value[0])):
+                if simpler != value[0]:
+                    yield replace(case, conversions=(simpler,))
+            continue
+        for simpler in (0, round(value, -3), round(value), value // 2):
+            if simpler != value:
+                yield replace(case, **{name: simpler})
+    for name in ['federal_brackets', 'state_brackets', 'nit_brackets', 'longterm_brackets']:
+        brackets = getattr(case, name)
+        # merge a bracket into the next one
+        for idx in range(len(brackets) - 1):
+            yield replace(case, **{name: brackets[:idx] + brackets[idx + 1:]})
+        for idx, (rate, bound) in enumerate(brackets):
+            rounded = round(rate, 2)
+            if rounded != rate:
+                yield replace(case, **{name: brackets[:idx] + ((rounded, bound),) + brackets[idx + 1:]})
+
+
+def shrink(disagreement, engines, max_steps=500):
+    """Greedily simplify a failing case while the same component still disagrees."""
+    case = disagreement.case
+    if len(case.conversions) > 1:
+        case = replace(case, conversions=(disagreement.conversion,))
+    component = disagreement.component
+    steps = 0
+    progress = True
+    while progress and steps < max_steps:
+        progress = False
+        for candidate in _shrink_candidates(case):
+            steps += 1
+            if _still_fails(candidate, engines, component):
+                case = candidate
+                progress = True
+                break
+            if steps >= max_steps:
+                break
+    for shrunk in compare_case(case, engines):
+        if shrunk.component == component:
+            return shrunk
+    return disagreement
+
+
+def run(count=1000, seed=0, engines=None, reference='schedule', shrink_failures=True, max_reported=10):
+    """Run every engine over randomly generated cases, report disagreements and throughput."""
+    engines = [ENGINES[name] for name in (engines or ENGINES)]
+    cases = generate_cases(count, seed)
+    evaluations = sum(len(case.conversions) for case in cases)
+
+    report = Report(cases=count, reference=reference)
+    all_results = {}
+    for engine in engines:
+        start = time.perf_counter()
+        try:
+            all_results[engine.name] = engine.run(cases)
+        except Exception:
+            # an engine that fails somewhere in the batch is rerun case by case
+            all_results[engine.name] = [_evaluate(engine, case) for case in cases]
+        elapsed = time.perf_counter() - start
+        report.throughput[engine.name] = evaluations / elapsed if elapsed > 0 else float('inf')
+
+    seen = set()
+    for idx, case in enumerate(cases):
+        results = {name: results[idx] for name, results in all_results.items()}
+        for disagreement in _compare_results(case, results):
+            if len(report.disagreements) >= max_reported:
+                return report
+            if shrink_failures:
+                disagreement = shrink(disagreement, engines)
+            # report each combination of component and disagreeing engines once
+            key = (disagreement.component, tuple(sorted(disagreement.values)))
+            if key not in seen:
+                seen.add(key)
+                report.disagreements.append(disagreement)
+            # one disagreement per case is enough, the rest are usually the same root cause
+            break
+    return report
+
+
+if __name__ == '__main__':
+    import sys
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    print(run(count).summary())
@@ -1,21 +1,24 @@
 from simple_taxes import TaxBracket
 from dataclasses import dataclass
 import plotly.graph_objects as go
-from typing import List
+import plotly.io as pio
+from typing import List, Optional
 
+import instrumentation
+import tracing
 
-def plot_tax_brackets(current_income: float,
-                      longterm_gains: float,
-                      investment_income: float,
-                      income_brackets: List[TaxBracket],
-                      capital_brackets: List[TaxBracket],
-                      future_rate: float,
-                      max_conversion: float) -> go.Figure:
-    """
-    Creates a plot showing marginal tax rates for different Roth conversion amounts.
-    Handles regular income tax, long-term capital gains, and investment income tax.
-    """
-    # Get key points where tax calculation changes
+
+# above this many brackets the chart is drawn with a few packed WebGL traces instead of one trace per bracket
+WEBGL_THRESHOLD = 40
+# roughly the plot area of the app's chart, there is no point sending more points than pixels
+PIXEL_WIDTH = 1200
+
+# JSON sent to the browser by plot_tax_brackets, packed and one trace per bracket charts apart
+_payloads = {'figures': 0, 'packed': 0, 'bytes': 0, 'packed_bytes': 0, 'last_bytes': 0}
+
+
+def _bracket_points(current_income, longterm_gains, investment_income, income_brackets, capital_brackets):
+    """Conversion amounts, rates, hovertext and names for every income bracket and capital jump."""
     taxes = []
     conversion_amounts = []
     hovertext = []
@@ -43,6 +46,12 @@ def plot_tax_brackets(current_income: float,
             hovertext.append([f"Effective Net Investment Tax rate is {100*nit_rate:.2f}% "])
             taxes.append([nit_rate + income_rate])
             names.append(f"NIT tax of {100 * marginal_nit:.2f}% on capital income")
+        elif bracket.longterm.marginal <= 0 and bracket.surcharge_jump() > 0:
+            names_crossed = ", ".join(name.upper() for name, bundle in bracket.surcharges if bundle.marginal > 0)
+            surcharge_rate = bracket.surcharge_jump() / total_income
+            hovertext.append([f"{names_crossed} surcharge of ${bracket.surcharge_jump():,.0f} increasing your effective tax rate by {100*surcharge_rate:.2f}%"])
+            names.append(f"{names_crossed} surcharge of ${bracket.surcharge_jump():,.0f}")
+            taxes.append([surcharge_rate + income_rate])
         elif bracket.longterm.rate > 0:
             marginal_longterm = bracket.longterm.marginal
             capital_rate = (longterm_gains * marginal_longterm) / total_income
@@ -53,31 +62,55 @@ def plot_tax_brackets(current_income: float,
         else:
             raise Exception("Bracket labeled capital but no capital gain")
         conversion_amounts.append([bracket.upper])
+    return conversion_amounts, taxes, hovertext, names
+
+
+@tracing.traced("graph.plot_tax_brackets")
+def plot_tax_brackets(current_income: float,
+                      longterm_gains: float,
+                      investment_income: float,
+                      income_brackets: List[TaxBracket],
+                      capital_brackets: List[TaxBracket],
+                      future_rate: float,
+                      max_conversion: float,
+                      webgl: Optional[bool] = None) -> go.Figure:
+    """
+    Creates a plot showing marginal tax rates for different Roth conversion amounts.
+    Handles regular income tax, long-term capital gains, and investment income tax.
+    webgl packs the brackets into a few WebGL traces, by default only for large curves.
+    """
+    # Get key points where tax calculation changes
+    conversion_amounts, taxes, hovertext, names = _bracket_points(current_income, longterm_gains, investment_income, income_brackets, capital_brackets)
+    if webgl is None:
+        webgl = len(conversion_amounts) > WEBGL_THRESHOLD
 
     # Create the plot
     fig = go.Figure()
-    for amounts, tax, hover, name in zip(conversion_amounts, taxes, hovertext, names):
-        if len(amounts) > 1:
-             fig.add_trace(go.Scatter(
-                x=amounts,
-                y=tax,
-                hovertext=hover,
-                 hovertemplate='%{hovertext}<extra></extra>',
-                mode='lines',
-                name=name,
-                line=dict(width=4)))
-        else:
-            fig.add_trace(go.Scatter
-                          (x=amounts,
-                           y=tax,
-                           hovertext=hover,
-                           hovertemplate='%{hovertext}<extra></extra>',
-                           mode='markers',
-                            name=name,
-                           marker=dict(size=10)))
+    if webgl:
+        _add_packed_traces(fig, conversion_amounts, taxes, hovertext, max_conversion)
+    else:
+        for amounts, tax, hover, name in zip(conversion_amounts, taxes, hovertext, names):
+            if len(amounts) > 1:
+                 fig.add_trace(go.Scatter(
+                    x=amounts,
+                    y=tax,
+                    hovertext=hover,
+                     hovertemplate='%{hovertext}<extra></extra>',
+                    mode='lines',
+                    name=name,
+                    line=dict(width=4)))
+            else:
+                fig.add_trace(go.Scatter
+                              (x=amounts,
+                               y=tax,
+                               hovertext=hover,
+                               hovertemplate='%{hovertext}<extra></extra>',
+                               mode='markers',
+                                name=name,
+                               marker=dict(size=10)))
 
     # Add future rate line
-    fig.add_trace(go.Scatter(
+    fig.add_trace((go.Scattergl if webgl else go.Scatter)(
         x=[0, max_conversion],
         y=[future_rate] * 2,
         mode='lines',
@@ -104,9 +137,174 @@ def plot_tax_brackets(current_income: float,
         y=-.15
     ))
 
+    _record_payload(fig, webgl)
+    return fig
+
+
+def _add_packed_traces(fig, conversion_amounts, taxes, hovertext, max_conversion, width=PIXEL_WIDTH):
+    """One line trace for every bracket, separated by gaps, and one marker trace for every capital jump."""
+    pixel = max_conversion / width if max_conversion > 0 else 0
+    line_x, line_y, line_text = [], [], []
+    marker_x, marker_y, marker_text = [], [], []
+    for amounts, tax, hover in zip(conversion_amounts, taxes, hovertext):
+        if len(amounts) > 1:
+            # a bracket narrower than a pixel is not visible on its own, the previous line is extended over it
+            if line_x and amounts[1] - amounts[0] < pixel:
+                line_x[-2] = amounts[1]
+                continue
+            line_x += amounts + [None]
+            line_y += tax + [None]
+            line_text += hover + [None]
+        else:
+            marker_x += amounts
+            marker_y += tax
+            marker_text += hover
+
+    marker_x, marker_y, marker_text = downsample(marker_x, marker_y, marker_text, width)
+    fig.add_trace(go.Scattergl(
+        x=line_x,
+        y=line_y,
+        customdata=line_text,
+        hovertemplate='%{customdata}<extra></extra>',
+        mode='lines',
+        connectgaps=False,
+        name='Income tax rate',
+        line=dict(width=4)))
+    if marker_x:
+        fig.add_trace(go.Scattergl(
+            x=marker_x,
+            y=marker_y,
+            customdata=marker_text,
+            hovertemplate='%{customdata}<extra></extra>',
+            mode='markers',
+            name='Capital gains and surcharges',
+            marker=dict(size=10)))
+
+
+def downsample(x, y, text, width=PIXEL_WIDTH):
+    """
+    Keep at most two points per pixel column, the lowest and highest, so the drawn
+    shape is unchanged. Points must be sorted by x.
+    """
+    if len(x) <= 2 * width:
+        return list(x), list(y), list(text)
+    lowest, highest = min(x), max(x)
+    pixel = (highest - lowest) / width or 1
+    columns = {}
+    for idx, value in enumerate(x):
+        column = columns.setdefault(min(int((value - lowest) / pixel), width - 1), [idx, idx])
+        if y[idx] < y[column[0]]:
+            column[0] = idx
+        if y[idx] > y[column[1]]:
+            column[1] = idx
+    kept = sorted({idx for column in columns.values() for idx in column})
+    return [x[idx] for idx in kept], [y[idx] for idx in kept], [text[idx] for idx in kept]
+
+
+def figure_payload_bytes(fig: go.Figure) -> int:
+    """Size of the JSON sent to the browser for a figure."""
+    return len(pio.to_json(fig, validate=False, engine='orjson'))
+
+
+def _record_payload(fig, packed):
+    size = figure_payload_bytes(fig)
+    tracing.set_attribute("payload_bytes", size)
+    _payloads['figures'] += 1
+    _payloads['bytes'] += size
+    _payloads['last_bytes'] = size
+    if packed:
+        _payloads['packed'] += 1
+        _payloads['packed_bytes'] += size
+
+
+def payload_stats():
+    return dict(_payloads)
+
+
+instrumentation.register_probe("graph", payload_stats)
+
+
+def plot_regime_comparison(comparison, future_rate: float) -> go.Figure:
+    """
+    Marginal income tax rate against conversion amount under every regime of a regimes.Comparison,
+    with each regime's recommended conversion marked.
+    """
+    fig = go.Figure()
+    for idx, name in enumerate(comparison.names):
+        recommendation = comparison.recommendations[idx]
+        fig.add_trace(go.Scatter(
+            x=comparison.conversions,
+            y=comparison.income_rate[idx],
+            customdata=comparison.additional_tax[idx],
+            hovertemplate=f'{name}<br>%{{y:.2%}}, additional tax $%{{customdata:,.0f}}<extra></extra>',
+            mode='lines',
+            line_shape='hv',
+            name=name,
+            line=dict(width=4)))
+        fig.add_trace(go.Scatter(
+            x=[recommendation['conversion']],
+            y=[recommendation['rate']],
+            hovertemplate=f"Convert ${recommendation['conversion']:,.0f} under {name}<extra></extra>",
+            mode='markers',
+            name=f"Recommended under {name}",
+            marker=dict(size=12)))
+
+    fig.add_trace(go.Scatter(
+        x=[0, comparison.conversions[-1]],
+        y=[future_rate] * 2,
+        mode='lines',
+        name='Future Rate',
+        line=dict(width=4, dash='dash')
+    ))
+    fig.update_xaxes(tickprefix="$")
+    fig.update_yaxes(tickformat=',.0%',)
+    fig.update_layout(
+        title='Tax Rate vs Roth Conversion Amount by Tax Law',
+        xaxis_title='Roth Conversion Amount ($)',
+        yaxis_title='Marginal Tax Rate',
+        hovermode='closest',
+        height=500,
+        legend=dict(yanchor="top", orientation="h", xanchor="left", x=0, y=-.15),
+    )
     return fig
 
 
+def plot_breakeven(grid, future_rate_idx=0) -> go.Figure:
+    """
+    Heatmap of the years until each conversion amount pays off at every growth rate of a breakeven.BreakevenGrid,
+    one per future rate with buttons to switch between them, starting on future_rate_idx.
+    """
+    fig = go.Figure()
+    title = lambda rate: f'Years to Break Even at a {rate:.0%} Future Rate'
+    for rate_idx, rate in enumerate(grid.future_rates):
+        years = grid.years[:, rate_idx]
+        # conversions that never pay off are left blank
+        z = [[value if value != float('inf') else None for value in row] for row in years.tolist()]
+        fig.add_trace(go.Heatmap(
+            x=[f"${conversion:,.0f}" for conversion in grid.conversions],
+            y=[f"{growth:.0%}" for growth in grid.growth_rates],
+            z=z,
+            customdata=[grid.additional_tax.tolist()] * len(grid.growth_rates),
+            hovertemplate='Convert %{x} at %{y} growth<br>Additional tax $%{customdata:,.0f}<br>%{z:.1f} years<extra></extra>',
+            colorscale='Viridis',
+            reversescale=True,
+            colorbar=dict(title='Years'),
+            name=f'{rate:.0%}',
+            visible=rate_idx == future_rate_idx,
+        ))
+    if len(grid.future_rates) > 1:
+        buttons = [dict(label=f'{rate:.0%} future rate', method='update',
+                        args=[{'visible': [idx == rate_idx for idx in range(len(grid.future_rates))]}, {'title': title(rate)}])
+                   for rate_idx, rate in enumerate(grid.future_rates)]
+        fig.update_layout(updatemenus=[dict(buttons=buttons, active=future_rate_idx, x=1, xanchor='right', y=1.15, yanchor='top')])
+    fig.update_layout(
+        title=title(grid.future_rates[future_rate_idx]),
+        xaxis_title='Roth Conversion Amount ($)',
+        yaxis_title='Growth Rate',
+        height=500,
+    )
+    return fig
+
 
 def plot_roth_conversion_tax(current_income: float,
                            longterm_gains: float,
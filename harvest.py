@@ -0,0 +1,117 @@
+"""
+Choose a Roth conversion and an amount of long term gains to harvest together.
+
+Both use the same bracket room: gains harvested in the 0% capital gains bracket are free, but a
+conversion pushes them into the 15% bracket. The value of a plan is the future tax saved on the
+converted amount and on the harvested gains, less the tax owed now.
+
+Taxes are piecewise linear in (conversion, harvest). Federal brackets only move with the
+conversion, state and capital gains brackets move with conversion + harvest, so the plane is
+cut by lines c = const and c + h = const and the best plan is at a vertex of that partition,
+or just below a capital gains cliff. All vertices are evaluated at once with vector_taxes.
+"""
+from dataclasses import dataclass
+from typing import List, Optional, Sequence
+
+import numpy as np
+
+import taxes
+import vector_taxes
+
+# taxes are only discontinuous at capital gains cliffs, one cent below is the best plan on the cheap side
+CLIFF_OFFSET = 0.01
+
+
+@dataclass(frozen=True)
+class Household:
+    pretax_income: float
+    assets: float
+    unrealized_gains: float
+    longterm_gains: float = 0.0
+    capital_income: float = 0.0
+    year: int = 2024
+    status: str = 'married'
+    state: str = 'CA'
+    future_rate: float = .35
+    # rate the harvested gains would have been taxed at when sold later
+    future_gains_rate: float = .15
+    deduction: Optional[float] = None
+
+    def bracket_key(self):
+        return (self.year, self.status, self.state, self.deduction)
+
+
+@dataclass(frozen=True)
+class HarvestPlan:
+    conversion: float
+    harvest: float
+    additional_tax: float
+    value: float
+
+
+def _candidates(household, brackets, federal_deduction):
+    """Vertices of the partition of [0, assets] x [0, unrealized gains] by the bracket lines."""
+    ordinary_income = household.pretax_income + household.capital_income - federal_deduction
+    state_income = household.pretax_income + household.capital_income + household.longterm_gains
+    capital_bracket_income = ordinary_income + household.longterm_gains
+    max_convert, max_harvest = household.assets, household.unrealized_gains
+
+    # income taxes are flat at zero until taxable income turns positive, so 0 is a bound too
+    conversions = [0.0, max_convert, -ordinary_income] + [bound - ordinary_income for rate, bound in brackets['federal']]
+    conversions = np.unique(np.clip(conversions, 0, max_convert))
+    sums = [-state_income] + [bound - state_income for rate, bound in brackets['state']]
+    for name in ['nit', 'longterm']:
+        for rate, bound in brackets[name]:
+            sums += [bound - capital_bracket_income, bound - capital_bracket_income - CLIFF_OFFSET]
+    sums = np.unique(np.clip(sums, 0, max_convert + max_harvest))
+
+    harvests = np.array([0.0, max_harvest])
+    grid_c = np.concatenate([
+        np.repeat(conversions, 2),
+        np.repeat(conversions, len(sums)),
+        np.tile(sums, 2) - np.repeat(harvests, len(sums)),
+    ])
+    grid_h = np.concatenate([
+        np.tile(harvests, len(conversions)),
+        np.tile(sums, len(conversions)) - np.repeat(conversions, len(sums)),
+        np.repeat(harvests, len(sums)),
+    ])
+    inside = (grid_c >= 0) & (grid_c <= max_convert) & (grid_h >= 0) & (grid_h <= max_harvest)
+    return grid_c[inside], grid_h[inside]
+
+
+def optimize_batch(households: Sequence[Household]) -> List[HarvestPlan]:
+    """Best plan for every household, one vectorized evaluation per bracket set."""
+    plans = [None] * len(households)
+    groups = {}
+    for idx, household in enumerate(households):
+        groups.setdefault(household.bracket_key(), []).append(idx)
+
+    for (year, status, state, custom_deduction), indices in groups.items():
+        brackets = taxes.raw_tax_brackets(year, status, state)
+        federal_deduction = custom_deduction if custom_deduction is not None else taxes.deduction(status, year)
+        conversions, harvests, owners = [], [], []
+        for idx in indices:
+            c, h = _candidates(households[idx], brackets, federal_deduction)
+            # the plan of doing nothing is the baseline and comes first so ties keep it
+            conversions += [[0.0], c]
+            harvests += [[0.0], h]
+            owners.append(len(c) + 1)
+        conversions, harvests = np.concatenate(conversions), np.concatenate(harvests)
+        column = lambda name: np.repeat([getattr(households[idx], name) for idx in indices], owners).astype(float)
+
+        tax = vector_taxes.total_tax(vector_taxes.schedule_taxes(
+            column('pretax_income'), column('capital_income'), column('longterm_gains') + harvests,
+            brackets['federal'], brackets['state'], brackets['nit'], brackets['longterm'], federal_deduction, 0, conversions))
+        starts = np.concatenate([[0], np.cumsum(owners)[:-1]])
+        additional_tax = tax - np.repeat(tax[starts], owners)
+        value = column('future_rate') * conversions + column('future_gains_rate') * harvests - additional_tax
+
+        for idx, start, count in zip(indices, starts, owners):
+            best = start + int(np.argmax(value[start:start + count]))
+            plans[idx] = HarvestPlan(float(conversions[best]), float(harvests[best]), float(additional_tax[best]), float(value[best]))
+    return plans
+
+
+def optimize(household: Household) -> HarvestPlan:
+    return optimize_batch([household])[0]
@@ -0,0 +1,27 @@
+import threading
+
+# named probes that report process state, eg session memory or cache hit rates
+_PROBES = {}
+_LOCK = threading.Lock()
+
+
+def register_probe(name, probe):
+    with _LOCK:
+        _PROBES[name] = probe
+
+
+def unregister_probe(name):
+    with _LOCK:
+        _PROBES.pop(name, None)
+
+
+def snapshot():
+    with _LOCK:
+        probes = list(_PROBES.items())
+    report = {}
+    for name, probe in probes:
+        try:
+            report[name] = probe()
+        except Exception as e:
+            report[name] = {"error": repr(e)}
+    return report
@@ -0,0 +1,180 @@
+"""
+Year by year projection of traditional IRA and Roth balances, required minimum
+distributions and taxes, vectorized over conversion strategies and growth scenarios.
+
+Arrays in results are shaped (strategies, scenarios, years).
+"""
+from dataclasses import dataclass
+
+import numpy as np
+
+import taxes
+import vector_taxes
+
+# IRS Uniform Lifetime Table (2022 and later), distribution period by age
+UNIFORM_LIFETIME_TABLE = {
+    72: 27.4, 73: 26.5, 74: 25.5, 75: 24.6, 76: 23.7, 77: 22.9, 78: 22.0, 79: 21.1,
+    80: 20.2, 81: 19.4, 82: 18.5, 83: 17.7, 84: 16.8, 85: 16.0, 86: 15.2, 87: 14.4,
+    88: 13.7, 89: 12.9, 90: 12.2, 91: 11.5, 92: 10.8, 93: 10.1, 94: 9.5, 95: 8.9,
+    96: 8.4, 97: 7.8, 98: 7.3, 99: 6.8, 100: 6.4, 101: 6.0, 102: 5.6, 103: 5.2,
+    104: 4.9, 105: 4.6, 106: 4.3, 107: 4.1, 108: 3.9, 109: 3.7, 110: 3.5, 111: 3.4,
+    112: 3.3, 113: 3.1, 114: 3.0, 115: 2.9, 116: 2.8, 117: 2.7, 118: 2.5, 119: 2.3,
+    120: 2.0
+}
+
+RMD_START_AGE = 73
+
+
+def distribution_period(age):
+    if age < min(UNIFORM_LIFETIME_TABLE):
+        return float('inf')
+    return UNIFORM_LIFETIME_TABLE[min(age, max(UNIFORM_LIFETIME_TABLE))]
+
+
+@dataclass
+class ProjectionResult:
+    ages: np.ndarray
+    years: np.ndarray
+    # balances at the start of each year
+    ira: np.ndarray
+    roth: np.ndarray
+    rmd: np.ndarray
+    conversions: np.ndarray
+    # total tax owed each year, and the part caused by rmds and conversions
+    tax: np.ndarray
+    additional_tax: np.ndarray
+    # balances after the last year
+    ira_end: np.ndarray
+    roth_end: np.ndarray
+    # taxable account the rmds are withdrawn to, growing like the other balances
+    taxable_end: np.ndarray
+
+    def total_additional_tax(self, discount_rate=0.0):
+        discount = (1 + discount_rate) ** -np.arange(self.tax.shape[-1])
+        return (self.additional_tax * discount).sum(axis=-1)
+
+    def after_tax_value(self, future_rate, discount_rate=0.0):
+        """
+        Ending balances net of the tax still owed on the IRA, less the additional taxes paid along the way.
+        The rmds count through the taxable account they were withdrawn to, their tax is part of the additional taxes.
+        """
+        years = self.tax.shape[-1]
+        value = self.roth_end + self.taxable_end + self.ira_end * (1 - future_rate)
+        return value / (1 + discount_rate) ** years - self.total_additional_tax(discount_rate)
+
+
+def _as_strategies(conversions, years):
+    conversions = np.asarray(conversions, dtype=float)
+    if conversions.ndim == 0:
+        conversions = np.full((1, years), float(conversions))
+    elif conversions.ndim == 1:
+        conversions = conversions[np.newaxis, :]
+    if conversions.shape[1] != years:
+        raise ValueError(f"Conversion schedule covers {conversions.shape[1]} years, expected {years}")
+    return conversions
+
+
+def _as_scenarios(growth, years):
+    growth = np.asarray(growth, dtype=float)
+    if growth.ndim == 0:
+        growth = np.full((1, years), float(growth))
+    elif growth.ndim == 1:
+        # one constant rate per scenario
+        growth = np.repeat(growth[:, np.newaxis], years, axis=1)
+    if growth.shape[1] != years:
+        raise ValueError(f"Growth path covers {growth.shape[1]} years, expected {years}")
+    return growth
+
+
+def _per_year(value, years):
+    value = np.asarray(value, dtype=float)
+    if value.ndim == 0:
+        return np.full(years, float(value))
+    return value
+
+
+def project(age, ira_balance, conversions, growth, years=None, roth_balance=0.0,
+            pretax_wage_income=0.0, ordinary_capital_income=0.0, qualified_capital_income=0.0,
+            year=2025, status='married', state='CA', custom_deduction=None, rmd_start_age=RMD_START_AGE,
+            brackets_for_year=None):
+    """
+    Project balances, rmds and taxes.
+
+    conversions is the amount to convert each year, shaped (years,) or (strategies, years).
+    growth is a rate, one rate per scenario (scenarios,), or a path per scenario (scenarios, years).
+    Income arguments are scalars or one value per year. Taxes are computed with the bracket
+    data in taxes.py; years past the last year with data use the last year's brackets unless
+    brackets_for_year(year, status, state) is given, eg bracket_projection.brackets_for_year(path).
+    """
+    if years is None:
+        years = np.shape(conversions)[-1] if np.ndim(conversions) else 1
+    conversions = _as_strategies(conversions, years)
+    growth = _as_scenarios(growth, years)
+    strategies, scenarios = conversions.shape[0], growth.shape[0]
+    shape = (strategies, scenarios)
+
+    wages = _per_year(pretax_wage_income, years)
+    ordinary = _per_year(ordinary_capital_income, years)
+    qualified = _per_year(qualified_capital_income, years)
+
+    result_shape = shape + (years,)
+    ira = np.zeros(result_shape)
+    roth = np.zeros(result_shape)
+    rmds = np.zeros(result_shape)
+    converted = np.zeros(result_shape)
+    tax = np.zeros(result_shape)
+    additional_tax = np.zeros(result_shape)
+
+    ira_balance = np.full(shape, float(ira_balance))
+    roth_balance = np.full(shape, float(roth_balance))
+    taxable_balance = np.zeros(shape)
+    ages = age + np.arange(years)
+    tax_years = year + np.arange(years)
+    last_year = max(taxes.FEDERAL_BRACKETS)
+
+    for t in range(years):
+        ira[..., t] = ira_balance
+        roth[..., t] = roth_balance
+
+        if ages[t] >= rmd_start_age:
+            rmd = ira_balance / distribution_period(int(ages[t]))
+        else:
+            rmd = np.zeros(shape)
+        conversion = np.minimum(conversions[:, t][:, np.newaxis], ira_balance - rmd)
+
+        tax_year = int(tax_years[t])
+        if brackets_for_year is not None:
+            brackets = brackets_for_year(tax_year, status, state)
+        else:
+            brackets = taxes.raw_tax_brackets(min(tax_year, last_year), status, state)
+        if custom_deduction is not None:
+            deduction = custom_deduction
+        else:
+            # projected bracket sets carry their own standard deduction
+            deduction = brackets.get('deduction', taxes.deduction(status, min(tax_year, last_year)))
+
+        args = (wages[t], ordinary[t], qualified[t], brackets['federal'], brackets['state'], brackets['nit'], brackets['longterm'], deduction, 0)
+        year_tax = vector_taxes.total_tax(vector_taxes.schedule_taxes(*args, rmd + conversion))
+        base_tax = vector_taxes.total_tax(vector_taxes.schedule_taxes(*args, 0.0))
+
+        rmds[..., t] = rmd
+        converted[..., t] = conversion
+        tax[..., t] = year_tax
+        additional_tax[..., t] = year_tax - base_tax
+
+        rate = growth[:, t][np.newaxis, :]
+        ira_balance = (ira_balance - rmd - conversion) * (1 + rate)
+        roth_balance = (roth_balance + conversion) * (1 + rate)
+        taxable_balance = (taxable_balance + rmd) * (1 + rate)
+
+    return ProjectionResult(
+        ages=ages, years=tax_years, ira=ira, roth=roth, rmd=rmds, conversions=converted,
+        tax=tax, additional_tax=additional_tax, ira_end=ira_balance, roth_end=roth_balance, taxable_end=taxable_balance)
+
+
+def level_strategies(amounts, conversion_years, years):
+    """Strategies that convert a fixed amount each year for the first conversion_years years."""
+    amounts = np.asarray(amounts, dtype=float)
+    schedule = np.zeros((len(amounts), years))
+    schedule[:, :conversion_years] = amounts[:, np.newaxis]
+    return schedule
@@ -0,0 +1,74 @@
+from htmltools import Tag, div, tags
+
+# Renders pages sent by the server with session.send_custom_message("numeric_grid", ...).
+# Cells arrive as numbers and are formatted here, clicking a header or a pager button
+# asks the server for another page through the <id>_sort and <id>_page inputs.
+_SCRIPT = """
+(function() {
+    if (window.numericGridInstalled) { return; }
+    window.numericGridInstalled = true;
+    const formatters = {
+        currency: new Intl.NumberFormat('en-US', {style: 'currency', currency: 'USD'}),
+        percent: new Intl.NumberFormat('en-US', {style: 'percent', minimumFractionDigits: 2, maximumFractionDigits: 2}),
+        number: new Intl.NumberFormat('en-US'),
+    };
+    function format(value, kind) {
+        if (value === null) { return ''; }
+        return typeof value === 'number' ? (formatters[kind] || formatters.number).format(value) : String(value);
+    }
+    function render(message) {
+        const grid = document.getElementById(message.id);
+        if (!grid) { return; }
+        const table = document.createElement('table');
+        table.className = 'table table-sm table-hover';
+        const header = table.createTHead().insertRow();
+        message.columns.forEach(function(column) {
+            const cell = document.createElement('th');
+            cell.textContent = column + (column === message.sort ? (message.descending ? ' \\u25BC' : ' \\u25B2') : '');
+            cell.style.cursor = 'pointer';
+            cell.onclick = function() {
+                const descending = column === message.sort && !message.descending;
+                Shiny.setInputValue(message.id + '_sort', {column: column, descending: descending});
+            };
+            header.appendChild(cell);
+        });
+        const body = table.createTBody();
+        message.rows.forEach(function(row) {
+            const tr = body.insertRow();
+            row.forEach(function(value, idx) {
+                const cell = tr.insertCell();
+                cell.textContent = format(value, message.formats[idx]);
+                cell.style.textAlign = 'right';
+            });
+        });
+        const pager = document.createElement('div');
+        if (message.pages > 1) {
+            [['\\u2039', message.page - 1], ['\\u203A', message.page + 1]].forEach(function(button) {
+                const link = document.createElement('button');
+                link.className = 'btn btn-sm btn-outline-secondary me-1';
+                link.textContent = button[0];
+                link.disabled = button[1] < 0 || button[1] >= message.pages;
+                link.onclick = function() { Shiny.setInputValue(message.id + '_page', button[1]); };
+                pager.appendChild(link);
+            });
+            pager.appendChild(document.createTextNode('Page ' + (message.page + 1) + ' of ' + message.pages));
+        }
+        grid.replaceChildren(table, pager);
+    }
+    $(document).on('shiny:connected', function() {
+        Shiny.addCustomMessageHandler('numeric_grid', render);
+    });
+})();
+"""
+
+
+def numeric_grid(id: str) -> Tag:
+    """
+    A table that is sent as raw numbers, one page at a time, and formatted in the browser.
+    Fill it from the server with grid_message(id, summary.paginate(...)).
+    """
+    return div(div(id=id, class_="numeric-grid"), tags.script(_SCRIPT))
+
+
+def grid_message(id: str, page: dict) -> dict:
+    return dict(page, id=id)
@@ -0,0 +1,202 @@
+"""
+Piecewise linear functions of income, the algebra the tax schedules are built from.
+
+Income taxes are continuous with a slope per bracket, capital gains, net investment income and
+surcharge cliffs are steps that apply a rate to a whole pool. Both are PiecewiseLinear, and so
+is their sum after each is shifted to the income it is applied on:
+
+    total = piecewise.total_tax_function(schedule)
+    total(np.linspace(0, 500000, 1001)) - total(0)    # additional tax of every conversion
+    total.invert(total(0) + 10000)                      # largest conversion costing $10,000
+
+Functions are right continuous like rate_at, at a breakpoint the next segment applies.
+"""
+from dataclasses import dataclass
+from typing import Tuple
+
+import numpy as np
+
+# adding continuous pieces leaves rounding sized jumps, which are not decreases
+TOLERANCE = 1e-9
+
+
+def _anchors(breakpoints, origin):
+    # every segment is anchored at its left breakpoint, the first one at the first breakpoint
+    first = breakpoints[:1] if len(breakpoints) else np.array([origin], dtype=float)
+    return np.concatenate([first, breakpoints])
+
+
+@dataclass(frozen=True, eq=False)
+class PiecewiseLinear:
+    """
+    Segment k covers [breakpoints[k - 1], breakpoints[k]) and is values[k] + slopes[k] * (x - anchors[k]),
+    so there is one more segment than breakpoints. Values are kept at the anchors rather than as
+    intercepts at zero so large incomes lose no precision.
+    """
+    breakpoints: np.ndarray
+    slopes: np.ndarray
+    values: np.ndarray
+    # where the only segment is anchored when there are no breakpoints
+    origin: float = 0.0
+    domain: Tuple[float, float] = (-np.inf, np.inf)
+
+    def __post_init__(self):
+        breakpoints = np.asarray(self.breakpoints, dtype=float)
+        slopes = np.asarray(self.slopes, dtype=float)
+        values = np.asarray(self.values, dtype=float)
+        if slopes.shape != (len(breakpoints) + 1,) or values.shape != slopes.shape:
+            raise ValueError(f"{len(breakpoints)} breakpoints need {len(breakpoints) + 1} slopes and values")
+        if np.any(np.diff(breakpoints) < 0):
+            raise ValueError("Breakpoints must be sorted")
+        object.__setattr__(self, 'breakpoints', breakpoints)
+        object.__setattr__(self, 'slopes', slopes)
+        object.__setattr__(self, 'values', values)
+        object.__setattr__(self, 'anchors', _anchors(breakpoints, self.origin))
+
+    @classmethod
+    def constant(cls, value):
+        return cls(np.empty(0), [0.0], [value])
+
+    @classmethod
+    def income_tax(cls, brackets):
+        """Tax on taxable income, same as TaxSchedule.apply_income_tax: nothing below zero, flat above the last bound."""
+        rates = np.array([rate for rate, bound in brackets], dtype=float)
+        uppers = np.array([bound for rate, bound in brackets], dtype=float)
+        lowers = np.concatenate([[0.0], uppers[:-1]])
+        base_tax = np.concatenate([[0.0], np.cumsum(rates[:-1] * (uppers[:-1] - lowers[:-1]))])
+        top = base_tax[-1] + rates[-1] * (uppers[-1] - lowers[-1])
+        return cls(np.concatenate([[0.0], uppers]), np.concatenate([[0.0], rates, [0.0]]),
+                   np.concatenate([[0.0], base_tax, [top]]))
+
+    @classmethod
+    def cliff(cls, brackets, pool):
+        """Rate of the bracket income falls in applied to all of pool, same as vector_taxes.capital_tax."""
+        rates = np.array([rate for rate, bound in brackets], dtype=float)
+        uppers = np.array([bound for rate, bound in brackets], dtype=float)
+        return cls(uppers[:-1], np.zeros(len(rates)), rates * pool)
+
+    @property
+    def intercepts(self):
+        """Value of every segment's line at zero."""
+        return self.values - self.slopes * self.anchors
+
+    @property
+    def jumps(self):
+        """Right limit less left limit at every breakpoint, the discontinuities."""
+        left = self.values[:-1] + self.slopes[:-1] * (self.breakpoints - self.anchors[:-1])
+        return self.values[1:] - left
+
+    def _segment(self, x):
+        return np.searchsorted(self.breakpoints, x, side='right')
+
+    def _at(self, idx, x):
+        return self.values[idx] + self.slopes[idx] * (x - self.anchors[idx])
+
+    def __call__(self, x):
+        """Evaluate at a scalar or an array of incomes, nan outside the domain."""
+        x = np.asarray(x, dtype=float)
+        result = self._at(self._segment(x), x)
+        lo, hi = self.domain
+        if lo > -np.inf or hi < np.inf:
+            result = np.where((x >= lo) & (x <= hi), result, np.nan)
+        return result if result.ndim else float(result)
+
+    def slope(self, x):
+        """Right derivative, the marginal rate of the next dollar."""
+        return self.slopes[self._segment(np.asarray(x, dtype=float))]
+
+    def _resample(self, breakpoints, inside):
+        """Slopes and anchored values on a finer set of breakpoints, inside is any point of the first segment."""
+        first = np.searchsorted(self.breakpoints, breakpoints[0], side='left') if len(breakpoints) else self._segment(inside)
+        idx = np.concatenate([[first], self._segment(breakpoints)]).astype(int)
+        return self.slopes[idx], self._at(idx, _anchors(breakpoints, inside))
+
+    def _combine(self, other, slopes, values):
+        lo, hi = max(self.domain[0], other.domain[0]), min(self.domain[1], other.domain[1])
+        breakpoints = np.union1d(self.breakpoints, other.breakpoints)
+        origin = lo if lo > -np.inf else (hi if hi < np.inf else 0.0)
+        ours, theirs = self._resample(breakpoints, origin), other._resample(breakpoints, origin)
+        return PiecewiseLinear(breakpoints, slopes(ours[0], theirs[0]), values(ours[1], theirs[1]), origin, (lo, hi))
+
+    def __add__(self, other):
+        if not isinstance(other, PiecewiseLinear):
+            return PiecewiseLinear(self.breakpoints, self.slopes, self.values + other, self.origin, self.domain)
+        return self._combine(other, np.add, np.add)
+
+    __radd__ = __add__
+
+    def __neg__(self):
+        return self * -1
+
+    def __sub__(self, other):
+        return self + (-other)
+
+    def __rsub__(self, other):
+        return (-self) + other
+
+    def __mul__(self, factor):
+        return PiecewiseLinear(self.breakpoints, self.slopes * factor, self.values * factor, self.origin, self.domain)
+
+    __rmul__ = __mul__
+
+    def compose(self, offset, scale=1.0):
+        """x -> f(scale * x + offset), eg the tax on a conversion x added to a base income of offset."""
+        if scale <= 0:
+            raise ValueError("Only increasing compositions keep the breakpoints in order")
+        lo, hi = ((bound - offset) / scale for bound in self.domain)
+        return PiecewiseLinear((self.breakpoints - offset) / scale, self.slopes * scale, self.values,
+                               (self.origin - offset) / scale, (lo, hi))
+
+    def deduct(self, deduction):
+        """x -> f(x - deduction), the tax on gross income when deduction comes off first."""
+        return self.compose(-deduction)
+
+    def restrict(self, lo, hi):
+        """The same function on [lo, hi] only, breakpoints outside are dropped."""
+        lo, hi = max(lo, self.domain[0]), min(hi, self.domain[1])
+        breakpoints = self.breakpoints[(self.breakpoints > lo) & (self.breakpoints <= hi)]
+        origin = lo if lo > -np.inf else (hi if hi < np.inf else 0.0)
+        slopes, values = self._resample(breakpoints, origin)
+        return PiecewiseLinear(breakpoints, slopes, values, origin, (lo, hi))
+
+    def is_nondecreasing(self):
+        scale = max(1.0, float(np.abs(self.values).max()))
+        return bool(np.all(self.slopes >= 0) and np.all(self.jumps >= -TOLERANCE * scale))
+
+    def invert(self, y):
+        """
+        Smallest x where f(x) >= y, for nondecreasing functions. Amounts the function never
+        reaches give inf, amounts it always exceeds give the start of the domain.
+        """
+        if not self.is_nondecreasing():
+            raise ValueError("Only nondecreasing functions can be inverted")
+        y = np.asarray(y, dtype=float)
+        count = len(self.breakpoints)
+        lo, hi = self.domain
+        # value every segment reaches before its end, the left limit at the next breakpoint
+        last = self._at(count, hi) if hi < np.inf else (np.inf if self.slopes[-1] > 0 else self.values[-1])
+        ends = np.maximum.accumulate(np.concatenate([self._at(np.arange(count), self.breakpoints), [last]]))
+        idx = np.minimum(np.searchsorted(ends, y, side='left'), count)
+        starts = np.concatenate([[lo], self.breakpoints])[idx]
+        slopes = self.slopes[idx]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            solved = np.where(slopes > 0, self.anchors[idx] + (y - self.values[idx]) / np.where(slopes > 0, slopes, 1), -np.inf)
+        result = np.where(y > ends[-1], np.inf, np.clip(np.maximum(starts, solved), lo, hi))
+        return result if result.ndim else float(result)
+
+
+def schedule_components(schedule_):
+    """federal, state, nit, longterm and every surcharge as functions of the conversion amount."""
+    components = {
+        'federal_tax': PiecewiseLinear.income_tax(schedule_.federal_brackets).compose(schedule_.ordinary_income()),
+        'state_tax': PiecewiseLinear.income_tax(schedule_.state_brackets).compose(schedule_.state_income()),
+    }
+    for cliff in schedule_.cliffs():
+        name = 'nit_tax' if cliff.name == 'nit' else 'longterm_tax' if cliff.name == 'longterm' else cliff.name
+        components[name] = PiecewiseLinear.cliff(cliff.brackets, cliff.pool).compose(cliff.income)
+    return components
+
+
+def total_tax_function(schedule_):
+    """Total tax of schedule_ as one function of the conversion amount."""
+    return sum(schedule_components(schedule_).values(), PiecewiseLinear.constant(0.0))
@@ -0,0 +1,112 @@
+"""
+Synthetic households for sizing batch runs and the API, no client data involved.
+
+Wages are lognormal with a Pareto tail, capital income, longterm gains and IRA balances are
+lognormal and only some households have them, balances grow with wages. Filing statuses and
+states are drawn from configurable weights; states without brackets in taxes.py pay no state tax.
+
+    python population.py 1000000 population.npz [seed]
+
+writes a compressed npz of one column per field, statuses and states stored as codes.
+"""
+from dataclasses import dataclass, field
+from typing import Dict, Iterator
+
+import numpy as np
+
+import api
+
+COLUMNS = ['pretax_income', 'capital_income', 'longterm_gains', 'assets', 'status', 'state', 'year']
+
+
+@dataclass(frozen=True)
+class PopulationConfig:
+    year: int = 2024
+    statuses: Dict[str, float] = field(default_factory=lambda: {'married': .5, 'single': .4, 'head': .1})
+    states: Dict[str, float] = field(default_factory=lambda: {'CA': .15, 'TX': .85})
+    # wages, households above the tail threshold follow a Pareto distribution
+    retired_share: float = .15
+    wage_median: float = 70000
+    wage_sigma: float = .7
+    tail_share: float = .02
+    tail_threshold: float = 400000
+    tail_alpha: float = 1.6
+    # share of households with each kind of income, and the lognormal parameters of the amounts
+    capital_share: float = .45
+    capital_median: float = 3000
+    capital_sigma: float = 1.5
+    gains_share: float = .25
+    gains_median: float = 8000
+    gains_sigma: float = 1.6
+    # IRA balances are a lognormal multiple of wages, retirees' of the median wage
+    assets_share: float = .8
+    assets_multiple: float = 1.5
+    assets_sigma: float = 1.0
+
+
+DEFAULT_CONFIG = PopulationConfig()
+
+
+def _lognormal(rng, median, sigma, count):
+    return median * np.exp(sigma * rng.standard_normal(count))
+
+
+def _sometimes(rng, share, amounts):
+    return np.where(rng.random(len(amounts)) < share, amounts, 0.0)
+
+
+def _categories(rng, weights, count):
+    names = list(weights)
+    probabilities = np.array([weights[name] for name in names], dtype=float)
+    return rng.choice(len(names), size=count, p=probabilities / probabilities.sum()).astype(np.uint8), names
+
+
+def generate(count, seed=0, config: PopulationConfig = DEFAULT_CONFIG):
+    """count households as a dict of columns plus the 'statuses' and 'states' the codes refer to."""
+    rng = np.random.default_rng(seed)
+    wages = _lognormal(rng, config.wage_median, config.wage_sigma, count)
+    tail = rng.random(count) < config.tail_share
+    wages[tail] = config.tail_threshold * (1 + rng.pareto(config.tail_alpha, tail.sum()))
+    wages[rng.random(count) < config.retired_share] = 0
+
+    assets = _sometimes(rng, config.assets_share,
+                        np.maximum(wages, config.wage_median) * _lognormal(rng, config.assets_multiple, config.assets_sigma, count))
+    status, statuses = _categories(rng, config.statuses, count)
+    state, states = _categories(rng, config.states, count)
+    return {
+        'pretax_income': np.round(wages),
+        'capital_income': np.round(_sometimes(rng, config.capital_share, _lognormal(rng, config.capital_median, config.capital_sigma, count))),
+        'longterm_gains': np.round(_sometimes(rng, config.gains_share, _lognormal(rng, config.gains_median, config.gains_sigma, count))),
+        'assets': np.round(assets),
+        'status': status,
+        'state': state,
+        'year': np.full(count, config.year, dtype=np.int16),
+        'statuses': np.array(statuses),
+        'states': np.array(states),
+    }
+
+
+def save(path, population):
+    np.savez_compressed(path, **population)
+
+
+def load(path):
+    with np.load(path) as data:
+        return {name: data[name] for name in data.files}
+
+
+def size(population):
+    return len(population['pretax_income'])
+
+
+def households(population, start=0, stop=None) -> Iterator[api.Household]:
+    """Rows start to stop as api.Household, for result_cache, api and batch_output."""
+    statuses, states = population['statuses'].tolist(), population['states'].tolist()
+    columns = {name: population[name][start:stop].tolist() for name in COLUMNS}
+    for pretax_income, capital_income, longterm_gains, assets, status, state, year in zip(*(columns[name] for name in COLUMNS)):
+        yield api.Household(pretax_income, assets, longterm_gains, capital_income, year, statuses[status], states[state])
+
+
+if __name__ == '__main__':
+    import sys
+    save(sys.argv[2], generate(int(sys.argv[1]), int(sys.argv[3]) if len(sys.argv) > 3 else 0))
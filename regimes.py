@@ -0,0 +1,170 @@
+"""
+Compare one household under several tax law regimes, eg current law against the TCJA sunset.
+
+Every regime is a full set of brackets like the tables in taxes.py. The conversion amounts
+where any regime changes rate are merged into one grid, and every regime is evaluated on that
+grid with the vectorized engine, so the curves line up and can be charted and tabled together.
+"""
+from dataclasses import dataclass, field
+from typing import Dict, List, Sequence
+
+import numpy as np
+import pandas as pd
+
+import simple_taxes
+import taxes
+import vector_taxes
+
+
+@dataclass(frozen=True)
+class Regime:
+    name: str
+    # filing status -> brackets, like taxes.FEDERAL_BRACKETS[year]
+    federal: Dict[str, list]
+    longterm: Dict[str, list]
+    nit: Dict[str, list]
+    deductions: Dict[str, float]
+    # state -> filing status -> brackets, states that are missing have no income tax
+    state: Dict[str, Dict[str, list]] = field(default_factory=dict)
+
+    def brackets(self, status, state):
+        state_brackets = self.state[state][status] if state in self.state else taxes.NO_INCOME_BRACKET
+        return self.federal[status], state_brackets, self.nit[status], self.longterm[status]
+
+    def schedule(self, base_income, max_convert, longterm_gains, investment_income, status, state, custom_deduction=None):
+        """The TaxSchedule of this regime, same as taxes.schedule for current law."""
+        federal_brackets, state_brackets, nit_brackets, longterm_brackets = self.brackets(status, state)
+        federal_deduction = custom_deduction if custom_deduction is not None else self.deductions[status]
+        return simple_taxes.FrozenTaxSchedule(base_income, investment_income, longterm_gains, federal_brackets, state_brackets,
+                                              nit_brackets, longterm_brackets, federal_deduction, 0, max_convert)
+
+
+def current_law(year):
+    return Regime(
+        name=f"Current law {year}",
+        federal=taxes.get_federal_brackets(year),
+        longterm=taxes.get_gains_brackets(year),
+        nit=taxes.get_nii_brackets(),
+        deductions=taxes.STANDARD_DEDUCTIONS[year],
+        state={state: years[year] for state, years in taxes.STATE_BRACKETS.items() if year in years},
+    )
+
+
+# 2017 law, which returns when the TCJA individual provisions expire
+PRE_TCJA_FEDERAL_BRACKETS = {
+    "single": [(.1, 9325), (.15, 37950), (.25, 91900), (.28, 191650), (.33, 416700), (.35, 418400), (.396, taxes.MAX_INCOME)],
+    "married": [(.1, 18650), (.15, 75900), (.25, 153100), (.28, 233350), (.33, 416700), (.35, 470700), (.396, taxes.MAX_INCOME)],
+    "head": [(.1, 13350), (.15, 50800), (.25, 131200), (.28, 212500), (.33, 416700), (.35, 444550), (.396, taxes.MAX_INCOME)],
+}
+PRE_TCJA_STANDARD_DEDUCTIONS = {"single": 6350, "married": 12700, "head": 9350}
+PRE_TCJA_PERSONAL_EXEMPTION = 4050
+PRE_TCJA_EXEMPTIONS = {"single": 1, "married": 2, "head": 1}
+
+
+def _round_bound(bound, inflation):
+    if bound >= taxes.MAX_INCOME:
+        return bound
+    return round(bound * inflation / 50) * 50
+
+
+def tcja_sunset(year, inflation=None):
+    """
+    An approximation of the law if the TCJA expires, 2017 brackets and deductions indexed to year.
+    By default inflation is measured by the growth of the 10% bracket, which was indexed the same way
+    under both laws. Personal exemptions are folded into the deduction and the 0% and 15% capital
+    gains rates end where the 15% and 35% ordinary brackets did.
+    """
+    if inflation is None:
+        inflation = taxes.get_federal_brackets(year)["single"][0][1] / PRE_TCJA_FEDERAL_BRACKETS["single"][0][1]
+    federal = {status: [(rate, _round_bound(bound, inflation)) for rate, bound in brackets]
+               for status, brackets in PRE_TCJA_FEDERAL_BRACKETS.items()}
+    longterm = {status: [(0, brackets[1][1]), (.15, brackets[5][1]), (.2, taxes.MAX_INCOME)]
+                for status, brackets in federal.items()}
+    deductions = {status: _round_bound(PRE_TCJA_STANDARD_DEDUCTIONS[status] + PRE_TCJA_EXEMPTIONS[status] * PRE_TCJA_PERSONAL_EXEMPTION, inflation)
+                  for status in PRE_TCJA_STANDARD_DEDUCTIONS}
+    current = current_law(year)
+    return Regime(f"TCJA sunset {year}", federal, longterm, current.nit, deductions, current.state)
+
+
+def default_regimes(year):
+    return [current_law(year), tcja_sunset(year)]
+
+
+@dataclass
+class Comparison:
+    names: List[str]
+    # merged conversion amounts, every regime's rates are constant between two of them
+    conversions: np.ndarray
+    # (regime, conversion) arrays
+    total_tax: np.ndarray
+    additional_tax: np.ndarray
+    income_rate: np.ndarray
+    recommendations: List[dict]
+
+
+def _breakpoints(regime, base_income, longterm_gains, investment_income, status, state, custom_deduction):
+    federal_brackets, state_brackets, nit_brackets, longterm_brackets = regime.brackets(status, state)
+    federal_deduction = custom_deduction if custom_deduction is not None else regime.deductions[status]
+    ordinary_income = base_income + investment_income - federal_deduction
+    state_income = base_income + investment_income + longterm_gains
+    capital_bracket_income = ordinary_income + longterm_gains
+    points = []
+    for brackets, income in [(federal_brackets, ordinary_income), (state_brackets, state_income),
+                             (nit_brackets, capital_bracket_income), (longterm_brackets, capital_bracket_income)]:
+        points += [bound - income for rate, bound in brackets]
+    return points
+
+
+def _recommend(conversions, income_rate, additional_tax, future_rate):
+    # like summary.explain, convert up to the first later segment taxed at or above the future rate
+    above = np.nonzero(income_rate[1:-1] >= future_rate)[0] + 1
+    if income_rate[0] > future_rate:
+        idx = 0
+    else:
+        idx = above[0] if len(above) else len(conversions) - 1
+    return {
+        'conversion': float(conversions[idx]),
+        'rate': float(income_rate[max(idx - 1, 0)]),
+        'additional_tax': float(additional_tax[idx]),
+    }
+
+
+def compare(regimes: Sequence[Regime], base_income, max_convert, longterm_gains, investment_income, status, state,
+            future_rate, custom_deduction=None):
+    points = [0.0, float(max_convert)]
+    for regime in regimes:
+        points += _breakpoints(regime, base_income, longterm_gains, investment_income, status, state, custom_deduction)
+    conversions = np.unique(np.clip(np.array(points, dtype=float), 0, max_convert))
+
+    total_tax, income_rate = [], []
+    for regime in regimes:
+        federal_brackets, state_brackets, nit_brackets, longterm_brackets = regime.brackets(status, state)
+        federal_deduction = custom_deduction if custom_deduction is not None else regime.deductions[status]
+        result = vector_taxes.schedule_taxes(base_income, investment_income, longterm_gains, federal_brackets, state_brackets,
+                                             nit_brackets, longterm_brackets, federal_deduction, 0, conversions)
+        total_tax.append(vector_taxes.total_tax(result))
+        income_rate.append(result['income_rate'])
+    total_tax = np.array(total_tax).reshape(len(regimes), len(conversions))
+    income_rate = np.array(income_rate).reshape(len(regimes), len(conversions))
+    additional_tax = total_tax - total_tax[:, :1]
+
+    recommendations = [_recommend(conversions, income_rate[idx], additional_tax[idx], future_rate) for idx in range(len(regimes))]
+    return Comparison([regime.name for regime in regimes], conversions, total_tax, additional_tax, income_rate, recommendations)
+
+
+def table(comparison: Comparison):
+    """One row per merged conversion amount, with each regime's additional tax and marginal rate."""
+    columns = {'Conversion Amount': comparison.conversions}
+    for idx, name in enumerate(comparison.names):
+        columns[f'{name} Additional Tax'] = comparison.additional_tax[idx]
+        columns[f'{name} Marginal Tax Rate'] = comparison.income_rate[idx]
+    return pd.DataFrame(columns)
+
+
+def recommendation_table(comparison: Comparison):
+    return pd.DataFrame({
+        'Regime': comparison.names,
+        'Conversion Amount': [recommendation['conversion'] for recommendation in comparison.recommendations],
+        'Marginal Tax Rate': [recommendation['rate'] for recommendation in comparison.recommendations],
+        'Additional Tax': [recommendation['additional_tax'] for recommendation in comparison.recommendations],
+    })
@@ -0,0 +1,209 @@
+"""
+Optional persistent cache of computed schedules, stored in SQLite so it survives restarts.
+
+Keys hash the normalized schedule inputs together with the version of the bracket data of
+their year and state and the engine and format versions, so edits to taxes.py, reloaded
+brackets or changes to the curve math never serve stale results. Entries are evicted least recently used once the store is over its size bound,
+and the most used entries are preloaded into memory on startup. Hits are recorded in batches, and a
+row that no longer loads is deleted and recomputed.
+
+Enable it by setting IRACONVERT_CACHE_PATH or calling configure(path).
+"""
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+
+import orjson
+
+import instrumentation
+import serialization
+import simple_taxes
+import taxes
+
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+DEFAULT_PRELOAD = 1000
+# hits are written back to the store this many at a time
+TOUCH_BATCH = 64
+
+
+def normalize(inputs):
+    # amounts are compared to the cent so "$100,000" and 100000.0 share an entry
+    return [round(float(value), 2) if isinstance(value, (int, float)) and not isinstance(value, bool) else value
+            for value in inputs]
+
+
+def cache_key(inputs, data_version=None):
+    # schedule inputs are (..., year, status, state, ...), only that year and state's data matter
+    data_version = data_version or taxes.data_version(inputs[4], inputs[6])
+    payload = orjson.dumps([normalize(inputs), data_version, simple_taxes.ENGINE_VERSION, serialization.FORMAT_VERSION])
+    return hashlib.sha256(payload).hexdigest()
+
+
+class PersistentCache:
+    def __init__(self, path, max_bytes=DEFAULT_MAX_BYTES, preload=DEFAULT_PRELOAD):
+        self.path = path
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute("PRAGMA synchronous=NORMAL")
+        self._connection.execute(
+            "CREATE TABLE IF NOT EXISTS schedules ("
+            "key TEXT PRIMARY KEY, blob BLOB NOT NULL, size INTEGER NOT NULL, "
+            "hits INTEGER NOT NULL DEFAULT 0, last_access REAL NOT NULL)")
+        self._connection.execute("CREATE INDEX IF NOT EXISTS schedules_last_access ON schedules (last_access)")
+        self._memory = {}
+        # key: (hits, last access) not yet written back
+        self._touched = {}
+        self._pending_touches = 0
+        self._bytes = self._total_bytes()
+        self.hits = 0
+        self.misses = 0
+        if preload:
+            self.warm(preload)
+
+    def warm(self, count):
+        """Load the most used entries into memory."""
+        with self._lock:
+            self._flush_touches()
+            rows = self._connection.execute(
+                "SELECT key, blob FROM schedules ORDER BY hits DESC LIMIT ?", (count,)).fetchall()
+            self._memory.update(rows)
+        return len(rows)
+
+    def _touch(self, key):
+        hits, _ = self._touched.get(key, (0, None))
+        self._touched[key] = (hits + 1, time.time())
+        self._pending_touches += 1
+        if self._pending_touches >= TOUCH_BATCH:
+            self._flush_touches()
+
+    def _flush_touches(self):
+        if self._touched:
+            self._connection.executemany("UPDATE schedules SET hits = hits + ?, last_access = ? WHERE key = ?",
+                                         [(hits, last_access, key) for key, (hits, last_access) in self._touched.items()])
+            self._touched.clear()
+        self._pending_touches = 0
+
+    def get(self, key):
+        with self._lock:
+            blob = self._memory.get(key)
+            if blob is None:
+                row = self._connection.execute("SELECT blob FROM schedules WHERE key = ?", (key,)).fetchone()
+                blob = row[0] if row else None
+            if blob is None:
+                self.misses += 1
+                return None
+            self._touch(key)
+        try:
+            schedule = serialization.from_bytes(blob)
+        except (ValueError, KeyError, TypeError):
+            # an old format or a truncated or corrupt row, IncompatibleBlob and orjson errors are ValueErrors
+            self.delete(key)
+            with self._lock:
+                self.misses += 1
+            return None
+        with self._lock:
+            self.hits += 1
+        return schedule
+
+    def put(self, key, schedule):
+        blob = serialization.to_bytes(schedule)
+        with self._lock:
+            self._bytes += len(blob) - self._size(key)
+            self._connection.execute(
+                "INSERT OR REPLACE INTO schedules (key, blob, size, hits, last_access) VALUES (?, ?, ?, 0, ?)",
+                (key, blob, len(blob), time.time()))
+            self._touched.pop(key, None)
+            self._evict()
+
+    def delete(self, key):
+        with self._lock:
+            self._memory.pop(key, None)
+            self._touched.pop(key, None)
+            self._bytes -= self._size(key)
+            self._connection.execute("DELETE FROM schedules WHERE key = ?", (key,))
+
+    def _size(self, key):
+        row = self._connection.execute("SELECT size FROM schedules WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else 0
+
+    def _evict(self):
+        if self._bytes <= self.max_bytes:
+            return
+        # other processes may share the store, only trust the running total to say when to look
+        self._bytes = self._total_bytes()
+        if self._bytes <= self.max_bytes:
+            return
+        self._flush_touches()
+        for key, size in self._connection.execute("SELECT key, size FROM schedules ORDER BY last_access").fetchall():
+            if self._bytes <= self.max_bytes:
+                break
+            self._connection.execute("DELETE FROM schedules WHERE key = ?", (key,))
+            self._memory.pop(key, None)
+            self._bytes -= size
+
+    def _total_bytes(self):
+        return self._connection.execute("SELECT COALESCE(SUM(size), 0) FROM schedules").fetchone()[0]
+
+    def get_or_compute(self, inputs, compute):
+        key = cache_key(inputs)
+        schedule = self.get(key)
+        if schedule is None:
+            schedule = compute()
+            self.put(key, schedule)
+        return schedule
+
+    def stats(self):
+        with self._lock:
+            entries, total = self._connection.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM schedules").fetchone()
+            lookups = self.hits + self.misses
+            return {
+                "path": self.path,
+                "entries": entries,
+                "bytes": total,
+                "max_bytes": self.max_bytes,
+                "preloaded": len(self._memory),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
+
+    def close(self):
+        with self._lock:
+            self._flush_touches()
+            self._connection.close()
+
+
+CACHE = None
+
+
+def configure(path, max_bytes=DEFAULT_MAX_BYTES, preload=DEFAULT_PRELOAD):
+    global CACHE
+    if CACHE is not None:
+        CACHE.close()
+    CACHE = PersistentCache(path, max_bytes, preload) if path else None
+    if CACHE is not None:
+        instrumentation.register_probe("result_cache", CACHE.stats)
+    else:
+        instrumentation.unregister_probe("result_cache")
+    return CACHE
+
+
+def schedule(*inputs, previous=None):
+    """
+    taxes.schedule, served from the persistent cache when one is configured.
+    A previous schedule is updated incrementally instead of computing from scratch.
+    """
+    compute = lambda: taxes.reschedule(previous, *inputs) if previous is not None else taxes.schedule(*inputs)
+    if CACHE is None:
+        return compute()
+    return CACHE.get_or_compute(inputs, compute)
+
+
+if os.environ.get("IRACONVERT_CACHE_PATH"):
+    configure(os.environ["IRACONVERT_CACHE_PATH"],
+              int(os.environ.get("IRACONVERT_CACHE_MAX_BYTES", DEFAULT_MAX_BYTES)),
+              int(os.environ.get("IRACONVERT_CACHE_PRELOAD", DEFAULT_PRELOAD)))
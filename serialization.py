@@ -0,0 +1,167 @@
+"""
+Compact encodings for saved TaxSchedules: a columnar binary format and orjson.
+
+Both store the schedule inputs, initial_tax and the three curves. Every curve is a
+float64 matrix with one row per TaxBracket; the binary format loads the matrix with
+np.frombuffer and only builds TaxBracket objects for the rows that are accessed.
+
+Binary layout:
+    magic (4 bytes) | format version (u16) | engine version (u16) | header length (u32)
+    | orjson header | padding to 8 bytes | float64 rows
+"""
+import struct
+from collections.abc import Sequence
+
+import numpy as np
+import orjson
+
+import simple_taxes
+from simple_taxes import Cliff, FrozenTaxSchedule, TaxBracket, TaxBundle
+
+MAGIC = b'IRAS'
+FORMAT_VERSION = 1
+_PREFIX = struct.Struct('<4sHHI')
+
+BUNDLES = ['state', 'federal', 'nit', 'longterm']
+CURVES = ['income_only_curve', 'capital_taxes', 'entire_curve']
+INPUTS = ['pretax_wage_income', 'ordinary_capital_income', 'qualified_capital_income', 'federal_brackets', 'state_brackets',
+          'nit_brackets', 'longterm_brackets', 'federal_deduction', 'state_deduction', 'max_conversion_amount']
+
+
+class IncompatibleBlob(ValueError):
+    """The blob was written by a different format or engine version and must be recomputed."""
+
+
+def _columns(surcharge_names):
+    columns = ['lower', 'upper']
+    for name in BUNDLES + list(surcharge_names):
+        columns += [f'{name}_rate', f'{name}_marginal', f'{name}_amount']
+    return columns
+
+
+def _row(bracket):
+    row = [bracket.lower, bracket.upper]
+    for name in BUNDLES:
+        bundle = getattr(bracket, name)
+        row += [bundle.rate, bundle.marginal, bundle.amount]
+    for name, bundle in bracket.surcharges:
+        row += [bundle.rate, bundle.marginal, bundle.amount]
+    return row
+
+
+def _bracket(row, surcharge_names):
+    bundles = [TaxBundle(*row[idx:idx + 3]) for idx in range(2, len(row), 3)]
+    state, federal, nit, longterm = bundles[:4]
+    return TaxBracket(row[0], row[1], state, federal, nit, longterm, tuple(zip(surcharge_names, bundles[4:])))
+
+
+class CurveColumns(Sequence):
+    """A curve backed by a float64 matrix. TaxBrackets are built when rows are accessed."""
+    def __init__(self, matrix, surcharge_names):
+        self.matrix = matrix
+        self.surcharge_names = tuple(surcharge_names)
+
+    def column(self, name):
+        return self.matrix[:, _columns(self.surcharge_names).index(name)]
+
+    def __len__(self):
+        return self.matrix.shape[0]
+
+    def __getitem__(self, idx):
+        if isinstance(idx, slice):
+            return [self[i] for i in range(*idx.indices(len(self)))]
+        return _bracket(self.matrix[idx].tolist(), self.surcharge_names)
+
+    def __eq__(self, other):
+        return list(self) == list(other)
+
+
+def curve_columns(curve):
+    """Column name -> array of values for a curve, eg for JSON responses."""
+    names = [name for name, bundle in curve[0].surcharges] if len(curve) else []
+    if isinstance(curve, CurveColumns):
+        matrix = curve.matrix
+    else:
+        matrix = np.array([_row(bracket) for bracket in curve], dtype=np.float64).reshape(len(curve), len(_columns(names)))
+    return {name: matrix[:, idx] for idx, name in enumerate(_columns(names))}
+
+
+def _header(schedule):
+    surcharges = [{'name': cliff.name, 'brackets': cliff.brackets, 'pool': cliff.pool, 'income': cliff.income}
+                  for cliff in getattr(schedule, 'surcharges', ())]
+    header = {name: getattr(schedule, name) for name in INPUTS}
+    header['surcharges'] = surcharges
+    header['lengths'] = [len(getattr(schedule, curve)) for curve in CURVES]
+    return header
+
+
+def _matrix(schedule):
+    rows = [_row(schedule.initial_tax)]
+    for curve in CURVES:
+        rows += [_row(bracket) for bracket in getattr(schedule, curve)]
+    names = [cliff.name for cliff in getattr(schedule, 'surcharges', ())]
+    return np.array(rows, dtype=np.float64).reshape(len(rows), len(_columns(names)))
+
+
+def _restore(header, matrix):
+    # build the schedule without running the constructor, nothing needs to be recomputed
+    schedule = FrozenTaxSchedule.__new__(FrozenTaxSchedule)
+    for name in INPUTS:
+        setattr(schedule, name, header[name])
+    for name in ['federal_brackets', 'state_brackets', 'nit_brackets', 'longterm_brackets']:
+        setattr(schedule, name, simple_taxes.freeze_brackets(header[name]))
+    schedule.surcharges = tuple(
+        Cliff(cliff['name'], tuple(tuple(bracket) for bracket in cliff['brackets']), cliff['pool'], cliff['income'])
+        for cliff in header['surcharges'])
+    names = [cliff.name for cliff in schedule.surcharges]
+
+    schedule.initial_tax = _bracket(matrix[0].tolist(), names)
+    start = 1
+    for curve, length in zip(CURVES, header['lengths']):
+        setattr(schedule, curve, CurveColumns(matrix[start:start + length], names))
+        start += length
+    # the curves are read only views of the blob
+    object.__setattr__(schedule, '_frozen', True)
+    return schedule
+
+
+def to_bytes(schedule):
+    header = orjson.dumps(_header(schedule))
+    prefix = _PREFIX.pack(MAGIC, FORMAT_VERSION, simple_taxes.ENGINE_VERSION, len(header))
+    padding = b'\0' * (-(len(prefix) + len(header)) % 8)
+    return prefix + header + padding + _matrix(schedule).tobytes()
+
+
+def from_bytes(blob):
+    if len(blob) < _PREFIX.size:
+        raise IncompatibleBlob("Blob is too short")
+    magic, format_version, engine_version, header_length = _PREFIX.unpack_from(blob)
+    if magic != MAGIC:
+        raise IncompatibleBlob("Not a saved schedule")
+    if format_version != FORMAT_VERSION or engine_version != simple_taxes.ENGINE_VERSION:
+        raise IncompatibleBlob(f"Saved with format {format_version} engine {engine_version}, "
+                               f"expected format {FORMAT_VERSION} engine {simple_taxes.ENGINE_VERSION}")
+    header_start = _PREFIX.size
+    header = orjson.loads(blob[header_start:header_start + header_length])
+    offset = header_start + header_length
+    offset += -offset % 8
+    names = [cliff['name'] for cliff in header['surcharges']]
+    matrix = np.frombuffer(blob, dtype=np.float64, offset=offset).reshape(-1, len(_columns(names)))
+    return _restore(header, matrix)
+
+
+def to_json(schedule):
+    document = _header(schedule)
+    document['format_version'] = FORMAT_VERSION
+    document['engine_version'] = simple_taxes.ENGINE_VERSION
+    document['columns'] = _columns([cliff['name'] for cliff in document['surcharges']])
+    document['rows'] = _matrix(schedule)
+    return orjson.dumps(document, option=orjson.OPT_SERIALIZE_NUMPY)
+
+
+def from_json(data):
+    document = orjson.loads(data)
+    if document.get('format_version') != FORMAT_VERSION or document.get('engine_version') != simple_taxes.ENGINE_VERSION:
+        raise IncompatibleBlob(f"Saved with format {document.get('format_version')} engine {document.get('engine_version')}")
+    matrix = np.array(document['rows'], dtype=np.float64).reshape(-1, len(document['columns']))
+    return _restore(document, matrix)
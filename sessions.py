@@ -0,0 +1,230 @@
+import sys
+import threading
+import time
+from dataclasses import dataclass, fields, is_dataclass
+from typing import Any, Callable, Dict, Optional
+
+import instrumentation
+
+# per point arrays of a plotly trace, the bulk of a figure
+FIGURE_ARRAYS = ('x', 'y', 'z', 'text', 'hovertext', 'customdata', 'ids')
+# a python float held in a tuple, what plotly keeps for arrays that are not numpy
+POINT_BYTES = 32
+# layout, trace attributes and everything else that does not grow with the points
+FIGURE_OVERHEAD_BYTES = 16 * 1024
+
+
+def figure_size(figure):
+    """Bytes of a plotly figure estimated from its point counts, without serializing it."""
+    size = FIGURE_OVERHEAD_BYTES
+    for trace in figure.data:
+        for name in FIGURE_ARRAYS:
+            # the raw property dict, indexing the trace validates the name on every call
+            value = trace._props.get(name)
+            if value is None:
+                continue
+            size += int(value.nbytes) if hasattr(value, 'nbytes') else len(value) * POINT_BYTES
+    return size
+
+
+def approximate_size(value, _seen=None):
+    """
+    Approximate number of bytes held by a value, following containers, dataclasses,
+    DataFrames, numpy arrays and plotly figures. Shared objects are only counted once,
+    figures are estimated by figure_size.
+    """
+    if _seen is None:
+        _seen = set()
+    if id(value) in _seen:
+        return 0
+    _seen.add(id(value))
+
+    if hasattr(value, 'memory_usage') and hasattr(value, 'columns'):
+        # pandas DataFrame
+        return int(value.memory_usage(deep=True).sum())
+    if hasattr(value, 'nbytes') and hasattr(value, 'dtype'):
+        # numpy array
+        return int(value.nbytes)
+    if hasattr(value, 'to_plotly_json') and hasattr(value, 'data'):
+        return figure_size(value)
+
+    size = sys.getsizeof(value)
+    if isinstance(value, (str, bytes, bytearray, int, float, bool, type(None))):
+        return size
+    if isinstance(value, dict):
+        for key, item in value.items():
+            size += approximate_size(key, _seen) + approximate_size(item, _seen)
+    elif isinstance(value, (list, tuple, set, frozenset)):
+        for item in value:
+            size += approximate_size(item, _seen)
+    elif is_dataclass(value):
+        for field in fields(value):
+            size += approximate_size(getattr(value, field.name), _seen)
+    elif hasattr(value, '__dict__'):
+        size += approximate_size(vars(value), _seen)
+    return size
+
+
+@dataclass
+class EvictionPolicy:
+    # sessions idle for longer than this drop their large artifacts
+    idle_seconds: float = 600
+    # artifacts smaller than this are cheap to keep around
+    min_artifact_bytes: int = 64 * 1024
+    # ceiling for artifacts across all sessions, None for no ceiling
+    max_total_bytes: Optional[int] = 512 * 1024 * 1024
+    # how often the sweeper enforces the policy when no session is computing
+    sweep_seconds: float = 60
+
+
+@dataclass
+class Artifact:
+    key: Any
+    value: Any
+    nbytes: int
+
+
+class SessionState:
+    """
+    Cached artifacts for one session. Artifacts are stored with the inputs they were
+    computed from and recomputed on demand if they were evicted or the inputs changed.
+    """
+    def __init__(self, session_id, registry):
+        self.session_id = session_id
+        self.registry = registry
+        self.artifacts: Dict[str, Artifact] = {}
+        self.last_access = time.monotonic()
+        self.evictions = 0
+
+    def touch(self):
+        self.last_access = time.monotonic()
+
+    def get(self, name: str, key, compute: Callable[[], Any]):
+        self.touch()
+        artifact = self.artifacts.get(name)
+        if artifact is not None and artifact.key == key:
+            return artifact.value
+        value = compute()
+        self.artifacts[name] = Artifact(key, value, approximate_size(value))
+        self.registry.enforce()
+        return value
+
+    def previous(self, name: str):
+        """The last value stored under name, whatever inputs it was computed from, or None."""
+        artifact = self.artifacts.get(name)
+        return artifact.value if artifact is not None else None
+
+    def evict(self, min_bytes=0):
+        freed = 0
+        for name in list(self.artifacts):
+            artifact = self.artifacts[name]
+            if artifact.nbytes >= min_bytes:
+                freed += artifact.nbytes
+                del self.artifacts[name]
+                self.evictions += 1
+        return freed
+
+    def total_bytes(self):
+        return sum(artifact.nbytes for artifact in self.artifacts.values())
+
+    def memory_usage(self):
+        return {name: artifact.nbytes for name, artifact in self.artifacts.items()}
+
+
+class Sweeper:
+    """Enforce a registry's policy every sweep_seconds, so idle sessions are evicted on a quiet server too."""
+    def __init__(self, registry):
+        self.registry = registry
+        self.sweeps = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='session-sweeper', daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join(timeout=self.registry.policy.sweep_seconds + 1)
+
+    def _run(self):
+        while not self._stop.wait(self.registry.policy.sweep_seconds):
+            self.registry.enforce()
+            self.sweeps += 1
+
+
+class SessionRegistry:
+    def __init__(self, policy: Optional[EvictionPolicy] = None):
+        self.policy = policy or EvictionPolicy()
+        self.sessions: Dict[str, SessionState] = {}
+        self._lock = threading.Lock()
+        self.sweeper = None
+
+    def start_sweeper(self):
+        """Start sweeping in the background, once per registry."""
+        if self.sweeper is None:
+            self.sweeper = Sweeper(self).start()
+        return self.sweeper
+
+    def stop_sweeper(self):
+        if self.sweeper is not None:
+            self.sweeper.stop()
+            self.sweeper = None
+
+    def register(self, session_id):
+        with self._lock:
+            state = SessionState(session_id, self)
+            self.sessions[session_id] = state
+            return state
+
+    def unregister(self, session_id):
+        with self._lock:
+            self.sessions.pop(session_id, None)
+
+    def total_bytes(self):
+        with self._lock:
+            return sum(state.total_bytes() for state in self.sessions.values())
+
+    def enforce(self, now=None):
+        """Evict large artifacts from idle sessions, then from the least recently used sessions until under the ceiling."""
+        now = time.monotonic() if now is None else now
+        policy = self.policy
+        freed = 0
+        with self._lock:
+            states = sorted(self.sessions.values(), key=lambda state: state.last_access)
+            for state in states:
+                if now - state.last_access > policy.idle_seconds:
+                    freed += state.evict(policy.min_artifact_bytes)
+
+            if policy.max_total_bytes is not None:
+                total = sum(state.total_bytes() for state in states)
+                # never evict from the most recent session, it is the one being served
+                for state in states[:-1]:
+                    if total <= policy.max_total_bytes:
+                        break
+                    evicted = state.evict(policy.min_artifact_bytes)
+                    total -= evicted
+                    freed += evicted
+        return freed
+
+    def memory_report(self):
+        with self._lock:
+            states = list(self.sessions.values())
+        now = time.monotonic()
+        return {
+            "sessions": len(states),
+            "total_bytes": sum(state.total_bytes() for state in states),
+            "max_total_bytes": self.policy.max_total_bytes,
+            "per_session": {
+                state.session_id: {
+                    "idle_seconds": now - state.last_access,
+                    "evictions": state.evictions,
+                    "bytes": state.memory_usage(),
+                }
+                for state in states
+            },
+        }
+
+
+REGISTRY = SessionRegistry()
+instrumentation.register_probe("sessions", REGISTRY.memory_report)
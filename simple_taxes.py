@@ -1,14 +1,24 @@
-from dataclasses import dataclass
+from dataclasses import dataclass, replace
+from functools import cached_property, lru_cache
 from collections import namedtuple
+import copy
+import heapq
+from typing import Tuple
 
-@dataclass
+import piecewise
+import tracing
+
+# bump when a change to the curve math would make previously saved schedules wrong
+ENGINE_VERSION = 1
+
+@dataclass(frozen=True)
 class TaxBundle:
     rate: float
     marginal: float
 
     amount: float
 
-@dataclass
+@dataclass(frozen=True)
 class TaxBracket:
     lower: float
     upper: float
@@ -17,20 +27,102 @@ class TaxBracket:
     federal: TaxBundle
     nit: TaxBundle
     longterm: TaxBundle
+    # (name, TaxBundle) for every additional cliff schedule, eg IRMAA
+    surcharges: Tuple[Tuple[str, TaxBundle], ...] = ()
 
     def total_tax(self):
-        return self.state.amount + self.federal.amount + self.nit.amount + self.longterm.amount
+        return self.state.amount + self.federal.amount + self.nit.amount + self.longterm.amount + self.total_surcharge()
 
     def total_capital_tax(self):
         return self.nit.amount + self.longterm.amount
 
+    def total_surcharge(self):
+        return sum(bundle.amount for name, bundle in self.surcharges)
+
+    def surcharge_jump(self):
+        # dollars added by the surcharges that step up exactly at this point
+        return sum(bundle.amount * bundle.marginal / bundle.rate for name, bundle in self.surcharges if bundle.rate)
+
     def total_income_tax(self):
         return self.federal.rate + self.state.rate
 
 
+def _moved(bracket, lower, upper):
+    # dataclasses.replace is several times slower and shifting a curve moves every bracket
+    return TaxBracket(lower, upper, bracket.state, bracket.federal, bracket.nit, bracket.longterm, bracket.surcharges)
+
+
+# return absolute rate and marginal rate
+def rate_at(absolute_income, brackets, is_capital=False):
+    prev_rate = 0
+    prev_bound = 0
+    for rate, bound in brackets:
+        if absolute_income < bound:
+            if not is_capital:
+                return rate, rate
+            elif absolute_income == prev_bound:
+                return rate, rate - prev_rate
+            else:
+                return rate, 0
+        prev_rate = rate
+        prev_bound = bound
+    return brackets[-1][0], 0
+
+
+@dataclass(frozen=True)
+class Cliff:
+    """
+    A surcharge where crossing a threshold applies the new rate to a whole pool of income
+    rather than to the marginal dollar, eg NIIT, longterm capital gains, IRMAA or an ACA credit cliff.
+    For flat dollar surcharges use a pool of 1 and the dollar amounts as the rates.
+    """
+    name: str
+    # (rate, upper_bound) like the income brackets
+    brackets: tuple
+    pool: float
+    # income placed on the brackets before any conversion
+    income: float
+
+    def jumps(self, max_conversion_amount):
+        """(conversion_amount, rate, marginal) for every threshold crossed, in ascending order."""
+        prev_rate = 0
+        for idx, (rate, bound) in enumerate(self.brackets):
+            if idx > 0:
+                conversion_amount = prev_bound - self.income
+                if conversion_amount >= max_conversion_amount:
+                    break
+                if conversion_amount >= 0:
+                    yield conversion_amount, rate, rate - prev_rate
+            prev_rate = rate
+            prev_bound = bound
+
+    def bundle(self, conversion_amount):
+        rate, marginal = rate_at(self.income + conversion_amount, self.brackets, is_capital=True)
+        return TaxBundle(rate, marginal, rate * self.pool)
+
+
+def merge_cliff_jumps(cliffs, max_conversion_amount):
+    """
+    Merge the jumps of any number of cliffs in one sorted pass.
+    Returns [(conversion_amount, [(cliff, rate, marginal), ...]), ...] in ascending order.
+    """
+    def stream(idx, cliff):
+        for amount, rate, marginal in cliff.jumps(max_conversion_amount):
+            yield amount, idx, rate, marginal
+
+    streams = [stream(idx, cliff) for idx, cliff in enumerate(cliffs)]
+    merged = []
+    for amount, idx, rate, marginal in heapq.merge(*streams):
+        if merged and merged[-1][0] == amount:
+            merged[-1][1].append((cliffs[idx], rate, marginal))
+        else:
+            merged.append((amount, [(cliffs[idx], rate, marginal)]))
+    return merged
+
+
 class TaxSchedule:
     # brackets are of the form (rate, upper_bound)
-    def __init__(self, pretax_wage_income, ordinary_capital_income, qualified_capital_income, federal_brackets, state_brackets, nit_brackets, longterm_brackets, federal_deduction, state_deduction):
+    def __init__(self, pretax_wage_income, ordinary_capital_income, qualified_capital_income, federal_brackets, state_brackets, nit_brackets, longterm_brackets, federal_deduction, state_deduction, surcharges=()):
         self.pretax_wage_income = pretax_wage_income
         self.ordinary_capital_income = ordinary_capital_income
         self.qualified_capital_income = qualified_capital_income
@@ -41,34 +133,57 @@ class TaxSchedule:
 
         self.federal_deduction = federal_deduction
         self.state_deduction = state_deduction
+        # additional Cliffs on top of net investment and longterm capital gains tax
+        self.surcharges = tuple(surcharges)
 
         self.initial_tax = self._construct_bracket_from_one_point(0)
 
     def additional_tax(self, conversion_amount):
+        # one bracket is cheaper than composing the total tax function for a single amount
         new_tax = self._construct_bracket_from_one_point(conversion_amount)
         return new_tax.total_tax() - self.initial_tax.total_tax()
 
+    def total_tax_function(self):
+        """Every tax and surcharge summed into one PiecewiseLinear function of the conversion amount."""
+        return piecewise.total_tax_function(self)
+
+    def additional_taxes(self, conversion_amounts):
+        """Tax added by a conversion amount or an array of them, read off total_tax_function."""
+        total = self.total_tax_function()
+        return total(conversion_amounts) - total(0)
+
     def _construct_bracket_from_one_point(self, conversion_amount):
         return self._construct_bracket_from_two_points(conversion_amount, conversion_amount)
 
-    def _construct_bracket_from_two_points(self, conversion_amount, conversion_amount2):
-        state_rate, state_marginal = self.rate_at(self.state_income() +  conversion_amount, self.state_brackets)
-        federal_rate, federal_marginal = self.rate_at(self.ordinary_income() + conversion_amount, self.federal_brackets)
-        nit_rate, nit_marginal = self.rate_at(self._income_for_capital_brackets() + conversion_amount2, self.nit_brackets, is_capital=True)
-        longterm_rate, longterm_marginal = self.rate_at(self._income_for_capital_brackets() + conversion_amount2, self.longterm_brackets, is_capital=True)
+    def _construct_bracket_from_two_points(self, conversion_amount, conversion_amount2, bundles=None):
+        # bundles memoizes each component's rates and taxes by conversion amount so unchanged components can be reused
+        if bundles is None:
+            bundles = {}
 
-        state_tax = self.state_tax(conversion_amount2)
-        federal_tax = self.federal_tax(conversion_amount2)
-        nit_tax = self.nit_tax(conversion_amount2)
-        longterm_tax = self.longterm_tax(conversion_amount2)
+        def memoized(component, key, compute):
+            memo = bundles.setdefault(component, {})
+            if key not in memo:
+                memo[key] = compute()
+            return memo[key]
+
+        state = TaxBundle(
+            *memoized('state', ('rate', conversion_amount), lambda: self.rate_at(self.state_income() + conversion_amount, self.state_brackets)),
+            memoized('state', ('tax', conversion_amount2), lambda: self.state_tax(conversion_amount2)))
+        federal = TaxBundle(
+            *memoized('federal', ('rate', conversion_amount), lambda: self.rate_at(self.ordinary_income() + conversion_amount, self.federal_brackets)),
+            memoized('federal', ('tax', conversion_amount2), lambda: self.federal_tax(conversion_amount2)))
+
+        # cliff bundles only depend on the upper end of the segment
+        nit, longterm, *surcharges = [memoized(cliff.name, conversion_amount2, lambda cliff=cliff: cliff.bundle(conversion_amount2)) for cliff in self.cliffs()]
 
         return TaxBracket(
             lower=conversion_amount,
             upper=conversion_amount2,
-            state=TaxBundle(state_rate, state_marginal, state_tax),
-            federal=TaxBundle(federal_rate, federal_marginal, federal_tax),
-            nit=TaxBundle(nit_rate, nit_marginal, nit_tax),
-            longterm=TaxBundle(longterm_rate, longterm_marginal, longterm_tax)
+            state=state,
+            federal=federal,
+            nit=nit,
+            longterm=longterm,
+            surcharges=tuple((cliff.name, bundle) for cliff, bundle in zip(self.surcharges, surcharges))
         )
 
     def apply_income_tax(self, income, brackets):
@@ -116,6 +231,12 @@ class TaxSchedule:
     def _income_for_capital_brackets(self):
         return self.ordinary_income() + self.qualified_capital_income
 
+    def cliffs(self):
+        return [
+            Cliff('nit', tuple(self.nit_brackets), self.ordinary_capital_income + self.qualified_capital_income, self._income_for_capital_brackets()),
+            Cliff('longterm', tuple(self.longterm_brackets), self.qualified_capital_income, self._income_for_capital_brackets()),
+        ] + list(self.surcharges)
+
     def _keypoints(self, income, brackets, max_conversion_amount):
         keyponints = []
         for rate, bound in brackets:
@@ -130,19 +251,7 @@ class TaxSchedule:
 
     # return absolute rate and marginal rate
     def rate_at(self, absolute_income, brackets, is_capital=False):
-        prev_rate = 0
-        prev_bound = 0
-        for rate, bound in brackets:
-            if absolute_income < bound:
-                if not is_capital:
-                    return rate, rate
-                elif absolute_income == prev_bound:
-                    return rate, rate - prev_rate
-                else:
-                    return rate, 0
-            prev_rate = rate
-            prev_bound = bound
-        return brackets[-1][0], 0
+        return rate_at(absolute_income, brackets, is_capital)
 
     def _construct_income_keypoints(self, max_conversion_amount):
         keypoints = set([0])
@@ -152,33 +261,261 @@ class TaxSchedule:
         return sorted(list(keypoints))
 
     def _construct_capital_keypoints(self, max_conversion_amount):
-        keypoints = set()
-        keypoints.update(self._keypoints(self._income_for_capital_brackets(), self.nit_brackets, max_conversion_amount))
-        keypoints.update(self._keypoints(self._income_for_capital_brackets(), self.longterm_brackets, max_conversion_amount))
-        print(keypoints)
-        return sorted(list(keypoints))
+        return [amount for amount, jumps in merge_cliff_jumps(self.cliffs(), max_conversion_amount)]
 
-    def tax_curve(self, max_conversion_amount):
-        income_keypoints = self._construct_income_keypoints(max_conversion_amount)
-        capital_keypoints = self._construct_capital_keypoints(max_conversion_amount)
+    def _construct_capital_taxes(self, max_conversion_amount):
+        # walk the merged jumps once, carrying each cliff's current rate instead of re-evaluating every cliff at every jump
+        cliffs = self.cliffs()
+        bundles = {cliff.name: cliff.bundle(0) for cliff in cliffs}
 
         capital_taxes = []
-        for conversion_amount in capital_keypoints:
-            capital_taxes.append(self._construct_bracket_from_one_point(conversion_amount))
-
-        income_only_curve = []
-        for i in range(len(income_keypoints) - 1):
-            income_only_curve.append(self._construct_bracket_from_two_points(income_keypoints[i], income_keypoints[i + 1]))
-
-        all_keypoints = sorted(list(set(income_keypoints + capital_keypoints)))
-        entire_curve = []
-        for i in range(len(all_keypoints) - 1):
-            entire_curve.append(self._construct_bracket_from_two_points(all_keypoints[i], all_keypoints[i + 1]))
+        for amount, jumps in merge_cliff_jumps(cliffs, max_conversion_amount):
+            point = {name: TaxBundle(bundle.rate, 0, bundle.amount) for name, bundle in bundles.items()}
+            for cliff, rate, marginal in jumps:
+                point[cliff.name] = TaxBundle(rate, marginal, rate * cliff.pool)
+            bundles = point
+
+            state_rate, state_marginal = self.rate_at(self.state_income() + amount, self.state_brackets)
+            federal_rate, federal_marginal = self.rate_at(self.ordinary_income() + amount, self.federal_brackets)
+            capital_taxes.append(TaxBracket(
+                lower=amount,
+                upper=amount,
+                state=TaxBundle(state_rate, state_marginal, self.state_tax(amount)),
+                federal=TaxBundle(federal_rate, federal_marginal, self.federal_tax(amount)),
+                nit=point['nit'],
+                longterm=point['longterm'],
+                surcharges=tuple((cliff.name, point[cliff.name]) for cliff in self.surcharges)
+            ))
+        return capital_taxes
+
+    def _curve_keypoints(self, max_conversion_amount, include_capital=True):
+        keypoints = set(self._construct_income_keypoints(max_conversion_amount))
+        if include_capital:
+            keypoints.update(self._construct_capital_keypoints(max_conversion_amount))
+        return sorted(keypoints)
+
+    def iter_curve(self, max_conversion_amount=None, include_capital=True, bundles=None):
+        """
+        The brackets of entire_curve, or of income_only_curve without include_capital, in ascending order.
+        Each bracket is computed when it is reached, so consumers that stop early skip the rest of the curve.
+        A curve already saved up to the same max is served as is.
+        """
+        curve = self.__dict__.get('entire_curve' if include_capital else 'income_only_curve')
+        if curve is not None and bundles is None and max_conversion_amount in (None, self.max_conversion_amount):
+            return iter(curve)
+        if max_conversion_amount is None:
+            max_conversion_amount = self.max_conversion_amount
+        if bundles is None:
+            bundles = getattr(self, '_bundles', {})
+        # finding the keypoints is cheap, constructing the brackets between them is not
+        return self._brackets(self._curve_keypoints(max_conversion_amount, include_capital), bundles)
+
+    def _brackets(self, keypoints, bundles):
+        for lower, upper in zip(keypoints, keypoints[1:]):
+            yield self._construct_bracket_from_two_points(lower, upper, bundles)
+
+    @tracing.traced("TaxSchedule.tax_curve")
+    def tax_curve(self, max_conversion_amount, bundles=None):
+        if bundles is None:
+            bundles = {}
+        with tracing.span("TaxSchedule.keypoints"):
+            income_keypoints = self._construct_income_keypoints(max_conversion_amount)
+            capital_taxes = self._construct_capital_taxes(max_conversion_amount)
+            capital_keypoints = [bracket.upper for bracket in capital_taxes]
+
+        with tracing.span("TaxSchedule.brackets"):
+            income_only_curve = list(self._brackets(income_keypoints, bundles))
+            entire_curve = list(self._brackets(sorted(set(income_keypoints + capital_keypoints)), bundles))
+            tracing.set_attribute("brackets", len(income_only_curve) + len(entire_curve))
         return income_only_curve, capital_taxes, entire_curve
 
-    def save_curve(self, max_conversion_amount):
-        income_only_curve, capital_taxes, entire_curve = self.tax_curve(max_conversion_amount)
+    @tracing.traced("TaxSchedule.save_curve")
+    def save_curve(self, max_conversion_amount, bundles=None):
+        if bundles is None:
+            bundles = {}
+        income_only_curve, capital_taxes, entire_curve = self.tax_curve(max_conversion_amount, bundles)
         self.income_only_curve = income_only_curve
         self.capital_taxes = capital_taxes
         self.entire_curve = entire_curve
         self.max_conversion_amount = max_conversion_amount
+        self._bundles = bundles
+
+    def gross_income(self):
+        return self.pretax_wage_income + self.ordinary_capital_income + self.qualified_capital_income
+
+    def with_changes(self, **changes):
+        """
+        A new schedule with some of the incomes or deductions changed. Bracket tables are shared,
+        and the curve is rebuilt reusing the bundles of every component whose income did not change,
+        eg a new federal deduction only recomputes federal and capital gains bundles.
+        Surcharge cliffs are assumed to be placed on gross income and are shifted with it.
+        """
+        unknown = set(changes) - set(DERIVABLE_INPUTS)
+        if unknown:
+            raise TypeError(f"Cannot derive a schedule with changed {sorted(unknown)}")
+
+        derived = copy.copy(self)
+        self._apply_changes(derived, changes)
+        return derived
+
+    def _apply_changes(self, derived, changes):
+        for name, value in changes.items():
+            setattr(derived, name, value)
+        income_change = derived.gross_income() - self.gross_income()
+        if income_change:
+            derived.surcharges = tuple(replace(cliff, income=cliff.income + income_change) for cliff in self.surcharges)
+
+        bundles = {}
+        previous = getattr(self, '_bundles', {})
+        if derived.state_income() == self.state_income() and 'state' in previous:
+            bundles['state'] = dict(previous['state'])
+        if derived.ordinary_income() == self.ordinary_income() and 'federal' in previous:
+            bundles['federal'] = dict(previous['federal'])
+        for old, new in zip(self.cliffs(), derived.cliffs()):
+            if old == new and old.name in previous:
+                bundles[old.name] = dict(previous[old.name])
+
+        derived.initial_tax = derived._construct_bracket_from_one_point(0)
+        if hasattr(self, 'max_conversion_amount'):
+            derived.save_curve(self.max_conversion_amount, bundles)
+
+    def shifted(self, offset, max_conversion_amount):
+        """
+        A new schedule with offset more pretax wage income, its curves cut out of this schedule's.
+        Every income and surcharge moves with the wage, so a bracket at conversion amount a here is
+        at a - offset in the new schedule. This schedule's curves must reach max_conversion_amount + offset
+        and have no keypoint inside the first offset dollars, only the bracket cut at the top is recomputed.
+        """
+        derived = copy.copy(self)
+        self._apply_shift(derived, offset, max_conversion_amount)
+        return derived
+
+    def _apply_shift(self, derived, offset, max_conversion_amount):
+        if max_conversion_amount + offset > self.max_conversion_amount:
+            raise ValueError(f"The curves end at {self.max_conversion_amount}, before {max_conversion_amount + offset}")
+        derived.pretax_wage_income = self.pretax_wage_income + offset
+        derived.surcharges = tuple(replace(cliff, income=cliff.income + offset) for cliff in self.surcharges)
+        derived.initial_tax = derived._construct_bracket_from_one_point(0)
+        # both curves usually end in the same bracket, share its bundles
+        bundles = {}
+        derived.income_only_curve = derived._shifted_curve(self.income_only_curve, offset, max_conversion_amount, bundles)
+        derived.capital_taxes = [_moved(bracket, bracket.lower - offset, bracket.upper - offset)
+                                 for bracket in self.capital_taxes if 0 <= bracket.upper - offset < max_conversion_amount]
+        derived.entire_curve = derived._shifted_curve(self.entire_curve, offset, max_conversion_amount, bundles)
+        derived.max_conversion_amount = max_conversion_amount
+        # the memoized bundles are keyed by this schedule's conversion amounts
+        derived._bundles = {}
+
+    def _shifted_curve(self, curve, offset, max_conversion_amount, bundles):
+        shifted = []
+        for bracket in curve:
+            lower, upper = max(bracket.lower - offset, 0), bracket.upper - offset
+            if lower >= max_conversion_amount:
+                break
+            if upper >= max_conversion_amount:
+                shifted.append(self._construct_bracket_from_two_points(lower, max_conversion_amount, bundles))
+                break
+            if upper > 0:
+                # rates are constant inside a bracket and the bundles are taken at its upper end, so a cut lower end keeps them
+                shifted.append(_moved(bracket, lower, upper))
+        return shifted
+
+
+@lru_cache(maxsize=1024)
+def _interned(brackets):
+    return brackets
+
+
+def freeze_brackets(brackets):
+    """Brackets as a tuple of tuples, equal brackets share one tuple."""
+    return _interned(tuple(tuple(bracket) for bracket in brackets))
+
+
+class FrozenTaxSchedule(TaxSchedule):
+    """
+    A TaxSchedule that cannot be changed after construction, so it can be cached and shared
+    between sessions and threads. Brackets and curves are tuples, and schedules derived with
+    with_changes share the bracket tuples. The curves are built on first use, consumers that
+    only need the start of a curve take it from iter_curve without building the rest.
+    """
+    CURVES = ('income_only_curve', 'capital_taxes', 'entire_curve')
+
+    def __init__(self, pretax_wage_income, ordinary_capital_income, qualified_capital_income, federal_brackets, state_brackets, nit_brackets, longterm_brackets, federal_deduction, state_deduction, max_conversion_amount, surcharges=()):
+        super().__init__(pretax_wage_income, ordinary_capital_income, qualified_capital_income,
+                         freeze_brackets(federal_brackets), freeze_brackets(state_brackets), freeze_brackets(nit_brackets), freeze_brackets(longterm_brackets),
+                         federal_deduction, state_deduction, surcharges)
+        self.save_curve(max_conversion_amount)
+        self._freeze()
+
+    # cached_property writes the instance __dict__ directly, so building a curve does not go through __setattr__
+    @cached_property
+    def _curves(self):
+        return tuple(tuple(curve) for curve in self.tax_curve(self.max_conversion_amount, self._bundles))
+
+    @cached_property
+    def income_only_curve(self):
+        return self._curves[0]
+
+    @cached_property
+    def capital_taxes(self):
+        return self._curves[1]
+
+    @cached_property
+    def entire_curve(self):
+        return self._curves[2]
+
+    @cached_property
+    def _total_tax_function(self):
+        return super().total_tax_function()
+
+    def total_tax_function(self):
+        return self._total_tax_function
+
+    def additional_tax(self, conversion_amount):
+        # the function is composed once per schedule, every later amount is a lookup
+        return self.additional_taxes(conversion_amount)
+
+    def _forget_curves(self):
+        for name in self.CURVES + ('_curves', '_total_tax_function'):
+            self.__dict__.pop(name, None)
+
+    def _freeze(self):
+        for curve in self.CURVES:
+            if curve in self.__dict__:
+                object.__setattr__(self, curve, tuple(self.__dict__[curve]))
+        object.__setattr__(self, '_frozen', True)
+
+    def __setattr__(self, name, value):
+        if getattr(self, '_frozen', False):
+            raise AttributeError(f"FrozenTaxSchedule is immutable, use with_changes instead of setting {name}")
+        object.__setattr__(self, name, value)
+
+    def __delattr__(self, name):
+        raise AttributeError(f"FrozenTaxSchedule is immutable, cannot delete {name}")
+
+    @tracing.traced("TaxSchedule.save_curve")
+    def save_curve(self, max_conversion_amount, bundles=None):
+        if getattr(self, '_frozen', False):
+            raise AttributeError("FrozenTaxSchedule curves are fixed at construction")
+        self._forget_curves()
+        self.max_conversion_amount = max_conversion_amount
+        self._bundles = {} if bundles is None else bundles
+
+    def with_changes(self, **changes):
+        derived = copy.copy(self)
+        object.__setattr__(derived, '_frozen', False)
+        self._apply_changes(derived, changes)
+        derived._freeze()
+        return derived
+
+    def shifted(self, offset, max_conversion_amount):
+        derived = copy.copy(self)
+        object.__setattr__(derived, '_frozen', False)
+        derived._forget_curves()
+        self._apply_shift(derived, offset, max_conversion_amount)
+        derived._freeze()
+        return derived
+
+
+# inputs that with_changes can change without rebuilding the bracket tables
+DERIVABLE_INPUTS = ['pretax_wage_income', 'ordinary_capital_income', 'qualified_capital_income', 'federal_deduction', 'state_deduction']
@@ -0,0 +1,149 @@
+"""
+Precomputed outputs of the scenarios every new session starts on, so the first paint needs no math.
+
+Every visitor opens the app on the same default inputs. warm() computes the schedule,
+recommendations, table and figure of those inputs, and optionally of every filing status and
+year, once per process. The app asks get() before computing an artifact itself, so a session
+only starts computing once the user changes something. Artifacts are keyed the same way as the
+session state, by the inputs and their bracket data version, so reloaded brackets are never
+served stale. Figures are copied on the way out since sessions update their layout.
+
+A warm builds its artifacts aside and swaps them in at once, readers see either the old set or
+the new one. Starting a warm supersedes any still running, only the latest one is published.
+"""
+import os
+import threading
+
+import plotly.graph_objects as go
+
+import bracket_data
+import graph
+import instrumentation
+import result_cache
+import summary
+import taxes
+
+# the app's initial inputs, in the order of its schedule_inputs()
+DEFAULT_INPUTS = (100000.0, 750000.0, 20000.0, 40000.0, 2024, 'married', 'CA', None)
+DEFAULT_FUTURE_RATE = .35
+# the years and filing statuses the app offers
+YEARS = (2024, 2025)
+STATUSES = ('married', 'single', 'head')
+
+TABLE_COLUMNS = ["Conversion Amount", "Additional Tax", "Marginal Tax Rate", "Capital Gains Rate", "Net Investment Tax Rate"]
+
+_artifacts = {}
+_scenarios = []
+_stats = {'hits': 0, 'misses': 0}
+_lock = threading.Lock()
+# bumped by every warm, a warm only publishes while it is the latest
+_generation = 0
+_threads = []
+
+
+def artifact_key(inputs):
+    return inputs, taxes.data_version(inputs[4], inputs[6])
+
+
+def recommendations(schedule_):
+    return summary.RecommendationSteps(schedule_, schedule_.max_conversion_amount)
+
+
+def table(schedule_):
+    df = summary.table_numeric(schedule_.entire_curve, schedule_.pretax_wage_income, schedule_.initial_tax)
+    return df[TABLE_COLUMNS]
+
+
+def figure(schedule_, future_rate):
+    return graph.plot_tax_brackets(schedule_.pretax_wage_income, schedule_.qualified_capital_income, schedule_.ordinary_capital_income,
+                                   schedule_.income_only_curve, schedule_.capital_taxes, future_rate, schedule_.max_conversion_amount)
+
+
+def scenarios(variants=False):
+    """(inputs, future rate) of the default scenario, and of every filing status and year with variants."""
+    result = [(DEFAULT_INPUTS, DEFAULT_FUTURE_RATE)]
+    if variants:
+        for year in YEARS:
+            for status in STATUSES:
+                inputs = DEFAULT_INPUTS[:4] + (year, status) + DEFAULT_INPUTS[6:]
+                if inputs != DEFAULT_INPUTS:
+                    result.append((inputs, DEFAULT_FUTURE_RATE))
+    return result
+
+
+def build(inputs, future_rate, artifacts):
+    key = artifact_key(inputs)
+    schedule_ = result_cache.schedule(*inputs)
+    artifacts[('schedule', key)] = schedule_
+    artifacts[('recommendations', key)] = recommendations(schedule_)
+    artifacts[('table', key)] = table(schedule_)
+    artifacts[('figure', (key, future_rate))] = figure(schedule_, future_rate)
+
+
+def _begin(scenarios_):
+    global _generation
+    with _lock:
+        _generation += 1
+        _scenarios[:] = scenarios_
+        return _generation
+
+
+def _warm(scenarios_, generation):
+    global _artifacts
+    artifacts = {}
+    for inputs, future_rate in scenarios_:
+        if generation != _generation:
+            return 0
+        build(inputs, future_rate, artifacts)
+    with _lock:
+        if generation != _generation:
+            return 0
+        _artifacts = artifacts
+    return len(artifacts)
+
+
+def warm(scenarios_):
+    """Compute every scenario, replacing whatever was precomputed before. Returns 0 when a later warm superseded it."""
+    return _warm(scenarios_, _begin(scenarios_))
+
+
+def warm_in_background(scenarios_):
+    thread = threading.Thread(target=_warm, args=(scenarios_, _begin(scenarios_)), name='snapshots', daemon=True)
+    with _lock:
+        _threads[:] = [running for running in _threads if running.is_alive()] + [thread]
+    thread.start()
+    return thread
+
+
+def wait(timeout=None):
+    """Block until every background warm up has finished."""
+    with _lock:
+        threads = list(_threads)
+    for thread in threads:
+        thread.join(timeout)
+
+
+def get(name, key, compute):
+    """The precomputed artifact for key, or compute()."""
+    value = _artifacts.get((name, key))
+    if value is None:
+        _stats['misses'] += 1
+        return compute()
+    _stats['hits'] += 1
+    return go.Figure(value) if name == 'figure' else value
+
+
+def stats():
+    return dict(_stats, artifacts=len(_artifacts), scenarios=len(_scenarios))
+
+
+instrumentation.register_probe("snapshots", stats)
+# reloaded brackets change the keys, precompute the same scenarios again under the new versions
+bracket_data.on_reload(lambda changed: warm_in_background(list(_scenarios)) if changed and _scenarios else None)
+
+
+def start():
+    """Warm the snapshots in the background unless IRACONVERT_SNAPSHOTS=0."""
+    if os.environ.get("IRACONVERT_SNAPSHOTS", "1") == "0":
+        return None
+    return warm_in_background(scenarios(os.environ.get("IRACONVERT_SNAPSHOT_VARIANTS") == "1"))
@@ -1,36 +1,128 @@
 from typing import List
 from collections import namedtuple
+from dataclasses import dataclass
+import bisect
+import math
 
 import pandas as pd
 from pandas.core.tools.datetimes import _assemble_from_unit_mappings
 
 from compute_taxes import TaxBracket, compute_taxes
 from shared import dollarize_raw, dollarize_raw_str
+import tracing
 
-def explain(schedule_,
-            max_conversion,
-            future_rate):
-    tax_brackets = schedule_.income_only_curve
-    first_bracket = tax_brackets[0]
+NOTHING_TO_CONVERT = 'nothing_to_convert'
+LOW_FUTURE_RATE = 'low_future_rate'
+SLIGHTLY_HIGHER = 'slightly_higher'
+HIGHER = 'higher'
+CONVERT = 'convert'
+CONVERT_EVERYTHING = 'convert_everything'
+
+@dataclass(frozen=True)
+class Recommendation:
+    kind: str
+    amount: float = 0.0
+    # marginal rate of the last converted dollar
+    rate: float = 0.0
+    additional_tax: float = 0.0
 
+def _classify(first_rate, max_conversion, future_rate):
+    # the recommendations that do not depend on where the future rate falls in the brackets
     if max_conversion <= 0:
-        return ["You have no money to convert. Easy decision", "Double check if you money in your retirement accounts to convert", "Or start contributing to your retirement accounts"]
+        return Recommendation(NOTHING_TO_CONVERT)
     elif future_rate < .15:
-        return ["Your predicted future rate seems unrealistically low. Are you sure you're not missing anything?", "Double check how much you need to draw down from your savings in retirement", "Also consider your state income tax"]
-    elif first_bracket.total_income_tax() > future_rate:
-        if first_bracket.total_income_tax() < future_rate + .05:
-            return ["Your current tax rate is slightly higher than your future tax rate",  "You might consider converting, but it's not a clear win", "Consider that tax rates might raise in the future"]
+        return Recommendation(LOW_FUTURE_RATE)
+    elif first_rate > future_rate:
+        if first_rate < future_rate + .05:
+            return Recommendation(SLIGHTLY_HIGHER, rate=first_rate)
         else:
-            return ["Your current tax rate is higher than your future tax rate. It might not be worth converting", "Still consider that tax rates might raise in the future"]
-    for idx in range(len(tax_brackets) - 1):
-        bracket = tax_brackets[idx]
-        next_bracket = tax_brackets[idx + 1]
+            return Recommendation(HIGHER, rate=first_rate)
+    return None
+
+def recommend(schedule_, max_conversion, future_rate):
+    # walk the income only curve lazily, the brackets past the future rate are never computed
+    tax_brackets = schedule_.iter_curve(include_capital=False)
+    # there are no brackets when there is nothing to convert
+    bracket = next(tax_brackets, None)
+    recommendation = _classify(bracket.total_income_tax() if bracket else 0, max_conversion, future_rate)
+    if recommendation is not None:
+        return recommendation
+    for next_bracket in tax_brackets:
         if bracket.total_income_tax() <= future_rate <= next_bracket.total_income_tax():
-            to_convert = bracket.upper
-            return [f"Consider converting ${to_convert:,.2f} dollars",
-                    f"That will keep your marginal rate at {100 * bracket.total_income_tax():.2f}% which is lower than your expected future tax rate of {100 * future_rate:.2f}%",
-                    f"You will owe an additional ${schedule_.additional_tax(to_convert):,.0f} dollars"]
-    return ["Consider converting everything", "Your current tax rate is lower than your future tax rate", "You will owe an additional ${schedule_.additional_tax(max_conversion):,.0f} dollars"]
+            return Recommendation(CONVERT, bracket.upper, bracket.total_income_tax(), schedule_.additional_tax(bracket.upper))
+        bracket = next_bracket
+    return Recommendation(CONVERT_EVERYTHING, max_conversion, bracket.total_income_tax(), schedule_.additional_tax(max_conversion))
+
+def describe(recommendation, future_rate):
+    kind = recommendation.kind
+    if kind == NOTHING_TO_CONVERT:
+        return ["You have no money to convert. Easy decision", "Double check if you money in your retirement accounts to convert", "Or start contributing to your retirement accounts"]
+    elif kind == LOW_FUTURE_RATE:
+        return ["Your predicted future rate seems unrealistically low. Are you sure you're not missing anything?", "Double check how much you need to draw down from your savings in retirement", "Also consider your state income tax"]
+    elif kind == SLIGHTLY_HIGHER:
+        return ["Your current tax rate is slightly higher than your future tax rate",  "You might consider converting, but it's not a clear win", "Consider that tax rates might raise in the future"]
+    elif kind == HIGHER:
+        return ["Your current tax rate is higher than your future tax rate. It might not be worth converting", "Still consider that tax rates might raise in the future"]
+    elif kind == CONVERT:
+        return [f"Consider converting ${recommendation.amount:,.2f} dollars",
+                f"That will keep your marginal rate at {100 * recommendation.rate:.2f}% which is lower than your expected future tax rate of {100 * future_rate:.2f}%",
+                f"You will owe an additional ${recommendation.additional_tax:,.0f} dollars"]
+    return ["Consider converting everything", "Your current tax rate is lower than your future tax rate", f"You will owe an additional ${recommendation.additional_tax:,.0f} dollars"]
+
+@tracing.traced("summary.explain")
+def explain(schedule_,
+            max_conversion,
+            future_rate):
+    return describe(recommend(schedule_, max_conversion, future_rate), future_rate)
+
+class RecommendationSteps:
+    """
+    The recommendation for every future rate, precomputed for one schedule.
+    The recommendation is a step function of the future rate, each lookup is a binary search
+    over the bracket rates instead of a scan and a call to additional_tax.
+    """
+    def __init__(self, schedule_, max_conversion):
+        tax_brackets = schedule_.income_only_curve
+        self.max_conversion = max_conversion
+        self.rates = [bracket.total_income_tax() for bracket in tax_brackets]
+        self.first_rate = self.rates[0] if self.rates else 0
+        # income rates never fall as income grows with real brackets, so the first bracket whose next rate reaches the future rate can be found by bisection
+        self.monotonic = all(a <= b for a, b in zip(self.rates, self.rates[1:]))
+        additional = schedule_.additional_taxes([bracket.upper for bracket in tax_brackets[:-1]] + [max_conversion])
+        self.steps = [Recommendation(CONVERT, bracket.upper, bracket.total_income_tax(), float(tax))
+                      for bracket, tax in zip(tax_brackets[:-1], additional)]
+        if self.rates:
+            self.steps.append(Recommendation(CONVERT_EVERYTHING, max_conversion, self.rates[-1], float(additional[-1])))
+
+    def recommend(self, future_rate):
+        recommendation = _classify(self.first_rate, self.max_conversion, future_rate)
+        if recommendation is not None:
+            return recommendation
+        if self.monotonic:
+            return self.steps[bisect.bisect_left(self.rates, future_rate, lo=1) - 1]
+        for idx in range(len(self.rates) - 1):
+            if self.rates[idx] <= future_rate <= self.rates[idx + 1]:
+                return self.steps[idx]
+        return self.steps[-1]
+
+    def explain(self, future_rate):
+        return describe(self.recommend(future_rate), future_rate)
+
+    def critical_rates(self):
+        """Future rates where the recommendation can change."""
+        return sorted({.15, self.first_rate - .05, *self.rates})
+
+    def table(self, future_rates=None):
+        if future_rates is None:
+            future_rates = [percent / 100 for percent in range(101)]
+        recommendations = [self.recommend(future_rate) for future_rate in future_rates]
+        return pd.DataFrame({
+            'Future Tax Rate': future_rates,
+            'Recommendation': [recommendation.kind for recommendation in recommendations],
+            'Conversion Amount': [recommendation.amount for recommendation in recommendations],
+            'Marginal Tax Rate': [recommendation.rate for recommendation in recommendations],
+            'Additional Tax': [recommendation.additional_tax for recommendation in recommendations],
+        })
 
 Row = namedtuple('Row', ['Total_Income', 'Conversion_Amount', 'Federal_Tax', 'State_Tax', 'NIT_Tax', 'Longterm_Tax', 'Total_Tax', 'Marginal_Tax_Rate', 'Capital_Gains_Rate', 'NIT_Rate'])
 
@@ -52,13 +144,18 @@ def tax_bracket_to_row(bracket, ordinary_income):
     )
     return row
 
-def table2(entire_curve, ordinary_income, initial_tax):
+COLUMN_FORMATS = {column: 'currency' for column in DOLLAR_COLUMNS + ['Total Capital Taxes']}
+COLUMN_FORMATS.update({column: 'percent' for column in PERCENT_COLUMNS})
+COLUMN_FORMATS['Future Rate'] = 'percent'
+
+@tracing.traced("summary.table_numeric")
+def table_numeric(entire_curve, ordinary_income, initial_tax):
+    """table2 with raw numbers, formatting is left to the client so the table sorts numerically"""
     rows = []
     rows.append(tax_bracket_to_row(initial_tax, ordinary_income))
     for bracket in entire_curve:
         rows.append(tax_bracket_to_row(bracket, ordinary_income))
 
-    df = pd.DataFrame(rows)
     total_tax_no_conversion = rows[0].Total_Tax
 
     df = pd.DataFrame(rows)
@@ -67,7 +164,11 @@ def table2(entire_curve, ordinary_income, initial_tax):
     # transform df to only have Total Income, Conversion Amount, Income Tax, Capital Taxes, Total Tax
     df['Total Income Tax'] = df['Federal Tax'] + df['State Tax']
     df['Total Capital Taxes'] = df['Longterm Tax'] +  df['NIT Tax']
-    df['Additional Tax'] = df['Total Tax'].apply(lambda x: x - total_tax_no_conversion)
+    df['Additional Tax'] = df['Total Tax'] - total_tax_no_conversion
+    return df
+
+def table2(entire_curve, ordinary_income, initial_tax):
+    df = table_numeric(entire_curve, ordinary_income, initial_tax)
     # format the numbers to be dollarized, pass in as a string
     for col in DOLLAR_COLUMNS:
         df[col] = df[col].apply(dollarize_raw_str)
@@ -76,3 +177,37 @@ def table2(entire_curve, ordinary_income, initial_tax):
         df[col] = df[col].apply(lambda x: f"{100 * x:.2f}%")
 
     return df
+
+def column_format(column):
+    # derived columns such as "Current law 2024 Additional Tax" format like the column they end with
+    for name, format_ in COLUMN_FORMATS.items():
+        if column == name or column.endswith(' ' + name):
+            return format_
+    return 'number'
+
+@tracing.traced("summary.paginate")
+def paginate(df, page=0, page_size=25, sort=None, descending=False):
+    """
+    One page of a numeric table, sorted on the server, with the format of each column.
+    Currency is rounded to cents and rates to a hundredth of a percent since that is all the client shows.
+    Infinite and missing numbers are sent as null, which JSON has no other way to carry.
+    """
+    if sort in df.columns:
+        df = df.sort_values(sort, ascending=not descending, kind='stable')
+    pages = max(1, -(-len(df) // page_size))
+    page = min(max(int(page), 0), pages - 1)
+    rows = df.iloc[page * page_size:(page + 1) * page_size]
+    formats = [column_format(column) for column in df.columns]
+    columns = [rows[column].round(6 if format_ == 'percent' else 2) if pd.api.types.is_numeric_dtype(rows[column]) else rows[column]
+               for column, format_ in zip(df.columns, formats)]
+    return {
+        'columns': list(df.columns),
+        'formats': formats,
+        'rows': [[value if not isinstance(value, float) or math.isfinite(value) else None for value in row]
+                 for row in zip(*(column.tolist() for column in columns))],
+        'page': page,
+        'pages': pages,
+        'total_rows': len(df),
+        'sort': sort,
+        'descending': descending,
+    }
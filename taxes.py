@@ -1,9 +1,17 @@
 from dataclasses import dataclass
+from functools import lru_cache
+import hashlib
+import threading
 import compute_taxes
 import simple_taxes
+import orjson
+import tracing
 
 MAX_INCOME = 9999999
 
+# bracket_data swaps every table under this lock, reads that need tables of one version hold it too
+DATA_LOCK = threading.RLock()
+
 FEDERAL_2024_SINGLE_BRACKETS = [(.1, 11600), (.12, 47150), (.22, 100525), (.24, 191950), (.32, 243725), (.35, 609351), (.37, MAX_INCOME)]
 FEDERAL_2024_MARRIED_BRACKETS = [(.1, 23200), (.12, 94300), (.22, 201050), (.24, 383900), (.32, 487450), (.35, 731200), (.37, MAX_INCOME)]
 FEDERAL_2024_HEAD_BRACKETS = [(.1, 16550), (.12, 63100), (.22, 100500), (.24, 191950), (.32, 243700), (.35, 609350), (.37, MAX_INCOME)]
@@ -19,7 +27,8 @@ CALIFORNIA_2024_HEAD_BRACKETS = [ (.01, 21527), (.02, 51000), (.04, 65744), (.06
 NO_INCOME_BRACKET = [(0, MAX_INCOME),]
 
 def adjust(brackets, ccpi=.03):
-    return [(rate, bracket * (1.0 + ccpi)) for rate, bracket in brackets]
+    # the MAX_INCOME sentinel closes the last bracket and is not an amount
+    return [(rate, bracket * (1.0 + ccpi) if bracket < MAX_INCOME else bracket) for rate, bracket in brackets]
 
 
 FEDERAL_BRACKETS = {
@@ -82,6 +91,47 @@ NII_BRACKETS = {
     "head": [ (0, 200000), (.038, MAX_INCOME) ]
 }
 
+def _irmaa(thresholds, monthly_surcharges, people):
+    # surcharges are flat dollar amounts, so they are expressed as rates on a pool of 1
+    brackets = [(0, thresholds[0])]
+    for surcharge, bound in zip(monthly_surcharges, thresholds[1:] + [MAX_INCOME]):
+        brackets.append((round(12 * people * surcharge, 2), bound))
+    return brackets
+
+# Medicare part B plus part D monthly surcharge per person, by MAGI tier
+IRMAA_MONTHLY_SURCHARGES = {
+    2024: [69.90 + 12.90, 174.70 + 33.30, 279.50 + 53.80, 384.30 + 74.20, 419.30 + 81.00],
+    2025: [74.00 + 13.70, 185.00 + 35.30, 295.90 + 57.00, 406.90 + 78.60, 443.90 + 85.80]
+}
+
+IRMAA_BRACKETS = {
+    2024: {
+        "single": _irmaa([103000, 129000, 161000, 193000, 500000], IRMAA_MONTHLY_SURCHARGES[2024], 1),
+        "married": _irmaa([206000, 258000, 322000, 386000, 750000], IRMAA_MONTHLY_SURCHARGES[2024], 2),
+        "head": _irmaa([103000, 129000, 161000, 193000, 500000], IRMAA_MONTHLY_SURCHARGES[2024], 1)
+    },
+    2025: {
+        "single": _irmaa([106000, 133000, 167000, 200000, 500000], IRMAA_MONTHLY_SURCHARGES[2025], 1),
+        "married": _irmaa([212000, 266000, 334000, 400000, 750000], IRMAA_MONTHLY_SURCHARGES[2025], 2),
+        "head": _irmaa([106000, 133000, 167000, 200000, 500000], IRMAA_MONTHLY_SURCHARGES[2025], 1)
+    }
+}
+
+@lru_cache(maxsize=256)
+def data_version(year=None, state=None):
+    """
+    Hash of the bracket data, part of every cache key so edits to the tables invalidate cached results.
+    With a year only the tables that year and state use are hashed, so reloading one year or state
+    leaves the results of the others valid.
+    """
+    with DATA_LOCK:
+        if year is None:
+            tables = [FEDERAL_BRACKETS, STATE_BRACKETS, STANDARD_DEDUCTIONS, STATE_DEDUCTIONS, GAINS_RATE, NII_BRACKETS, IRMAA_BRACKETS]
+        else:
+            tables = [FEDERAL_BRACKETS.get(year), STATE_BRACKETS.get(state, {}).get(year), STANDARD_DEDUCTIONS.get(year),
+                      STATE_DEDUCTIONS.get(state, {}).get(year), GAINS_RATE.get(year), NII_BRACKETS, IRMAA_BRACKETS.get(year)]
+    return hashlib.sha256(orjson.dumps(tables, option=orjson.OPT_NON_STR_KEYS)).hexdigest()[:16]
+
 def _initial_rates(base_income, brackets):
     for rate, bracket in brackets:
         if base_income < bracket:
@@ -130,7 +180,8 @@ def get_nii_brackets():
     return NII_BRACKETS
 
 def raw_tax_brackets(year, status, state):
-    return {'federal': get_federal_brackets(year)[status], 'state': get_state_brackets(state, year, status), 'longterm': get_gains_brackets(year)[status], 'nit': get_nii_brackets()[status]}
+    with DATA_LOCK:
+        return {'federal': get_federal_brackets(year)[status], 'state': get_state_brackets(state, year, status), 'longterm': get_gains_brackets(year)[status], 'nit': get_nii_brackets()[status]}
 
 def tax_brackets(base_income, max_convert, longterm_gains, investment_income, year, status, state):
     federal_brackets = get_federal_brackets(year)[status]
@@ -148,18 +199,59 @@ def state_deduction(status, year, state):
         return 0
     return STATE_DEDUCTIONS[state][year][status]
 
-def schedule(base_income, max_convert, longterm_gains, investment_income, year, status, state, custom_deduction=None):
-    federal_brackets = get_federal_brackets(year)[status]
-    state_brackets = get_state_brackets(state, year, status)
-    gains_brackets = get_gains_brackets(year)[status]
-    nii_brackets = get_nii_brackets()[status]
+SURCHARGES = ('irmaa',)
 
-    federal_deduction = custom_deduction if custom_deduction is not None else deduction(status, year)
+def surcharge_cliffs(surcharges, base_income, longterm_gains, investment_income, year, status):
+    # IRMAA tiers are set on modified AGI, which includes all capital income
+    magi = base_income + investment_income + longterm_gains
+    cliffs = []
+    for name in surcharges:
+        if name == 'irmaa':
+            cliffs.append(simple_taxes.Cliff('irmaa', tuple(IRMAA_BRACKETS[year][status]), 1, magi))
+        else:
+            raise ValueError(f"Unknown surcharge {name}")
+    return cliffs
+
+@tracing.traced("taxes.schedule")
+def schedule(base_income, max_convert, longterm_gains, investment_income, year, status, state, custom_deduction=None, surcharges=()):
+    # every table is read under the lock so a reload never mixes two versions in one schedule
+    with DATA_LOCK:
+        federal_brackets = get_federal_brackets(year)[status]
+        state_brackets = get_state_brackets(state, year, status)
+        gains_brackets = get_gains_brackets(year)[status]
+        nii_brackets = get_nii_brackets()[status]
+
+        federal_deduction = custom_deduction if custom_deduction is not None else deduction(status, year)
+        cliffs = surcharge_cliffs(surcharges, base_income, longterm_gains, investment_income, year, status)
     state_deduction = 0
-    schedule = simple_taxes.TaxSchedule(
-        base_income, investment_income, longterm_gains, federal_brackets, state_brackets, nii_brackets, gains_brackets, federal_deduction, state_deduction)
-    schedule.save_curve(max_convert)
-    return schedule
+    return simple_taxes.FrozenTaxSchedule(
+        base_income, investment_income, longterm_gains, federal_brackets, state_brackets, nii_brackets, gains_brackets, federal_deduction, state_deduction,
+        max_convert, cliffs)
+
+
+def reschedule(previous, base_income, max_convert, longterm_gains, investment_income, year, status, state, custom_deduction=None, surcharges=()):
+    """
+    schedule, derived from a previous schedule when only incomes or the deduction changed
+    so the unchanged parts of its curve are reused. Falls back to a fresh schedule otherwise.
+    """
+    args = (base_income, max_convert, longterm_gains, investment_income, year, status, state, custom_deduction, surcharges)
+    with DATA_LOCK:
+        cliffs = surcharge_cliffs(surcharges, base_income, longterm_gains, investment_income, year, status)
+        if (previous is None
+                or getattr(previous, 'max_conversion_amount', None) != max_convert
+                or list(previous.federal_brackets) != list(get_federal_brackets(year)[status])
+                or list(previous.state_brackets) != list(get_state_brackets(state, year, status))
+                or list(previous.longterm_brackets) != list(get_gains_brackets(year)[status])
+                or list(previous.nit_brackets) != list(get_nii_brackets()[status])
+                or [(cliff.name, cliff.brackets, cliff.pool) for cliff in previous.surcharges] != [(cliff.name, cliff.brackets, cliff.pool) for cliff in cliffs]):
+            return schedule(*args)
+        federal_deduction = custom_deduction if custom_deduction is not None else deduction(status, year)
+    return previous.with_changes(
+        pretax_wage_income=base_income,
+        ordinary_capital_income=investment_income,
+        qualified_capital_income=longterm_gains,
+        federal_deduction=federal_deduction,
+        state_deduction=0)
 
 STATE_DEDUCTIONS = {
     "CA": {
@@ -0,0 +1,94 @@
+import asyncio
+import unittest
+
+from starlette.testclient import TestClient
+
+import api
+import summary
+import taxes
+
+HOUSEHOLD = {'pretax_income': 100000, 'assets': 750000, 'longterm_gains': 20000, 'capital_income': 40000,
+             'year': 2024, 'status': 'married', 'state': 'CA', 'future_rate': .35}
+
+
+class TestApi(unittest.TestCase):
+    def setUp(self):
+        self.client = TestClient(api.app)
+
+    def test_schedule(self):
+        response = self.client.post('/schedule', json=HOUSEHOLD)
+        self.assertEqual(response.status_code, 200)
+        result = response.json()
+        schedule = taxes.schedule(100000, 750000, 20000, 40000, 2024, 'married', 'CA')
+        self.assertEqual(result['recommendation'], summary.explain(schedule, 750000, .35))
+        self.assertAlmostEqual(result['additional_tax'][0], schedule.additional_tax(750000))
+        self.assertEqual(result['curves']['entire_curve']['upper'], [bracket.upper for bracket in schedule.entire_curve])
+
+    def test_batch_matches_schedule(self):
+        households = [dict(HOUSEHOLD, pretax_income=income) for income in (0, 50000, 100000, 400000)]
+        households.append(dict(HOUSEHOLD, surcharges=['irmaa']))
+        amounts = [0, 10000, 250000]
+        response = self.client.post('/batch', json={'households': households, 'amounts': amounts, 'include_curves': False})
+        self.assertEqual(response.status_code, 200)
+        results = response.json()['results']
+        self.assertEqual(len(results), 5)
+        for household, result in zip(households, results):
+            schedule = taxes.schedule(household['pretax_income'], 750000, 20000, 40000, 2024, 'married', 'CA', None, tuple(household.get('surcharges', ())))
+            self.assertNotIn('curves', result)
+            for amount, additional_tax in zip(amounts, result['additional_tax']):
+                self.assertAlmostEqual(additional_tax, schedule.additional_tax(amount), places=6)
+
+    def test_invalid_household(self):
+        response = self.client.post('/schedule', json={'assets': 1000})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('pretax_income', response.json()['error'])
+        response = self.client.post('/schedule', json=dict(HOUSEHOLD, status='other'))
+        self.assertEqual(response.status_code, 400)
+        for state in (['CA'], 'XX'):
+            response = self.client.post('/schedule', json=dict(HOUSEHOLD, state=state))
+            self.assertEqual(response.status_code, 400)
+            self.assertIn('state', response.json()['error'])
+        self.assertEqual(self.client.post('/schedule', json=dict(HOUSEHOLD, state='none')).status_code, 200)
+
+    def test_limits(self):
+        response = self.client.post('/batch', json={'households': [HOUSEHOLD] * (api.MAX_HOUSEHOLDS + 1)})
+        self.assertEqual(response.status_code, 413)
+        response = self.client.post('/schedule', content=b' ' * (api.MAX_BODY_BYTES + 1), headers={'content-type': 'application/json'})
+        self.assertEqual(response.status_code, 413)
+        response = self.client.post('/schedule', content=b'{}', headers={'content-type': 'application/json', 'content-length': 'abc'})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('Content-Length', response.json()['error'])
+
+    def test_micro_batching(self):
+        calls = []
+
+        def evaluate(items):
+            calls.append(items)
+            return [item * 2 for item in items]
+
+        batcher = api.MicroBatcher(evaluate, window=.01)
+
+        async def submit_all():
+            return await asyncio.gather(*(batcher.submit(i) for i in range(5)))
+
+        self.assertEqual(asyncio.run(submit_all()), [0, 2, 4, 6, 8])
+        self.assertEqual(calls, [[0, 1, 2, 3, 4]])
+
+    def test_bad_item_only_fails_its_own_request(self):
+        def evaluate(items):
+            if 'bad' in items:
+                raise TypeError("bad item")
+            return [item * 2 for item in items]
+
+        batcher = api.MicroBatcher(evaluate, window=.01)
+
+        async def submit_all():
+            return await asyncio.gather(*(batcher.submit(item) for item in [1, 'bad', 3]), return_exceptions=True)
+
+        first, bad, last = asyncio.run(submit_all())
+        self.assertEqual((first, last), (2, 6))
+        self.assertIsInstance(bad, TypeError)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,112 @@
+import random
+import unittest
+
+import approx_cache
+import instrumentation
+import taxes
+
+INPUTS = (100000, 750000, 20000, 40000, 2024, 'married', 'CA', None)
+
+
+class TestApproxCache(unittest.TestCase):
+    def setUp(self):
+        self.cache = approx_cache.ApproxCache(1000)
+        self.computed = 0
+
+    def compute(self, inputs):
+        self.computed += 1
+        return taxes.schedule(*inputs)
+
+    def lookup(self, inputs):
+        return self.cache.get_or_compute(inputs, lambda: self.compute(inputs))
+
+    def assertSameSchedule(self, schedule_, fresh):
+        for curve in ['income_only_curve', 'capital_taxes', 'entire_curve']:
+            self.assertEqual(getattr(schedule_, curve), getattr(fresh, curve))
+        self.assertEqual(schedule_.initial_tax, fresh.initial_tax)
+        self.assertEqual(schedule_.max_conversion_amount, fresh.max_conversion_amount)
+
+    def test_wages_in_a_bucket_share_an_anchor(self):
+        for wage in [100000, 100250, 100999]:
+            inputs = (wage,) + INPUTS[1:]
+            self.assertSameSchedule(self.lookup(inputs), taxes.schedule(*inputs))
+        stats = self.cache.stats()
+        self.assertEqual((stats['misses'], stats['hits'], stats['fallbacks']), (1, 2, 0))
+        self.assertEqual(self.computed, 0)
+
+    def test_cents_are_close_to_fresh_schedule(self):
+        inputs = (123456.78,) + INPUTS[1:]
+        schedule_, fresh = self.lookup(inputs), taxes.schedule(*inputs)
+        self.assertEqual(len(schedule_.entire_curve), len(fresh.entire_curve))
+        for bracket, expected in zip(schedule_.entire_curve, fresh.entire_curve):
+            self.assertAlmostEqual(bracket.upper, expected.upper, places=6)
+            self.assertAlmostEqual(bracket.total_tax(), expected.total_tax(), places=6)
+
+    def test_falls_back_when_a_bound_is_inside_the_bucket(self):
+        anchor = taxes.schedule(*INPUTS)
+        # the wage at which the first federal or state bound is crossed sits inside the bucket
+        bound = INPUTS[0] + anchor.entire_curve[0].upper
+        inputs = (bound + 1,) + INPUTS[1:]
+        lower_edge = bound // 1000 * 1000
+        self.assertLess(lower_edge, bound)
+        self.assertTrue(approx_cache.has_seam_keypoint(taxes.schedule(lower_edge, 751000, *INPUTS[2:]), 1000))
+        self.assertSameSchedule(self.lookup(inputs), taxes.schedule(*inputs))
+        self.lookup(inputs)
+        self.assertEqual(self.computed, 2)
+        self.assertEqual(self.cache.stats()['fallbacks'], 2)
+        self.assertEqual(self.cache.stats()['fallback_buckets'], 1)
+
+    def test_assets_in_a_bucket_share_an_anchor(self):
+        for wage, assets in [(100000, 741000), (100500, 745678), (100999, 750000)]:
+            inputs = (wage, assets) + INPUTS[2:]
+            self.assertSameSchedule(self.lookup(inputs), taxes.schedule(*inputs))
+        self.assertEqual(self.cache.stats()['misses'], 1)
+        self.assertEqual(self.computed, 0)
+
+    def test_cut_at_a_keypoint_falls_back(self):
+        anchor = taxes.schedule(*INPUTS)
+        inputs = INPUTS[:1] + (anchor.entire_curve[1].upper + .001,) + INPUTS[2:]
+        self.assertSameSchedule(self.lookup(inputs), taxes.schedule(*inputs))
+        self.assertEqual(self.computed, 1)
+
+    def test_cliff_threshold_on_a_rounding_error_falls_back(self):
+        inputs = (7852.82, 318940.6, 20000, 0, 2024, 'head', 'none', 50000.0, ('irmaa',))
+        self.assertSameSchedule(self.lookup(inputs), taxes.schedule(*inputs))
+        self.assertEqual(self.computed, 1)
+
+    def test_random_households_with_surcharges_match_fresh_schedules(self):
+        rng = random.Random(49)
+        for _ in range(1000):
+            inputs = (round(rng.uniform(0, 400000), 2), round(rng.uniform(0, 800000), 2), rng.choice([0, 20000, 5000.5]),
+                      rng.choice([0, 40000, 1234.56]), rng.choice([2024, 2025]), rng.choice(['married', 'single', 'head']),
+                      rng.choice(['CA', 'none']), rng.choice([None, 50000.0]), rng.choice([(), ('irmaa',)]))
+            schedule_, fresh = self.lookup(inputs), taxes.schedule(*inputs)
+            self.assertEqual(len(schedule_.entire_curve), len(fresh.entire_curve), inputs)
+            for bracket, expected in zip(schedule_.entire_curve, fresh.entire_curve):
+                self.assertAlmostEqual(bracket.upper, expected.upper, places=6, msg=inputs)
+                self.assertAlmostEqual(bracket.total_tax(), expected.total_tax(), places=6, msg=inputs)
+
+    def test_other_inputs_are_separate_buckets(self):
+        self.lookup(INPUTS)
+        self.lookup(INPUTS[:2] + (20000.5,) + INPUTS[3:])
+        self.lookup(INPUTS[:1] + (500000,) + INPUTS[2:])
+        self.assertEqual(self.cache.stats()['misses'], 3)
+
+    def test_least_recently_used_bucket_is_evicted(self):
+        cache = approx_cache.ApproxCache(1000, max_buckets=2)
+        for wage in [100000, 110000, 100000, 120000]:
+            cache.get_or_compute((wage,) + INPUTS[1:], self.fail)
+        self.assertEqual(sorted(key[0] for key in cache._anchors), [100000, 120000])
+
+    def test_configure_registers_probe(self):
+        approx_cache.configure(500)
+        try:
+            self.assertEqual(approx_cache.schedule(*INPUTS).entire_curve, taxes.schedule(*INPUTS).entire_curve)
+            self.assertEqual(instrumentation.snapshot()['approx_cache']['misses'], 1)
+        finally:
+            approx_cache.configure(None)
+        self.assertNotIn('approx_cache', instrumentation.snapshot())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,71 @@
+import os
+import tempfile
+import unittest
+
+import numpy as np
+
+import api
+import batch_output
+import taxes
+
+
+class TestBatchOutput(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = self.directory.name
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_book_round_trip(self):
+        households = [api.Household(income, 500000, 10000, 5000, status=status)
+                      for income in (0, 80000, 300000) for status in ('single', 'married')]
+        with batch_output.BatchOutput(self.path) as output:
+            # a generator, the writer never needs the whole book
+            rows = batch_output.write_book(output, (household for household in households), chunk_size=4)
+        self.assertEqual(rows, len(households))
+
+        tables = batch_output.open_output(self.path)
+        summaries, curves = tables['households'], tables['curves']
+        self.assertIsInstance(summaries['additional_tax'], np.memmap)
+        self.assertEqual(len(curves), len(households))
+        for idx, household in enumerate(households):
+            schedule = taxes.schedule(*household.schedule_args())
+            self.assertAlmostEqual(summaries['additional_tax'][idx], schedule.additional_tax(household.assets))
+            self.assertEqual(summaries['brackets'][idx], len(schedule.entire_curve))
+            self.assertEqual(curves[idx]['upper'].tolist(), [bracket.upper for bracket in schedule.entire_curve])
+            self.assertEqual(curves[idx]['federal_amount'].tolist(), [bracket.federal.amount for bracket in schedule.entire_curve])
+
+    def test_grid(self):
+        conversions = np.linspace(0, 200000, 11)
+        with batch_output.BatchOutput(self.path) as output:
+            batch_output.write_grid(output, 'grid', range(0, 500000, 25000), conversions, 2024, 'married', 'CA', chunk_size=7)
+        grid = batch_output.open_output(self.path)['grid']
+        self.assertEqual(grid['additional_tax'].shape, (20, 11))
+        schedule = taxes.schedule(75000, 200000, 0, 0, 2024, 'married', 'CA')
+        self.assertEqual(grid['income'][3], 75000)
+        for conversion, additional_tax in zip(conversions, grid['additional_tax'][3]):
+            self.assertAlmostEqual(additional_tax, schedule.additional_tax(conversion), places=6)
+
+    def test_incomplete_run_has_no_manifest(self):
+        output = batch_output.BatchOutput(self.path)
+        table = output.table('values', {'x': np.float64})
+        table.append(x=[1.0, 2.0])
+        self.assertFalse(os.path.exists(os.path.join(self.path, batch_output.MANIFEST)))
+        with self.assertRaises(ValueError):
+            table.append(y=[1.0])
+        output.close()
+        self.assertEqual(batch_output.open_output(self.path)['values']['x'].tolist(), [1.0, 2.0])
+
+    def test_failed_run_has_no_manifest(self):
+        with self.assertRaises(RuntimeError):
+            with batch_output.BatchOutput(self.path) as output:
+                table = output.table('values', {'x': np.float64})
+                table.append(x=[1.0, 2.0])
+                raise RuntimeError("failed halfway")
+        self.assertTrue(table.columns['x']._file.closed)
+        self.assertFalse(os.path.exists(os.path.join(self.path, batch_output.MANIFEST)))
+
+
+if __name__ == '__main__':
+    unittest.main()
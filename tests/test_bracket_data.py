@@ -0,0 +1,104 @@
+import json
+import os
+import tempfile
+import threading
+import time
+import unittest
+from unittest import mock
+
+from starlette.testclient import TestClient
+
+import api
+import bracket_data
+import result_cache
+import taxes
+
+MARRIED_2025 = [[.1, 30000], [.12, 100000], [.22, 210000], [.24, 400000], [.32, 510000], [.35, 760000], [.37, None]]
+INPUTS_2024 = (100000, 750000, 20000, 40000, 2024, 'married', 'CA', None, ())
+INPUTS_2025 = INPUTS_2024[:4] + (2025,) + INPUTS_2024[5:]
+
+
+class TestBracketData(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, 'brackets.json')
+        self.write({'federal': {'2025': {'married': MARRIED_2025}}})
+
+    def tearDown(self):
+        bracket_data.configure(None)
+        self.directory.cleanup()
+
+    def write(self, overrides):
+        with open(self.path, 'w') as f:
+            json.dump(overrides, f)
+
+    def test_reload_only_invalidates_changed_datasets(self):
+        keys = result_cache.cache_key(INPUTS_2024), result_cache.cache_key(INPUTS_2025)
+        changed = bracket_data.reload(self.path)
+        self.assertEqual({year for year, state in changed}, {2025})
+        self.assertEqual(taxes.get_federal_brackets(2025)['married'][0], (.1, 30000))
+        self.assertEqual(taxes.get_federal_brackets(2025)['married'][-1], (.37, taxes.MAX_INCOME))
+        # other statuses of the year keep their builtin brackets
+        self.assertEqual(taxes.get_federal_brackets(2025)['single'], taxes.FEDERAL_2025_SINGLE_BRACKETS)
+        self.assertEqual(result_cache.cache_key(INPUTS_2024), keys[0])
+        self.assertNotEqual(result_cache.cache_key(INPUTS_2025), keys[1])
+        self.assertEqual(taxes.schedule(*INPUTS_2025).federal_brackets[0], (.1, 30000))
+
+        # without a path the builtin tables come back
+        self.assertEqual({year for year, state in bracket_data.reload()}, {2025})
+        self.assertEqual(result_cache.cache_key(INPUTS_2025), keys[1])
+
+    def test_invalid_file_is_rejected(self):
+        self.write({'federl': {}})
+        with self.assertRaises(ValueError):
+            bracket_data.reload(self.path)
+        self.assertEqual(taxes.FEDERAL_BRACKETS[2025]['married'], taxes.FEDERAL_2025_MARRIED_BRACKETS)
+
+    def test_watcher_reloads_on_change(self):
+        bracket_data.configure(self.path, watch=True, poll_seconds=.05)
+        self.write({'deductions': {'2025': {'married': 31000}}})
+        deadline = time.time() + 10
+        while taxes.deduction('married', 2025) != 31000 and time.time() < deadline:
+            time.sleep(.05)
+        self.assertEqual(taxes.deduction('married', 2025), 31000)
+        # the new file replaces the old overrides rather than adding to them
+        self.assertEqual(taxes.get_federal_brackets(2025)['married'], taxes.FEDERAL_2025_MARRIED_BRACKETS)
+
+    def test_admin_endpoint(self):
+        client = TestClient(api.app)
+        self.assertEqual(client.post('/admin/reload').status_code, 404)
+        with mock.patch.dict(os.environ, {'IRACONVERT_ADMIN_TOKEN': 'secret', 'IRACONVERT_BRACKETS_PATH': self.path}):
+            self.assertEqual(client.post('/admin/reload', headers={'X-Admin-Token': 'wrong'}).status_code, 403)
+            response = client.post('/admin/reload', headers={'X-Admin-Token': 'secret'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['version'], taxes.data_version())
+        self.assertIn({'year': 2025, 'state': 'CA'}, response.json()['changed'])
+
+    def test_admin_endpoint_reaches_watching_workers(self):
+        bracket_data.configure(self.path, watch=True, poll_seconds=.05)
+        # the watcher stands in for another worker, it only reloads when the file changes
+        watcher = bracket_data.WATCHER
+        time.sleep(.2)
+        reloads = watcher.reloads
+        client = TestClient(api.app)
+        with mock.patch.dict(os.environ, {'IRACONVERT_ADMIN_TOKEN': 'secret', 'IRACONVERT_BRACKETS_PATH': self.path}):
+            response = client.post('/admin/reload', headers={'X-Admin-Token': 'secret'})
+        self.assertTrue(response.json()['broadcast'])
+        deadline = time.time() + 10
+        while watcher.reloads == reloads and time.time() < deadline:
+            time.sleep(.05)
+        self.assertGreater(watcher.reloads, reloads)
+
+    def test_reload_waits_for_readers(self):
+        reloaded = threading.Event()
+        with taxes.DATA_LOCK:
+            thread = threading.Thread(target=lambda: bracket_data.reload(self.path) and reloaded.set())
+            thread.start()
+            self.assertFalse(reloaded.wait(.2))
+            self.assertEqual(taxes.get_federal_brackets(2025)['married'], taxes.FEDERAL_2025_MARRIED_BRACKETS)
+        thread.join()
+        self.assertTrue(reloaded.is_set())
+
+
+if __name__ == '__main__':
+    unittest.main()
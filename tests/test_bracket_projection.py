@@ -0,0 +1,59 @@
+import unittest
+
+import numpy as np
+
+import bracket_projection
+import lifetime
+import taxes
+
+
+class TestBracketProjection(unittest.TestCase):
+    def test_data_years_are_published_values(self):
+        brackets = bracket_projection.raw_tax_brackets(2025, 'married', 'CA')
+        self.assertEqual(brackets['federal'], taxes.FEDERAL_BRACKETS[2025]['married'])
+        self.assertEqual(brackets['deduction'], taxes.STANDARD_DEDUCTIONS[2025]['married'])
+
+    def test_indexing_rules(self):
+        brackets = bracket_projection.raw_tax_brackets(2027, 'single', 'CA', (.03, .04))
+        factor = 1.03 * 1.04
+        self.assertEqual(bracket_projection.inflation_factor(2027, (.03, .04)), factor)
+        for (rate, bound), (base_rate, base_bound) in zip(brackets['federal'], taxes.FEDERAL_BRACKETS[2025]['single']):
+            self.assertEqual(rate, base_rate)
+            if base_bound == taxes.MAX_INCOME:
+                self.assertEqual(bound, taxes.MAX_INCOME)
+            else:
+                self.assertEqual(bound % 25, 0)
+                self.assertTrue(0 <= base_bound * factor - bound < 25)
+        self.assertEqual(brackets['deduction'] % 50, 0)
+        self.assertEqual(brackets['nit'], taxes.NII_BRACKETS['single'])
+        self.assertEqual(brackets['state'][-1][1], taxes.MAX_INCOME)
+        irmaa = bracket_projection.project(2027, (.03, .04))['irmaa']['married']
+        self.assertTrue(all(bound % 1000 == 0 for surcharge, bound in irmaa[:-1]))
+        self.assertEqual([surcharge for surcharge, bound in irmaa], [surcharge for surcharge, bound in taxes.IRMAA_BRACKETS[2025]['married']])
+
+    def test_cached_by_path_and_year(self):
+        self.assertIs(bracket_projection.project(2030, .02), bracket_projection.project(2030, [.02]))
+        self.assertIsNot(bracket_projection.project(2030, .02), bracket_projection.project(2030, .03))
+
+    def test_scenarios_match_single_projection(self):
+        paths = np.array([[.02, .02], [.03, .01], [.05, .04]])
+        stacked = bracket_projection.project_scenarios(2028, paths)
+        for idx, path in enumerate(paths):
+            projected = bracket_projection.project(2028, tuple(path))
+            rates, bounds = stacked['federal']['head']
+            self.assertEqual(list(zip(rates.tolist(), bounds[idx].tolist())), projected['federal']['head'])
+            self.assertEqual(stacked['deductions']['head'][idx], projected['deductions']['head'])
+            rates, bounds = stacked['state']['CA']['married']
+            self.assertEqual(bounds[idx].tolist(), [bound for rate, bound in projected['state']['CA']['married']])
+
+    def test_lifetime_uses_projection(self):
+        args = dict(age=60, ira_balance=1000000, conversions=[50000] * 10, growth=.05, year=2025, status='married', state='none')
+        flat = lifetime.project(**args)
+        indexed = lifetime.project(**args, brackets_for_year=bracket_projection.brackets_for_year(.03))
+        self.assertAlmostEqual(flat.tax[0, 0, 0], indexed.tax[0, 0, 0])
+        # wider brackets and larger deductions lower later taxes
+        self.assertLess(indexed.tax[0, 0, -1], flat.tax[0, 0, -1])
+
+
+if __name__ == '__main__':
+    unittest.main()
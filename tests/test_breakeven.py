@@ -0,0 +1,62 @@
+import unittest
+
+import numpy as np
+
+import breakeven
+import graph
+import summary
+import taxes
+
+
+class TestBreakeven(unittest.TestCase):
+    def test_matches_year_by_year(self):
+        conversion, tax, growth, future_rate, drag = 100000, 30000, .06, .25, .2
+        years = breakeven.breakeven_years([tax], [conversion], [growth], [future_rate], drag)[0, 0, 0]
+        taxable_growth = growth * (1 - drag)
+        # the conversion is behind a year before and ahead a year after
+        ahead = lambda n: conversion * future_rate * (1 + growth) ** n - tax * (1 + taxable_growth) ** n
+        self.assertLess(ahead(years - 1), 0)
+        self.assertGreater(ahead(years + 1), 0)
+        self.assertAlmostEqual(ahead(years), 0, places=6)
+
+    def test_edges(self):
+        years = breakeven.breakeven_years([10000, 30000, 30000], [100000, 100000, 0], [.05, 0], [.25], .2)
+        self.assertEqual(years.shape, (2, 1, 3))
+        # cheap conversions are ahead at once, without growth or without a conversion they never catch up
+        self.assertEqual(years[0, 0, 0], 0)
+        self.assertTrue(np.isinf(years[1, 0, 1]))
+        self.assertTrue(np.isinf(years[0, 0, 2]))
+
+    def test_grid_and_table(self):
+        schedule = taxes.schedule(100000, 750000, 20000, 40000, 2024, 'married', 'CA')
+        grid = breakeven.grid(schedule, future_rates=[.2, .35])
+        self.assertEqual(grid.years.shape, (len(breakeven.DEFAULT_GROWTH_RATES), 2, len(grid.conversions)))
+        self.assertAlmostEqual(grid.additional_tax[-1], schedule.additional_tax(750000), places=6)
+        # a lower future rate never pays off sooner
+        self.assertTrue((grid.years[:, 0] >= grid.years[:, 1]).all())
+
+        # without growth nothing pays off, which the grid sends as null
+        page = summary.paginate(breakeven.table(breakeven.grid(schedule, [0, .05], [.2]), 0), 0, 100)
+        self.assertEqual(page['columns'][:2], ['Conversion Amount', 'Additional Tax'])
+        self.assertIn(None, [value for row in page['rows'] for value in row])
+
+    def test_grid_over_future_rates_around_the_input(self):
+        rates = breakeven.future_rates_around(.35)
+        np.testing.assert_allclose(rates, [.2, .25, .3, .35, .4, .45, .5])
+        self.assertEqual(breakeven.future_rates_around(.05)[0], 0)
+        schedule = taxes.schedule(100000, 750000, 20000, 40000, 2024, 'married', 'CA')
+        grid = breakeven.grid(schedule, future_rates=rates)
+        df = breakeven.table(grid)
+        self.assertEqual(len(df), len(rates) * len(grid.conversions))
+        self.assertEqual(sorted(set(df['Future Rate'])), list(rates))
+        self.assertEqual(summary.column_format('Future Rate'), 'percent')
+
+        fig = graph.plot_breakeven(grid, 3)
+        self.assertEqual(len(fig.data), len(rates))
+        self.assertEqual([trace.visible for trace in fig.data], [idx == 3 for idx in range(len(rates))])
+        self.assertEqual(len(fig.layout.updatemenus[0].buttons), len(rates))
+        self.assertIn('35%', fig.layout.title.text)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,49 @@
+import os
+import tempfile
+import unittest
+
+import numpy as np
+
+import dense_tables
+import taxes
+import vector_taxes
+
+
+class TestDenseTables(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.brackets = taxes.get_state_brackets('CA', 2025, 'married')
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_matches_vector_taxes(self):
+        table = dense_tables.table(self.brackets, 10, 200000, self.directory.name)
+        incomes = np.concatenate([np.arange(-20, 250000, 7.5), [bound for rate, bound in self.brackets]])
+        np.testing.assert_allclose(table.income_tax(incomes), vector_taxes.income_tax(incomes, self.brackets), rtol=0, atol=1e-6)
+        self.assertAlmostEqual(table.income_tax(50998), vector_taxes.income_tax(50998, self.brackets))
+        # bounds that are not multiples of the step mark their cells
+        self.assertTrue(table.kinked[int(self.brackets[0][1] // 10)])
+
+    def test_generated_once_and_memory_mapped(self):
+        table = dense_tables.table_for(2024, 'single', 'federal', 100, 100000, self.directory.name)
+        files = os.listdir(self.directory.name)
+        self.assertEqual(len(files), 1)
+        self.assertTrue(files[0].startswith('federal-2024-single-100-100000-'))
+        self.assertIsInstance(table.taxes, np.memmap)
+        self.assertIs(dense_tables.table_for(2024, 'single', 'federal', 100, 100000, self.directory.name), table)
+        with self.assertRaises(ValueError):
+            dense_tables.table(self.brackets, 7, 100, self.directory.name)
+
+    def test_schedule_taxes(self):
+        brackets = taxes.raw_tax_brackets(2024, 'married', 'CA')
+        incomes = np.linspace(0, 3000000, 301)
+        args = (incomes, 40000, 20000, brackets['federal'], brackets['state'], brackets['nit'], brackets['longterm'], 29200, 0, 50000)
+        dense = vector_taxes.schedule_taxes(*args, tax_function=lambda income, brackets_: dense_tables.table(
+            brackets_, directory=self.directory.name).income_tax(income))
+        for component, values in vector_taxes.schedule_taxes(*args).items():
+            np.testing.assert_allclose(dense[component], values, rtol=0, atol=1e-6)
+
+
+if __name__ == '__main__':
+    unittest.main()
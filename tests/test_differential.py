@@ -0,0 +1,57 @@
+import unittest
+
+import differential
+
+
+def _buggy_engine(case):
+    # federal tax off by a dollar once ordinary income passes 50,000
+    result = differential.schedule_engine(case)
+    result['federal_tax'] = [tax + (1 if case.ordinary_income() + conversion > 50000 else 0)
+                             for tax, conversion in zip(result['federal_tax'], case.conversions)]
+    return {'federal_tax': result['federal_tax']}
+
+
+class TestDifferential(unittest.TestCase):
+    def setUp(self):
+        self.case = differential.Case(
+            pretax_wage_income=100000,
+            ordinary_capital_income=40000,
+            qualified_capital_income=20000,
+            federal_brackets=((.1, 23200), (.12, 94300), (.22, 201050), (.24, 383900), (.37, 9999999)),
+            state_brackets=((.01, 21512), (.02, 50998), (.093, 721318), (.123, 9999999)),
+            nit_brackets=((0, 250000), (.038, 9999999)),
+            longterm_brackets=((0, 94050), (.15, 583750), (.2, 9999999)),
+            federal_deduction=29200,
+            state_deduction=0,
+            conversions=(0, 50000, 90050, 139200, 500000),
+        )
+
+    def test_legacy_engines_agree(self):
+        engines = list(differential.ENGINES.values())
+        self.assertEqual(differential.compare_case(self.case, engines), [])
+
+    def test_generated_cases_probe_kinks(self):
+        cases = differential.generate_cases(20, seed=1)
+        self.assertEqual(len(cases), 20)
+        for case in cases:
+            self.assertIn(0.0, case.conversions)
+            self.assertGreater(len(case.conversions), 2)
+
+    def test_disagreement_is_shrunk(self):
+        engines = [differential.ENGINES['schedule'], differential.Engine('buggy', _buggy_engine)]
+        disagreements = differential.compare_case(self.case, engines)
+        self.assertTrue(disagreements)
+        shrunk = differential.shrink(disagreements[0], engines)
+        self.assertEqual(shrunk.component, 'federal_tax')
+        self.assertEqual(len(shrunk.case.conversions), 1)
+        self.assertEqual(len(shrunk.case.federal_brackets), 1)
+        self.assertEqual(shrunk.case.qualified_capital_income, 0)
+
+    def test_run_reports_throughput(self):
+        report = differential.run(20, seed=2, engines=['schedule', 'compute_taxes'])
+        self.assertEqual(set(report.throughput), {'schedule', 'compute_taxes'})
+        self.assertEqual(report.ratios()['schedule'], 1.0)
+
+
+if __name__ == '__main__':
+    unittest.main()
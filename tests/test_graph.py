@@ -0,0 +1,58 @@
+import unittest
+
+import plotly.graph_objects as go
+
+import graph
+import instrumentation
+import taxes
+
+
+class TestPlotTaxBrackets(unittest.TestCase):
+    def setUp(self):
+        self.schedule = taxes.schedule(100000, 750000, 20000, 40000, 2024, 'married', 'CA')
+
+    def plot(self, schedule, webgl=None):
+        return graph.plot_tax_brackets(schedule.pretax_wage_income, schedule.qualified_capital_income, schedule.ordinary_capital_income,
+                                       schedule.income_only_curve, schedule.capital_taxes, .35, schedule.max_conversion_amount, webgl)
+
+    def test_small_curves_keep_one_trace_per_bracket(self):
+        fig = self.plot(self.schedule)
+        self.assertEqual(len(fig.data), len(self.schedule.income_only_curve) + len(self.schedule.capital_taxes) + 1)
+        self.assertEqual({trace.type for trace in fig.data}, {'scatter'})
+
+    def test_webgl_packs_brackets(self):
+        fig = self.plot(self.schedule, webgl=True)
+        self.assertEqual([trace.type for trace in fig.data], ['scattergl'] * 3)
+        lines = fig.data[0]
+        self.assertEqual(sum(value is None for value in lines.x), len(self.schedule.income_only_curve))
+        self.assertEqual(len(lines.customdata), len(lines.x))
+        self.assertEqual(len(fig.data[1].x), len(self.schedule.capital_taxes))
+        self.assertLess(graph.figure_payload_bytes(fig), graph.figure_payload_bytes(self.plot(self.schedule, webgl=False)))
+
+    def test_narrow_brackets_merge_into_their_neighbours(self):
+        bounds = [0, 100000, 100010, 100020, 200000]
+        amounts = [[lower, upper] for lower, upper in zip(bounds, bounds[1:])]
+        fig = go.Figure()
+        graph._add_packed_traces(fig, amounts, [[.1, .1]] * 4, [['a', 'a']] * 4, 200000, width=100)
+        lines = [value for value in fig.data[0].x]
+        self.assertEqual(lines, [0, 100020, None, 100020, 200000, None])
+
+    def test_payload_bytes_are_reported(self):
+        before = instrumentation.snapshot()['graph']
+        fig = self.plot(self.schedule, webgl=True)
+        after = instrumentation.snapshot()['graph']
+        self.assertEqual(after['packed'], before['packed'] + 1)
+        self.assertEqual(after['last_bytes'], graph.figure_payload_bytes(fig))
+
+    def test_downsample_keeps_extremes(self):
+        x = list(range(10000))
+        y = [value % 7 for value in x]
+        small_x, small_y, small_text = graph.downsample(x, y, x, width=100)
+        self.assertLessEqual(len(small_x), 200)
+        self.assertEqual(small_x, small_text)
+        self.assertEqual((min(small_y), max(small_y)), (0, 6))
+        self.assertEqual(graph.downsample([1, 2], [3, 4], ['a', 'b']), ([1, 2], [3, 4], ['a', 'b']))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,47 @@
+import unittest
+
+import numpy as np
+
+import harvest
+import taxes
+
+
+class TestHarvest(unittest.TestCase):
+    def grid_value(self, household, points=201):
+        """Best value on a dense grid, the optimizer must do at least as well."""
+        schedule = lambda harvested: taxes.schedule(household.pretax_income, household.assets, household.longterm_gains + harvested,
+                                                    household.capital_income, household.year, household.status, household.state,
+                                                    household.deduction)
+        base_tax = taxes.schedule(household.pretax_income, 0, household.longterm_gains, household.capital_income,
+                                  household.year, household.status, household.state, household.deduction).initial_tax.total_tax()
+        best = 0
+        for harvested in np.linspace(0, household.unrealized_gains, 21):
+            schedule_ = schedule(harvested)
+            for conversion in np.linspace(0, household.assets, points):
+                additional = schedule_.initial_tax.total_tax() + schedule_.additional_tax(conversion) - base_tax
+                best = max(best, household.future_rate * conversion + household.future_gains_rate * harvested - additional)
+        return best
+
+    def test_fills_zero_bracket_with_gains(self):
+        # a low future rate makes conversions unattractive, the 0% gains bracket is better used for harvesting
+        household = harvest.Household(40000, 100000, 120000, future_rate=.1, state='none')
+        plan = harvest.optimize(household)
+        self.assertEqual(plan.conversion, 0)
+        self.assertAlmostEqual(plan.harvest, taxes.GAINS_RATE[2024]['married'][0][1] - (40000 - taxes.deduction('married', 2024)), places=1)
+        self.assertAlmostEqual(plan.additional_tax, 0)
+
+    def test_at_least_as_good_as_grid(self):
+        for household in [harvest.Household(50000, 300000, 100000, 10000, 5000, future_rate=.22),
+                          harvest.Household(150000, 500000, 200000, 30000, 40000, future_rate=.35),
+                          harvest.Household(20000, 100000, 80000, status='single', future_rate=.1, deduction=5000)]:
+            plan = harvest.optimize(household)
+            self.assertGreaterEqual(plan.value, self.grid_value(household) - 1e-6)
+
+    def test_batch_matches_single(self):
+        households = [harvest.Household(income, 200000, 50000, 5000, 1000, status=status, future_rate=.3)
+                      for income in (0, 60000, 250000) for status in ('single', 'married')]
+        self.assertEqual(harvest.optimize_batch(households), [harvest.optimize(household) for household in households])
+
+
+if __name__ == '__main__':
+    unittest.main()
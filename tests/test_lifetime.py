@@ -0,0 +1,59 @@
+import time
+import unittest
+
+import numpy as np
+
+import lifetime
+import taxes
+
+
+class TestProjection(unittest.TestCase):
+    def test_rmds_start_at_rmd_age(self):
+        result = lifetime.project(72, 1000000, np.zeros(3), 0.0)
+        self.assertEqual(result.rmd[0, 0, 0], 0)
+        self.assertAlmostEqual(result.rmd[0, 0, 1], 1000000 / 26.5)
+        self.assertAlmostEqual(result.ira[0, 0, 2], 1000000 - 1000000 / 26.5)
+
+    def test_conversion_limited_by_balance(self):
+        result = lifetime.project(60, 100000, [80000, 80000], 0.0)
+        np.testing.assert_allclose(result.conversions[0, 0], [80000, 20000])
+        self.assertAlmostEqual(result.ira_end[0, 0], 0)
+        self.assertAlmostEqual(result.roth_end[0, 0], 100000)
+
+    def test_tax_matches_schedule(self):
+        result = lifetime.project(60, 1000000, [50000], 0.05, pretax_wage_income=100000, year=2024)
+        schedule = taxes.schedule(100000, 50000, 0, 0, 2024, 'married', 'CA')
+        self.assertAlmostEqual(result.additional_tax[0, 0, 0], schedule.additional_tax(50000))
+
+    def test_after_tax_value_counts_rmds(self):
+        growth, future_rate, discount_rate = 0.05, 0.3, 0.02
+        result = lifetime.project(73, 1000000, np.zeros(2), growth, year=2024)
+        rmd = [1000000 / 26.5]
+        rmd.append((1000000 - rmd[0]) * 1.05 / 25.5)
+        ira_end = ((1000000 - rmd[0]) * 1.05 - rmd[1]) * 1.05
+        taxable_end = (rmd[0] * 1.05 + rmd[1]) * 1.05
+        taxes_paid = [taxes.schedule(0, amount, 0, 0, 2024 + t, 'married', 'CA').additional_tax(amount) for t, amount in enumerate(rmd)]
+        expected = (taxable_end + ira_end * (1 - future_rate)) / 1.02 ** 2 - taxes_paid[0] - taxes_paid[1] / 1.02
+        self.assertAlmostEqual(result.taxable_end[0, 0], taxable_end)
+        self.assertAlmostEqual(result.after_tax_value(future_rate, discount_rate)[0, 0], expected, places=6)
+
+    def test_strategies_and_scenarios_are_independent(self):
+        strategies = lifetime.level_strategies([0, 50000, 100000], 5, 10)
+        growth = [0.02, 0.07]
+        batch = lifetime.project(65, 800000, strategies, growth)
+        for s in range(3):
+            for g in range(2):
+                single = lifetime.project(65, 800000, strategies[s], growth[g])
+                np.testing.assert_allclose(batch.tax[s, g], single.tax[0, 0])
+                np.testing.assert_allclose(batch.ira_end[s, g], single.ira_end[0, 0])
+
+    def test_thousand_strategies_forty_years(self):
+        strategies = lifetime.level_strategies(np.linspace(0, 200000, 1000), 10, 40)
+        start = time.perf_counter()
+        result = lifetime.project(60, 2000000, strategies, 0.06, pretax_wage_income=80000)
+        self.assertLess(time.perf_counter() - start, 1.0)
+        self.assertEqual(result.tax.shape, (1000, 1, 40))
+
+
+if __name__ == '__main__':
+    unittest.main()
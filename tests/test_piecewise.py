@@ -0,0 +1,69 @@
+import unittest
+
+import numpy as np
+
+import piecewise
+import taxes
+from piecewise import PiecewiseLinear
+
+
+class TestPiecewiseLinear(unittest.TestCase):
+    def setUp(self):
+        self.brackets = [(.1, 10000), (.2, 30000), (.3, 9999999)]
+        self.income_tax = PiecewiseLinear.income_tax(self.brackets)
+        self.cliff = PiecewiseLinear.cliff([(0, 20000), (.15, 9999999)], 1000)
+
+    def test_income_tax(self):
+        np.testing.assert_allclose(self.income_tax([-5, 0, 5000, 10000, 20000, 40000]), [0, 0, 500, 1000, 3000, 8000])
+        self.assertEqual(self.income_tax(10000), 1000)
+        self.assertEqual(self.income_tax.slope(10000), .2)
+
+    def test_cliff_is_right_continuous(self):
+        np.testing.assert_allclose(self.cliff([19999.99, 20000, 50000]), [0, 150, 150])
+        np.testing.assert_allclose(self.cliff.jumps, [150])
+
+    def test_add_and_compose(self):
+        total = self.income_tax.compose(5000) + self.cliff.compose(5000)
+        conversions = np.array([0, 4999, 5000, 15000, 25000])
+        np.testing.assert_allclose(total(conversions), self.income_tax(conversions + 5000) + self.cliff(conversions + 5000))
+        np.testing.assert_allclose(total.intercepts + total.slopes * 30000, total.values + total.slopes * (30000 - total.anchors))
+        np.testing.assert_allclose((total - total)(conversions), 0)
+
+    def test_deduct(self):
+        gross = self.income_tax.deduct(12000)
+        self.assertEqual(gross(12000), 0)
+        self.assertAlmostEqual(gross(22000), 1000)
+
+    def test_restrict(self):
+        restricted = self.income_tax.restrict(15000, 35000)
+        np.testing.assert_array_equal(restricted.breakpoints, [30000])
+        self.assertAlmostEqual(restricted(20000), 3000)
+        self.assertTrue(np.isnan(restricted(40000)))
+
+    def test_invert(self):
+        total = (self.income_tax + self.cliff).restrict(0, np.inf)
+        np.testing.assert_allclose(total.invert([0, 1000, 2000, 3000, 3100, 3200]), [0, 10000, 15000, 20000, 20000, 20250])
+        self.assertEqual(self.income_tax.restrict(0, 20000).invert(10 ** 6), np.inf)
+        with self.assertRaises(ValueError):
+            (-self.income_tax).invert(100)
+
+
+class TestScheduleFunction(unittest.TestCase):
+    def test_matches_additional_tax(self):
+        schedule = taxes.schedule(100000, 500000, 20000, 40000, 2024, 'married', 'CA', surcharges=('irmaa',))
+        conversions = np.linspace(0, 500000, 501)
+        expected = [schedule._construct_bracket_from_one_point(conversion).total_tax() - schedule.initial_tax.total_tax()
+                    for conversion in conversions]
+        np.testing.assert_allclose(schedule.additional_taxes(conversions), expected, atol=1e-6)
+
+    def test_breakpoints_cover_every_component(self):
+        schedule = taxes.schedule(100000, 500000, 20000, 40000, 2024, 'married', 'CA')
+        total = schedule.total_tax_function()
+        components = piecewise.schedule_components(schedule)
+        self.assertEqual(set(components), {'federal_tax', 'state_tax', 'nit_tax', 'longterm_tax'})
+        for function in components.values():
+            self.assertTrue(np.isin(function.breakpoints, total.breakpoints).all())
+
+
+if __name__ == '__main__':
+    unittest.main()
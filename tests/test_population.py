@@ -0,0 +1,63 @@
+import os
+import tempfile
+import time
+import unittest
+
+import numpy as np
+
+import benchmark
+import population
+
+
+class TestPopulation(unittest.TestCase):
+    def setUp(self):
+        self.population = population.generate(5000, seed=3)
+
+    def test_is_reproducible(self):
+        again = population.generate(5000, seed=3)
+        for name in population.COLUMNS:
+            np.testing.assert_array_equal(self.population[name], again[name])
+
+    def test_distributions(self):
+        wages = self.population['pretax_income']
+        self.assertTrue((wages >= 0).all())
+        # a Pareto tail puts the top wages far above the median
+        self.assertGreater(np.percentile(wages, 99.5), 5 * np.median(wages[wages > 0]))
+        self.assertAlmostEqual((self.population['longterm_gains'] > 0).mean(), population.DEFAULT_CONFIG.gains_share, delta=.03)
+        self.assertEqual(set(self.population['statuses'][self.population['status']]), {'married', 'single', 'head'})
+
+    def test_save_load_households(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'population.npz')
+            population.save(path, self.population)
+            loaded = population.load(path)
+        self.assertEqual(population.size(loaded), 5000)
+        household = next(population.households(loaded, 10, 11))
+        self.assertEqual(household.pretax_income, self.population['pretax_income'][10])
+        self.assertIn(household.status, ['married', 'single', 'head'])
+
+
+class TestBenchmark(unittest.TestCase):
+    def test_run(self):
+        rows = benchmark.run(population.generate(200, seed=1), count=100)
+        self.assertEqual([row['engine'] for row in rows], list(benchmark.ENGINES))
+        for row in rows:
+            self.assertEqual(row['households'], 100)
+            self.assertGreater(row['per_second'], 0)
+            self.assertEqual(row['efficiency'], 1.0)
+        self.assertIn('vectorized', benchmark.format_report(rows))
+
+    def test_pool_times_only_the_engine(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'population.npz')
+            population.save(path, population.generate(200, seed=1))
+            started = time.perf_counter()
+            seconds = benchmark.measure(path, 'vectorized', 200, 2)
+            elapsed = time.perf_counter() - started
+        self.assertGreater(seconds, 0)
+        # starting the pool and loading the file are not part of the measurement
+        self.assertLess(seconds, elapsed)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,56 @@
+import unittest
+
+import regimes
+import summary
+import taxes
+
+HOUSEHOLD = (100000, 750000, 20000, 40000)
+
+
+class TestRegimes(unittest.TestCase):
+    def test_current_law_matches_schedule(self):
+        comparison = regimes.compare([regimes.current_law(2024)], *HOUSEHOLD, 'married', 'CA', .35)
+        schedule = taxes.schedule(*HOUSEHOLD, 2024, 'married', 'CA')
+        for conversion, additional_tax in zip(comparison.conversions, comparison.additional_tax[0]):
+            self.assertAlmostEqual(additional_tax, schedule.additional_tax(conversion), places=6)
+        for bracket in schedule.entire_curve:
+            self.assertIn(bracket.upper, comparison.conversions)
+
+    def test_recommendation_matches_explain(self):
+        for household in [HOUSEHOLD, (30000, 200000, 0, 5000), (400000, 900000, 50000, 100000)]:
+            schedule = taxes.schedule(*household, 2024, 'married', 'CA')
+            for future_rate in (.3, .35, .45):
+                comparison = regimes.compare([regimes.current_law(2024)], *household, 'married', 'CA', future_rate)
+                conversion = comparison.recommendations[0]['conversion']
+                lines = summary.explain(schedule, household[1], future_rate)
+                if conversion == 0:
+                    self.assertIn('higher than your future tax rate', lines[0])
+                elif conversion == household[1]:
+                    self.assertEqual(lines[0], "Consider converting everything")
+                else:
+                    self.assertEqual(lines[0], f"Consider converting ${conversion:,.2f} dollars")
+
+    def test_tcja_sunset(self):
+        sunset = regimes.tcja_sunset(2024)
+        self.assertEqual([rate for rate, bound in sunset.federal['married']], [.1, .15, .25, .28, .33, .35, .396])
+        self.assertEqual(sunset.federal['married'][-1][1], taxes.MAX_INCOME)
+        self.assertEqual(sunset.longterm['married'][0][1], sunset.federal['married'][1][1])
+        comparison = regimes.compare(regimes.default_regimes(2024), *HOUSEHOLD, 'married', 'CA', .35)
+        self.assertEqual(comparison.names, ['Current law 2024', 'TCJA sunset 2024'])
+        self.assertEqual(comparison.additional_tax.shape, (2, len(comparison.conversions)))
+        # the old brackets are higher at every conversion amount
+        self.assertTrue((comparison.additional_tax[1] >= comparison.additional_tax[0]).all())
+        schedule = sunset.schedule(*HOUSEHOLD, 'married', 'CA')
+        self.assertAlmostEqual(comparison.additional_tax[1][-1], schedule.additional_tax(HOUSEHOLD[1]), places=6)
+
+    def test_table(self):
+        comparison = regimes.compare(regimes.default_regimes(2025), *HOUSEHOLD, 'single', 'none', .35)
+        df = regimes.table(comparison)
+        self.assertEqual(len(df), len(comparison.conversions))
+        page = summary.paginate(regimes.recommendation_table(comparison))
+        self.assertEqual(page['formats'], ['number', 'currency', 'percent', 'currency'])
+        self.assertEqual(page['rows'][0][0], 'Current law 2025')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,93 @@
+import os
+import tempfile
+import unittest
+
+import result_cache
+import taxes
+
+INPUTS = (100000, 750000, 20000, 40000, 2024, 'married', 'CA', None)
+
+
+class TestPersistentCache(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, 'cache.sqlite')
+        self.computed = 0
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def compute(self, inputs=INPUTS):
+        self.computed += 1
+        return taxes.schedule(*inputs)
+
+    def test_hit_after_miss(self):
+        cache = result_cache.PersistentCache(self.path)
+        first = cache.get_or_compute(INPUTS, self.compute)
+        second = cache.get_or_compute(INPUTS, self.compute)
+        self.assertEqual(self.computed, 1)
+        self.assertEqual(list(second.entire_curve), list(first.entire_curve))
+        self.assertEqual(cache.stats()['hits'], 1)
+        cache.close()
+
+    def test_survives_restart_and_preloads(self):
+        cache = result_cache.PersistentCache(self.path)
+        cache.get_or_compute(INPUTS, self.compute)
+        cache.close()
+
+        restarted = result_cache.PersistentCache(self.path, preload=10)
+        self.assertEqual(restarted.stats()['preloaded'], 1)
+        restarted.get_or_compute(INPUTS, self.compute)
+        self.assertEqual(self.computed, 1)
+        restarted.close()
+
+    def test_size_bound_evicts_least_recently_used(self):
+        cache = result_cache.PersistentCache(self.path)
+        for income in (10000, 20000, 30000):
+            inputs = (income,) + INPUTS[1:]
+            cache.get_or_compute(inputs, lambda: self.compute(inputs))
+        size = cache.stats()['bytes'] // 3
+        cache.max_bytes = 2 * size
+        inputs = (40000,) + INPUTS[1:]
+        cache.get_or_compute(inputs, lambda: self.compute(inputs))
+        self.assertLessEqual(cache.stats()['bytes'], 2 * size)
+        self.assertIsNone(cache.get(result_cache.cache_key((10000,) + INPUTS[1:])))
+        self.assertIsNotNone(cache.get(result_cache.cache_key(inputs)))
+        cache.close()
+
+    def test_corrupt_row_is_recomputed(self):
+        cache = result_cache.PersistentCache(self.path)
+        cache.get_or_compute(INPUTS, self.compute)
+        key = result_cache.cache_key(INPUTS)
+        blob = cache._connection.execute("SELECT blob FROM schedules WHERE key = ?", (key,)).fetchone()[0]
+        for corrupt in (blob[:len(blob) // 2], blob[:40] + b'{' * 100):
+            cache._connection.execute("UPDATE schedules SET blob = ? WHERE key = ?", (corrupt, key))
+            self.assertIsNone(cache.get(key))
+            cache.get_or_compute(INPUTS, self.compute)
+        self.assertEqual(self.computed, 3)
+        self.assertIsNotNone(cache.get(key))
+        self.assertEqual(cache.stats()['bytes'], cache._bytes)
+        cache.close()
+
+    def test_hits_are_written_in_batches(self):
+        cache = result_cache.PersistentCache(self.path)
+        cache.get_or_compute(INPUTS, self.compute)
+        key = result_cache.cache_key(INPUTS)
+        hits = lambda: cache._connection.execute("SELECT hits FROM schedules WHERE key = ?", (key,)).fetchone()[0]
+        cache.get(key)
+        self.assertEqual(hits(), 0)
+        for _ in range(result_cache.TOUCH_BATCH - 1):
+            cache.get(key)
+        self.assertEqual(hits(), result_cache.TOUCH_BATCH)
+        cache.get(key)
+        cache.warm(1)
+        self.assertEqual(hits(), result_cache.TOUCH_BATCH + 1)
+        cache.close()
+
+    def test_key_includes_data_version(self):
+        self.assertEqual(result_cache.cache_key(INPUTS), result_cache.cache_key((100000.0,) + INPUTS[1:]))
+        self.assertNotEqual(result_cache.cache_key(INPUTS, 'a'), result_cache.cache_key(INPUTS, 'b'))
+
+
+if __name__ == '__main__':
+    unittest.main()
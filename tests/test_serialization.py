@@ -0,0 +1,46 @@
+import struct
+import unittest
+
+import serialization
+import simple_taxes
+import taxes
+
+
+class TestSerialization(unittest.TestCase):
+    def setUp(self):
+        self.schedule = taxes.schedule(100000, 750000, 20000, 40000, 2024, 'married', 'CA', surcharges=('irmaa',))
+
+    def assertSameSchedule(self, restored):
+        for name in serialization.INPUTS:
+            self.assertEqual(getattr(restored, name), getattr(self.schedule, name))
+        self.assertEqual(restored.surcharges, self.schedule.surcharges)
+        self.assertEqual(restored.initial_tax, self.schedule.initial_tax)
+        for curve in serialization.CURVES:
+            self.assertEqual(list(getattr(restored, curve)), list(getattr(self.schedule, curve)))
+        self.assertEqual(restored.additional_tax(123456), self.schedule.additional_tax(123456))
+
+    def test_binary_round_trip(self):
+        self.assertSameSchedule(serialization.from_bytes(serialization.to_bytes(self.schedule)))
+
+    def test_json_round_trip(self):
+        self.assertSameSchedule(serialization.from_json(serialization.to_json(self.schedule)))
+
+    def test_columns(self):
+        restored = serialization.from_bytes(serialization.to_bytes(self.schedule))
+        uppers = restored.entire_curve.column('upper')
+        self.assertEqual(list(uppers), [bracket.upper for bracket in self.schedule.entire_curve])
+        self.assertEqual(restored.entire_curve[1:3], list(self.schedule.entire_curve[1:3]))
+
+    def test_engine_version_mismatch(self):
+        blob = bytearray(serialization.to_bytes(self.schedule))
+        struct.pack_into('<H', blob, 6, simple_taxes.ENGINE_VERSION + 1)
+        with self.assertRaises(serialization.IncompatibleBlob):
+            serialization.from_bytes(bytes(blob))
+
+    def test_not_a_schedule(self):
+        with self.assertRaises(serialization.IncompatibleBlob):
+            serialization.from_bytes(b'garbage bytes')
+
+
+if __name__ == '__main__':
+    unittest.main()
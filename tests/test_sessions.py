@@ -0,0 +1,78 @@
+import time
+import unittest
+
+import plotly.graph_objects as go
+
+import sessions
+
+
+class TestSessionState(unittest.TestCase):
+    def setUp(self):
+        self.registry = sessions.SessionRegistry(sessions.EvictionPolicy(idle_seconds=60, min_artifact_bytes=0, max_total_bytes=None))
+        self.calls = 0
+
+    def compute(self):
+        self.calls += 1
+        return list(range(1000))
+
+    def test_get_caches_by_key(self):
+        state = self.registry.register('a')
+        state.get('curve', 1, self.compute)
+        state.get('curve', 1, self.compute)
+        self.assertEqual(self.calls, 1)
+        state.get('curve', 2, self.compute)
+        self.assertEqual(self.calls, 2)
+
+    def test_memory_usage(self):
+        state = self.registry.register('a')
+        state.get('curve', 1, self.compute)
+        usage = state.memory_usage()
+        self.assertGreater(usage['curve'], 1000 * 8)
+        report = self.registry.memory_report()
+        self.assertEqual(report['sessions'], 1)
+        self.assertEqual(report['total_bytes'], usage['curve'])
+
+    def test_idle_sessions_are_evicted_and_recomputed(self):
+        state = self.registry.register('a')
+        state.get('curve', 1, self.compute)
+        freed = self.registry.enforce(now=state.last_access + 61)
+        self.assertGreater(freed, 0)
+        self.assertEqual(state.memory_usage(), {})
+        state.get('curve', 1, self.compute)
+        self.assertEqual(self.calls, 2)
+
+    def test_ceiling_evicts_least_recent_session(self):
+        self.registry.policy.max_total_bytes = 1
+        old = self.registry.register('old')
+        new = self.registry.register('new')
+        old.get('curve', 1, self.compute)
+        new.get('curve', 1, self.compute)
+        self.assertEqual(old.memory_usage(), {})
+        self.assertIn('curve', new.memory_usage())
+
+    def test_sweeper_evicts_idle_sessions_without_computing(self):
+        self.registry.policy.idle_seconds = 0
+        self.registry.policy.sweep_seconds = .02
+        state = self.registry.register('a')
+        state.get('curve', 1, self.compute)
+        self.registry.start_sweeper()
+        try:
+            deadline = time.time() + 10
+            while state.memory_usage() and time.time() < deadline:
+                time.sleep(.02)
+        finally:
+            self.registry.stop_sweeper()
+        self.assertEqual(state.memory_usage(), {})
+
+    def test_figures_are_sized_from_their_points(self):
+        small = go.Figure(go.Scatter(x=list(range(10)), y=list(range(10))))
+        large = go.Figure(go.Scatter(x=list(range(10000)), y=list(range(10000))))
+        self.assertGreater(sessions.approximate_size(large) - sessions.approximate_size(small), 9990 * 2 * sessions.POINT_BYTES - 1)
+
+    def test_approximate_size_counts_shared_objects_once(self):
+        shared = list(range(100))
+        self.assertLess(sessions.approximate_size([shared, shared]), 2 * sessions.approximate_size(shared))
+
+
+if __name__ == '__main__':
+    unittest.main()
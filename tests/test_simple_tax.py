@@ -1,6 +1,7 @@
 import unittest
 
 import simple_taxes
+import summary
 
 class TestTaxSchedule(unittest.TestCase):
 
@@ -275,5 +276,188 @@ class TestTaxSchedule(unittest.TestCase):
         self.assertEqual(entire_curve[6].lower, 92000)
         self.assertEqual(entire_curve[6].upper, max_conversion_amount)
 
+class TestCliffs(unittest.TestCase):
+
+    def setUp(self):
+        self.nit = simple_taxes.Cliff('nit', ((0, 100000), (.038, 99999999)), 20000, 60000)
+        self.longterm = simple_taxes.Cliff('longterm', ((0, 50000), (.15, 100000), (.2, 99999999)), 10000, 60000)
+        self.irmaa = simple_taxes.Cliff('irmaa', ((0, 80000), (1000, 120000), (2500, 99999999)), 1, 70000)
+
+    def test_jumps(self):
+        [(amount, rate, marginal)] = self.longterm.jumps(100000)
+        self.assertEqual((amount, rate), (40000, .2))
+        self.assertAlmostEqual(marginal, .05)
+        self.assertEqual(list(self.irmaa.jumps(100000)), [(10000, 1000, 1000), (50000, 2500, 1500)])
+        self.assertEqual(list(self.irmaa.jumps(50000)), [(10000, 1000, 1000)])
+
+    def test_bundle(self):
+        self.assertEqual(self.nit.bundle(40000), simple_taxes.TaxBundle(.038, .038, .038 * 20000))
+        self.assertEqual(self.nit.bundle(50000), simple_taxes.TaxBundle(.038, 0, .038 * 20000))
+
+    def test_merge_cliff_jumps(self):
+        merged = simple_taxes.merge_cliff_jumps([self.nit, self.longterm, self.irmaa], 100000)
+        self.assertEqual([amount for amount, jumps in merged], [10000, 40000, 50000])
+        self.assertEqual([cliff.name for cliff, rate, marginal in merged[1][1]], ['nit', 'longterm'])
+
+    def test_surcharge_in_curve(self):
+        schedule = simple_taxes.TaxSchedule(
+            50000, 10000, 5000,
+            [(0.1, 9875), (0.12, 40125), (0.22, 85525), (.3, 99999999)],
+            [(0.03, 9875), (0.05, 40125), (0.07, 999999999)],
+            [(0, 100000), (0.2, 99999999)],
+            [(0, 56000), (0.15, 100000), (0.2, 99999999)],
+            12000, 5000,
+            surcharges=[simple_taxes.Cliff('irmaa', ((0, 80000), (1000, 99999999)), 1, 65000)])
+        _, capital_taxes, entire_curve = schedule.tax_curve(60000)
+        self.assertEqual([bracket.upper for bracket in capital_taxes], [3000, 15000, 47000])
+        self.assertEqual(capital_taxes[1].surcharges, (('irmaa', simple_taxes.TaxBundle(1000, 1000, 1000)),))
+        self.assertEqual(capital_taxes[1].surcharge_jump(), 1000)
+        self.assertAlmostEqual(schedule.additional_tax(15000) - schedule.additional_tax(14999), 1000 + .22 + .07, places=5)
+
+
+class TestWithChanges(unittest.TestCase):
+    def schedule(self, wage, federal_deduction, qualified=5000):
+        schedule = simple_taxes.TaxSchedule(
+            wage, 10000, qualified,
+            [(0.1, 9875), (0.12, 40125), (0.22, 85525), (.3, 99999999)],
+            [(0.03, 9875), (0.05, 40125), (0.07, 999999999)],
+            [(0, 100000), (0.038, 99999999)],
+            [(0, 56000), (0.15, 100000), (0.2, 99999999)],
+            federal_deduction, 5000,
+            surcharges=[simple_taxes.Cliff('irmaa', ((0, 80000), (1000, 99999999)), 1, wage + 10000 + qualified)])
+        schedule.save_curve(150000)
+        return schedule
+
+    def assertSameSchedule(self, derived, fresh):
+        for curve in ['income_only_curve', 'capital_taxes', 'entire_curve']:
+            self.assertEqual(getattr(derived, curve), getattr(fresh, curve))
+        self.assertEqual(derived.initial_tax, fresh.initial_tax)
+
+    def test_matches_fresh_schedule(self):
+        previous = self.schedule(50000, 12000)
+        self.assertSameSchedule(previous.with_changes(pretax_wage_income=65000), self.schedule(65000, 12000))
+        self.assertSameSchedule(previous.with_changes(federal_deduction=20000), self.schedule(50000, 20000))
+        self.assertSameSchedule(previous.with_changes(qualified_capital_income=30000), self.schedule(50000, 12000, 30000))
+        self.assertEqual(previous.pretax_wage_income, 50000)
+
+    def test_reuses_unchanged_components(self):
+        previous = self.schedule(50000, 12000)
+        derived = previous.with_changes(federal_deduction=20000)
+        self.assertIs(derived.federal_brackets, previous.federal_brackets)
+        self.assertLessEqual(previous._bundles['state'].items(), derived._bundles['state'].items())
+        self.assertNotIn(('tax', 47000), derived._bundles['federal'])
+
+    def test_rejects_other_inputs(self):
+        with self.assertRaises(TypeError):
+            self.schedule(50000, 12000).with_changes(federal_brackets=[])
+
+    def test_shifted_matches_fresh_schedule(self):
+        anchor = self.schedule(50000, 12000)
+        shifted = anchor.shifted(2500, 140000)
+        fresh = self.schedule(52500, 12000)
+        fresh.save_curve(140000)
+        self.assertSameSchedule(shifted, fresh)
+        self.assertEqual(shifted.surcharges, fresh.surcharges)
+        self.assertEqual(shifted._bundles, {})
+        with self.assertRaises(ValueError):
+            anchor.shifted(2500, 150000)
+
+
+class TestFrozenTaxSchedule(unittest.TestCase):
+    ARGS = (50000, 10000, 5000,
+            [(0.1, 9875), (0.12, 40125), (0.22, 85525), (.3, 99999999)],
+            [(0.03, 9875), (0.05, 40125), (0.07, 999999999)],
+            [(0, 100000), (0.038, 99999999)],
+            [(0, 56000), (0.15, 100000), (0.2, 99999999)],
+            12000, 5000)
+
+    def setUp(self):
+        self.schedule = simple_taxes.FrozenTaxSchedule(*self.ARGS, 150000)
+
+    def test_matches_mutable_schedule(self):
+        mutable = simple_taxes.TaxSchedule(*self.ARGS)
+        mutable.save_curve(150000)
+        for curve in ['income_only_curve', 'capital_taxes', 'entire_curve']:
+            self.assertEqual(list(getattr(self.schedule, curve)), getattr(mutable, curve))
+            self.assertIsInstance(getattr(self.schedule, curve), tuple)
+        self.assertEqual(self.schedule.max_conversion_amount, 150000)
+        self.assertEqual(self.schedule.federal_brackets, tuple(self.ARGS[3]))
+
+    def test_immutable(self):
+        with self.assertRaises(AttributeError):
+            self.schedule.pretax_wage_income = 1
+        with self.assertRaises(AttributeError):
+            self.schedule.save_curve(200000)
+        with self.assertRaises(AttributeError):
+            self.schedule.entire_curve[0].upper = 1
+
+    def test_with_changes_shares_brackets(self):
+        derived = self.schedule.with_changes(pretax_wage_income=70000)
+        self.assertIsInstance(derived, simple_taxes.FrozenTaxSchedule)
+        self.assertIs(derived.federal_brackets, self.schedule.federal_brackets)
+        self.assertEqual(self.schedule.pretax_wage_income, 50000)
+        fresh = simple_taxes.FrozenTaxSchedule(70000, *self.ARGS[1:], 150000)
+        self.assertEqual(derived.entire_curve, fresh.entire_curve)
+        self.assertIs(fresh.state_brackets, self.schedule.state_brackets)
+        with self.assertRaises(AttributeError):
+            derived.federal_deduction = 0
+
+    def test_curves_are_built_on_first_use(self):
+        self.assertNotIn('entire_curve', vars(self.schedule))
+        summary.explain(self.schedule, self.schedule.max_conversion_amount, .2)
+        self.assertNotIn('entire_curve', vars(self.schedule))
+        self.assertNotIn('income_only_curve', vars(self.schedule))
+        curve = self.schedule.entire_curve
+        self.assertIs(self.schedule.entire_curve, curve)
+        self.assertIsInstance(curve, tuple)
+        with self.assertRaises(AttributeError):
+            self.schedule.entire_curve = ()
+
+    def test_iter_curve_matches_curves(self):
+        lazy = [list(self.schedule.iter_curve()), list(self.schedule.iter_curve(include_capital=False))]
+        self.assertEqual(lazy, [list(self.schedule.entire_curve), list(self.schedule.income_only_curve)])
+        self.assertEqual(list(self.schedule.iter_curve(100000)), list(simple_taxes.FrozenTaxSchedule(*self.ARGS, 100000).entire_curve))
+
+    def test_iter_curve_stops_early(self):
+        mutable = simple_taxes.TaxSchedule(*self.ARGS)
+        built = []
+        construct = mutable._construct_bracket_from_two_points
+        mutable._construct_bracket_from_two_points = lambda *args: built.append(args) or construct(*args)
+        first = next(mutable.iter_curve(150000))
+        self.assertEqual(first, self.schedule.entire_curve[0])
+        self.assertEqual(len(built), 1)
+
+    def test_iter_curve_serves_saved_curves(self):
+        mutable = simple_taxes.TaxSchedule(*self.ARGS)
+        mutable.save_curve(150000)
+        mutable._construct_bracket_from_two_points = None
+        self.assertEqual(list(mutable.iter_curve()), mutable.entire_curve)
+        self.assertEqual(list(mutable.iter_curve(150000, include_capital=False)), mutable.income_only_curve)
+        with self.assertRaises(TypeError):
+            next(mutable.iter_curve(100000))
+
+    def test_additional_tax_reads_the_composed_function(self):
+        total = self.schedule.total_tax_function()
+        self.assertIs(self.schedule.total_tax_function(), total)
+        for amount in (0, 20000, 150000):
+            bracket = self.schedule._construct_bracket_from_one_point(amount)
+            self.assertAlmostEqual(self.schedule.additional_tax(amount), bracket.total_tax() - self.schedule.initial_tax.total_tax(), places=6)
+        self.assertIsNot(self.schedule.with_changes(pretax_wage_income=70000).total_tax_function(), total)
+        self.assertAlmostEqual(simple_taxes.TaxSchedule(*self.ARGS).additional_tax(150000), self.schedule.additional_tax(150000), places=6)
+
+    def test_with_changes_rebuilds_curves_lazily(self):
+        self.schedule.entire_curve
+        derived = self.schedule.with_changes(pretax_wage_income=70000)
+        self.assertNotIn('entire_curve', vars(derived))
+        self.assertEqual(derived.entire_curve, simple_taxes.FrozenTaxSchedule(70000, *self.ARGS[1:], 150000).entire_curve)
+
+    def test_shifted_stays_frozen(self):
+        shifted = self.schedule.shifted(1000, 100000)
+        self.assertIsInstance(shifted.entire_curve, tuple)
+        self.assertEqual(shifted.entire_curve, simple_taxes.FrozenTaxSchedule(51000, *self.ARGS[1:], 100000).entire_curve)
+        with self.assertRaises(AttributeError):
+            shifted.pretax_wage_income = 0
+
+
 if __name__ == '__main__':
     unittest.main()
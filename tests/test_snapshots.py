@@ -0,0 +1,84 @@
+import json
+import os
+import tempfile
+import unittest
+
+import bracket_data
+import snapshots
+import taxes
+
+
+class TestSnapshots(unittest.TestCase):
+    def setUp(self):
+        snapshots.warm(snapshots.scenarios())
+
+    def tearDown(self):
+        bracket_data.configure(None)
+        snapshots.wait()
+        snapshots.warm([])
+
+    def test_default_scenario_is_served_without_computing(self):
+        key = snapshots.artifact_key(snapshots.DEFAULT_INPUTS)
+        for name in ['schedule', 'recommendations', 'table']:
+            self.assertIsNotNone(snapshots.get(name, key, self.fail))
+        figure = snapshots.get('figure', (key, 35 / 100), self.fail)
+        self.assertEqual(len(figure.data), len(snapshots.get('figure', (key, .35), self.fail).data))
+
+    def test_matches_computed_outputs(self):
+        key = snapshots.artifact_key(snapshots.DEFAULT_INPUTS)
+        schedule_ = taxes.schedule(*snapshots.DEFAULT_INPUTS)
+        table = snapshots.get('table', key, self.fail)
+        self.assertTrue(table.equals(snapshots.table(schedule_)))
+        self.assertEqual(snapshots.get('recommendations', key, self.fail).explain(.35),
+                         snapshots.recommendations(schedule_).explain(.35))
+
+    def test_figures_are_copies(self):
+        key = (snapshots.artifact_key(snapshots.DEFAULT_INPUTS), .35)
+        snapshots.get('figure', key, self.fail).update_layout(showlegend=False)
+        self.assertIsNot(snapshots.get('figure', key, self.fail).layout.showlegend, False)
+
+    def test_other_inputs_are_computed(self):
+        inputs = snapshots.DEFAULT_INPUTS[:4] + (2025,) + snapshots.DEFAULT_INPUTS[5:]
+        self.assertEqual(snapshots.get('table', snapshots.artifact_key(inputs), lambda: 'computed'), 'computed')
+        self.assertEqual(snapshots.get('figure', (snapshots.artifact_key(snapshots.DEFAULT_INPUTS), .25), lambda: 'computed'), 'computed')
+
+    def test_variants_cover_every_year_and_status(self):
+        scenarios = snapshots.scenarios(variants=True)
+        self.assertEqual(scenarios[0], (snapshots.DEFAULT_INPUTS, snapshots.DEFAULT_FUTURE_RATE))
+        self.assertEqual({inputs[4:6] for inputs, rate in scenarios},
+                         {(year, status) for year in snapshots.YEARS for status in snapshots.STATUSES})
+
+    def test_latest_warm_wins(self):
+        inputs = snapshots.DEFAULT_INPUTS[:4] + (2025,) + snapshots.DEFAULT_INPUTS[5:]
+        first = snapshots.warm_in_background(snapshots.scenarios(variants=True))
+        snapshots.warm_in_background([(inputs, .35)])
+        snapshots.wait()
+        self.assertFalse(first.is_alive())
+        self.assertEqual(snapshots.stats()['artifacts'], 4)
+        self.assertIsNotNone(snapshots.get('table', snapshots.artifact_key(inputs), self.fail))
+        self.assertEqual(snapshots.get('table', snapshots.artifact_key(snapshots.DEFAULT_INPUTS), lambda: 'computed'), 'computed')
+
+    def test_warm_swaps_artifacts_at_once(self):
+        before = snapshots._artifacts
+        snapshots.warm(snapshots.scenarios())
+        self.assertIsNot(snapshots._artifacts, before)
+        self.assertEqual(len(before), 4)
+
+    def test_reloaded_brackets_are_not_served_stale(self):
+        old = snapshots.artifact_key(snapshots.DEFAULT_INPUTS)
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'brackets.json')
+            with open(path, 'w') as f:
+                json.dump({'federal': {'2024': {'married': [[.1, 30000], [.37, None]]}}}, f)
+            bracket_data.reload(path)
+        snapshots.wait()
+        key = snapshots.artifact_key(snapshots.DEFAULT_INPUTS)
+        self.assertNotEqual(key, old)
+        self.assertEqual(snapshots.get('table', old, lambda: 'computed'), 'computed')
+        # the same scenarios are precomputed again under the new brackets
+        table = snapshots.get('table', key, self.fail)
+        self.assertTrue(table.equals(snapshots.table(taxes.schedule(*snapshots.DEFAULT_INPUTS))))
+
+
+if __name__ == '__main__':
+    unittest.main()
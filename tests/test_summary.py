@@ -0,0 +1,62 @@
+import unittest
+
+import summary
+import taxes
+
+
+class TestNumericTable(unittest.TestCase):
+    def setUp(self):
+        schedule = taxes.schedule(100000, 750000, 20000, 40000, 2024, 'married', 'CA')
+        self.df = summary.table_numeric(schedule.entire_curve, schedule.pretax_wage_income, schedule.initial_tax)
+        self.formatted = summary.table2(schedule.entire_curve, schedule.pretax_wage_income, schedule.initial_tax)
+
+    def test_matches_formatted_table(self):
+        self.assertEqual(list(self.df.columns), list(self.formatted.columns))
+        self.assertEqual(self.formatted['Additional Tax'].iloc[1], f"${self.df['Additional Tax'].iloc[1]:,.2f}")
+        self.assertEqual(self.formatted['Marginal Tax Rate'].iloc[0], f"{100 * self.df['Marginal Tax Rate'].iloc[0]:.2f}%")
+
+    def test_paginate(self):
+        first = summary.paginate(self.df, 0, 4)
+        self.assertEqual(first['total_rows'], len(self.df))
+        self.assertEqual(first['pages'], -(-len(self.df) // 4))
+        self.assertEqual(len(first['rows']), 4)
+        self.assertEqual(first['formats'][first['columns'].index('Marginal Tax Rate')], 'percent')
+        self.assertEqual(first['formats'][first['columns'].index('Additional Tax')], 'currency')
+
+        last = summary.paginate(self.df, 100, 4)
+        self.assertEqual(last['page'], last['pages'] - 1)
+        self.assertEqual(len(last['rows']), len(self.df) - 4 * (last['pages'] - 1))
+
+    def test_sort(self):
+        page = summary.paginate(self.df, 0, 100, 'Additional Tax', descending=True)
+        column = [row[page['columns'].index('Additional Tax')] for row in page['rows']]
+        self.assertEqual(column, sorted(column, reverse=True))
+
+
+class TestRecommendationSteps(unittest.TestCase):
+    def test_matches_explain(self):
+        for inputs in [(100000, 750000, 20000, 40000, 2024, 'married', 'CA'), (20000, 50000, 0, 0, 2025, 'single', 'none'),
+                       (600000, 2000000, 100000, 50000, 2024, 'head', 'CA'), (50000, 0, 0, 0, 2024, 'married', 'CA')]:
+            schedule = taxes.schedule(*inputs)
+            steps = summary.RecommendationSteps(schedule, inputs[1])
+            rates = [percent / 100 for percent in range(101)] + steps.critical_rates()
+            for future_rate in rates:
+                self.assertEqual(steps.explain(future_rate), summary.explain(schedule, inputs[1], future_rate), future_rate)
+
+    def test_convert_everything_amount(self):
+        schedule = taxes.schedule(20000, 50000, 0, 0, 2024, 'single', 'none')
+        lines = summary.explain(schedule, 50000, .9)
+        self.assertEqual(lines[0], "Consider converting everything")
+        self.assertEqual(lines[2], f"You will owe an additional ${schedule.additional_tax(50000):,.0f} dollars")
+
+    def test_table(self):
+        schedule = taxes.schedule(100000, 750000, 20000, 40000, 2024, 'married', 'CA')
+        table = summary.RecommendationSteps(schedule, 750000).table()
+        self.assertEqual(len(table), 101)
+        self.assertEqual(table['Recommendation'].iloc[10], summary.LOW_FUTURE_RATE)
+        converting = table[table['Recommendation'] == summary.CONVERT]
+        self.assertTrue(converting['Conversion Amount'].is_monotonic_increasing)
+
+
+if __name__ == '__main__':
+    unittest.main()
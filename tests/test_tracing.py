@@ -0,0 +1,81 @@
+import os
+import tempfile
+import unittest
+
+import graph
+import summary
+import taxes
+import tracing
+
+
+class ListExporter:
+    def __init__(self):
+        self.records = []
+
+    def export(self, record):
+        self.records.append(record)
+
+
+class TestTracing(unittest.TestCase):
+    def tearDown(self):
+        tracing.configure()
+
+    def test_spans_for_a_scenario(self):
+        exporter = ListExporter()
+        tracing.configure(exporter=exporter)
+        schedule = taxes.schedule(100000, 750000, 20000, 40000, 2024, 'married', 'CA')
+        summary.explain(schedule, schedule.max_conversion_amount, .35)
+        summary.paginate(summary.table_numeric(schedule.entire_curve, schedule.pretax_wage_income, schedule.initial_tax))
+        graph.plot_tax_brackets(schedule.pretax_wage_income, schedule.qualified_capital_income, schedule.ordinary_capital_income,
+                                schedule.income_only_curve, schedule.capital_taxes, .35, schedule.max_conversion_amount)
+
+        by_name = {record['name']: record for record in exporter.records}
+        self.assertLessEqual({'taxes.schedule', 'TaxSchedule.save_curve', 'TaxSchedule.tax_curve', 'TaxSchedule.keypoints',
+                              'TaxSchedule.brackets', 'summary.explain', 'summary.table_numeric', 'summary.paginate', 'graph.plot_tax_brackets'}, set(by_name))
+        root = by_name['taxes.schedule']
+        self.assertIsNone(root['parent_id'])
+        self.assertEqual(root['attributes']['base_income'], 100000)
+        self.assertEqual(root['attributes']['state'], 'CA')
+        self.assertEqual(by_name['TaxSchedule.save_curve']['parent_id'], root['span_id'])
+        # frozen schedules build their curves on first use, outside taxes.schedule
+        self.assertEqual(by_name['TaxSchedule.brackets']['parent_id'], by_name['TaxSchedule.tax_curve']['span_id'])
+        self.assertEqual(by_name['TaxSchedule.brackets']['trace_id'], by_name['TaxSchedule.tax_curve']['trace_id'])
+        self.assertEqual(by_name['summary.explain']['attributes'], {'max_conversion': 750000, 'future_rate': .35})
+
+        report = tracing.analyze(exporter.records)
+        self.assertEqual(report['taxes.schedule']['count'], 1)
+        self.assertAlmostEqual(sum(stage['self_share'] for stage in report.values()), 1)
+        self.assertLessEqual(report['taxes.schedule']['self_ms'], report['taxes.schedule']['total_ms'])
+
+    def test_sampling_follows_root(self):
+        exporter = ListExporter()
+        tracing.configure(exporter=exporter, sample_rate=0)
+        taxes.schedule(100000, 750000, 20000, 40000, 2024, 'married', 'CA')
+        self.assertEqual(exporter.records, [])
+
+    def test_errors_are_recorded(self):
+        exporter = ListExporter()
+        tracing.configure(exporter=exporter)
+        with self.assertRaises(ValueError):
+            with tracing.span('failing'):
+                raise ValueError('boom')
+        self.assertIn('boom', exporter.records[0]['error'])
+
+    def test_rotating_exporter(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'traces.jsonl')
+            tracing.configure(path, max_bytes=2000, backups=2)
+            for _ in range(20):
+                with tracing.span('stage', amount=1.5):
+                    pass
+            tracing.configure()
+            self.assertTrue(os.path.exists(path + '.1'))
+            self.assertFalse(os.path.exists(path + '.3'))
+            self.assertLessEqual(os.path.getsize(path), 2000)
+            spans = tracing.read_spans([path, path + '.1'])
+            self.assertEqual({record['name'] for record in spans}, {'stage'})
+            self.assertIn('stage', tracing.format_report(tracing.analyze(spans)))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,247 @@
+"""
+Lightweight tracing spans for the hot paths, exported to a local rotating JSONL file.
+
+    with tracing.span("stage", income=100000):
+        ...
+
+    @tracing.traced("taxes.schedule")
+    def schedule(...):
+
+Tracing is off until configure() is called or IRACONVERT_TRACE_PATH is set, and then only
+a sample of root spans is recorded, their children follow the root's decision. Spans carry
+the scalar arguments of traced functions as attributes.
+
+    python tracing.py traces.jsonl [more.jsonl ...]
+
+prints the latency breakdown of every stage.
+"""
+import contextvars
+import functools
+import inspect
+import os
+import random
+import sys
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+
+import numpy as np
+import orjson
+
+DEFAULT_MAX_BYTES = 16 * 1024 * 1024
+DEFAULT_BACKUPS = 3
+
+_current = contextvars.ContextVar("span", default=None)
+
+
+class RotatingJsonlExporter:
+    """Append one JSON object per line, rolling the file over to .1, .2, ... once it is max_bytes."""
+    def __init__(self, path, max_bytes=DEFAULT_MAX_BYTES, backups=DEFAULT_BACKUPS):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.backups = backups
+        self._lock = threading.Lock()
+        self._file = open(path, "ab")
+
+    def _rotate(self):
+        self._file.close()
+        for idx in range(self.backups - 1, 0, -1):
+            if os.path.exists(f"{self.path}.{idx}"):
+                os.replace(f"{self.path}.{idx}", f"{self.path}.{idx + 1}")
+        if self.backups:
+            os.replace(self.path, f"{self.path}.1")
+        else:
+            os.remove(self.path)
+        self._file = open(self.path, "ab")
+
+    def export(self, record):
+        line = orjson.dumps(record, option=orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_APPEND_NEWLINE)
+        with self._lock:
+            if self._file.tell() + len(line) > self.max_bytes and self._file.tell():
+                self._rotate()
+            self._file.write(line)
+            self._file.flush()
+
+    def close(self):
+        with self._lock:
+            self._file.close()
+
+
+class _Span:
+    __slots__ = ("name", "trace_id", "span_id", "parent_id", "sampled", "attributes", "start")
+
+    def __init__(self, name, parent, sampled, attributes):
+        self.name = name
+        self.trace_id = parent.trace_id if parent else uuid.uuid4().hex
+        self.span_id = uuid.uuid4().hex[:16]
+        self.parent_id = parent.span_id if parent else None
+        self.sampled = sampled
+        self.attributes = attributes
+
+
+class Tracer:
+    def __init__(self, exporter, sample_rate=1.0):
+        self.exporter = exporter
+        self.sample_rate = sample_rate
+
+    @contextmanager
+    def span(self, name, **attributes):
+        parent = _current.get()
+        sampled = parent.sampled if parent else random.random() < self.sample_rate
+        if not sampled:
+            # unsampled traces still track the parent so children make the same decision
+            current = _Span(name, parent, False, None)
+            token = _current.set(current)
+            try:
+                yield current
+            finally:
+                _current.reset(token)
+            return
+
+        current = _Span(name, parent, True, attributes)
+        token = _current.set(current)
+        start = time.time()
+        start_counter = time.perf_counter()
+        error = None
+        try:
+            yield current
+        except BaseException as e:
+            error = repr(e)
+            raise
+        finally:
+            _current.reset(token)
+            self.exporter.export({
+                "name": name,
+                "trace_id": current.trace_id,
+                "span_id": current.span_id,
+                "parent_id": current.parent_id,
+                "start": start,
+                "duration_ms": (time.perf_counter() - start_counter) * 1000,
+                "attributes": current.attributes,
+                "error": error,
+            })
+
+
+TRACER = None
+
+
+def configure(path=None, sample_rate=1.0, max_bytes=DEFAULT_MAX_BYTES, backups=DEFAULT_BACKUPS, exporter=None):
+    """Start exporting spans to path, or to exporter. configure() with neither turns tracing off."""
+    global TRACER
+    if TRACER is not None and hasattr(TRACER.exporter, "close"):
+        TRACER.exporter.close()
+    if exporter is None and path:
+        exporter = RotatingJsonlExporter(path, max_bytes, backups)
+    TRACER = Tracer(exporter, sample_rate) if exporter is not None else None
+    return TRACER
+
+
+@contextmanager
+def _disabled():
+    yield None
+
+
+def span(name, **attributes):
+    if TRACER is None:
+        return _disabled()
+    return TRACER.span(name, **attributes)
+
+
+def set_attribute(key, value):
+    current = _current.get()
+    if current is not None and current.sampled:
+        current.attributes[key] = value
+
+
+def _scalar(value):
+    return value is None or isinstance(value, (bool, int, float, str))
+
+
+def _attributes(signature, args, kwargs):
+    try:
+        bound = signature.bind(*args, **kwargs)
+    except TypeError:
+        return {}
+    attributes = {}
+    for name, value in bound.arguments.items():
+        if _scalar(value):
+            attributes[name] = value
+        elif isinstance(value, tuple) and all(_scalar(item) for item in value):
+            attributes[name] = list(value)
+    return attributes
+
+
+def traced(name=None):
+    """Trace every call of the decorated function, with its scalar arguments as attributes."""
+    def decorator(fn):
+        span_name = name or fn.__qualname__
+        signature = inspect.signature(fn)
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if TRACER is None:
+                return fn(*args, **kwargs)
+            with TRACER.span(span_name, **_attributes(signature, args, kwargs)):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def read_spans(paths):
+    spans = []
+    for path in paths:
+        with open(path, "rb") as f:
+            spans += [orjson.loads(line) for line in f if line.strip()]
+    return spans
+
+
+def analyze(spans):
+    """
+    Latency of every stage: count, mean, p50, p95, max and total of both the wall time and
+    the self time, which excludes the time spent in child spans.
+    """
+    children = {}
+    for record in spans:
+        if record["parent_id"]:
+            children[record["parent_id"]] = children.get(record["parent_id"], 0) + record["duration_ms"]
+
+    stages = {}
+    for record in spans:
+        stage = stages.setdefault(record["name"], {"wall": [], "self": [], "errors": 0})
+        stage["wall"].append(record["duration_ms"])
+        stage["self"].append(record["duration_ms"] - children.get(record["span_id"], 0))
+        stage["errors"] += record["error"] is not None
+
+    total_self = sum(sum(stage["self"]) for stage in stages.values()) or 1
+    report = {}
+    for name, stage in stages.items():
+        wall, self_ = np.array(stage["wall"]), np.array(stage["self"])
+        report[name] = {
+            "count": len(wall),
+            "errors": stage["errors"],
+            "mean_ms": float(wall.mean()),
+            "p50_ms": float(np.percentile(wall, 50)),
+            "p95_ms": float(np.percentile(wall, 95)),
+            "max_ms": float(wall.max()),
+            "total_ms": float(wall.sum()),
+            "self_ms": float(self_.sum()),
+            "self_share": float(self_.sum() / total_self),
+        }
+    return dict(sorted(report.items(), key=lambda item: -item[1]["self_ms"]))
+
+
+def format_report(report):
+    lines = [f"{'stage':<40} {'count':>7} {'mean':>9} {'p50':>9} {'p95':>9} {'max':>9} {'self':>7}"]
+    for name, stage in report.items():
+        lines.append(f"{name:<40} {stage['count']:>7} {stage['mean_ms']:>8.2f}ms {stage['p50_ms']:>7.2f}ms "
+                     f"{stage['p95_ms']:>7.2f}ms {stage['max_ms']:>7.2f}ms {100 * stage['self_share']:>6.1f}%")
+    return "\n".join(lines)
+
+
+if os.environ.get("IRACONVERT_TRACE_PATH"):
+    configure(os.environ["IRACONVERT_TRACE_PATH"], float(os.environ.get("IRACONVERT_TRACE_SAMPLE", 1.0)))
+
+
+if __name__ == "__main__":
+    print(format_report(analyze(read_spans(sys.argv[1:]))))
@@ -0,0 +1,79 @@
+"""
+Numpy versions of the TaxSchedule tax functions, evaluated over arrays of incomes.
+Brackets are of the form [(rate, upper_bound), ...] like everywhere else.
+"""
+from dataclasses import dataclass
+from functools import lru_cache
+
+import numpy as np
+
+
+@dataclass(frozen=True)
+class CompiledBrackets:
+    rates: np.ndarray
+    # lower and upper bound of every bracket
+    lowers: np.ndarray
+    uppers: np.ndarray
+    # tax owed on all income below the lower bound of every bracket
+    base_tax: np.ndarray
+
+
+@lru_cache(maxsize=256)
+def _compile(brackets):
+    rates = np.array([rate for rate, bound in brackets], dtype=float)
+    uppers = np.array([bound for rate, bound in brackets], dtype=float)
+    lowers = np.concatenate([[0.0], uppers[:-1]])
+    base_tax = np.concatenate([[0.0], np.cumsum(rates[:-1] * (uppers[:-1] - lowers[:-1]))])
+    return CompiledBrackets(rates, lowers, uppers, base_tax)
+
+
+def compile_brackets(brackets):
+    if isinstance(brackets, CompiledBrackets):
+        return brackets
+    return _compile(tuple(tuple(bracket) for bracket in brackets))
+
+
+def income_tax(income, brackets):
+    """Same as TaxSchedule.apply_income_tax for an array of incomes."""
+    compiled = compile_brackets(brackets)
+    income = np.clip(np.asarray(income, dtype=float), 0, compiled.uppers[-1])
+    idx = np.minimum(np.searchsorted(compiled.uppers, income, side='left'), len(compiled.rates) - 1)
+    return compiled.base_tax[idx] + compiled.rates[idx] * (income - compiled.lowers[idx])
+
+
+def rate(income, brackets):
+    """Rate of the bracket income falls in, same as TaxSchedule.rate_at without the marginal rate."""
+    compiled = compile_brackets(brackets)
+    idx = np.searchsorted(compiled.uppers, np.asarray(income, dtype=float), side='right')
+    return compiled.rates[np.minimum(idx, len(compiled.rates) - 1)]
+
+
+def capital_tax(capital_income, bracket_income, brackets):
+    """Same as TaxSchedule.apply_capital_tax; incomes outside the brackets use the first or last rate."""
+    return rate(bracket_income, brackets) * capital_income
+
+
+def schedule_taxes(pretax_wage_income, ordinary_capital_income, qualified_capital_income,
+                   federal_brackets, state_brackets, nit_brackets, longterm_brackets,
+                   federal_deduction, state_deduction, conversion_amount, tax_function=None):
+    """
+    Federal, state, net investment and longterm taxes as computed by TaxSchedule,
+    broadcast over any array shaped inputs. tax_function replaces income_tax, eg with dense_tables.income_tax.
+    """
+    tax_function = tax_function or income_tax
+    # sums are associated the same way as TaxSchedule so results agree exactly at bracket bounds
+    ordinary_income = pretax_wage_income + ordinary_capital_income - federal_deduction
+    state_income = pretax_wage_income + ordinary_capital_income + qualified_capital_income - state_deduction + conversion_amount
+    capital_bracket_income = ordinary_income + qualified_capital_income + conversion_amount
+    ordinary_income = ordinary_income + conversion_amount
+    return {
+        'federal_tax': tax_function(ordinary_income, federal_brackets),
+        'state_tax': tax_function(state_income, state_brackets),
+        'nit_tax': capital_tax(ordinary_capital_income + qualified_capital_income, capital_bracket_income, nit_brackets),
+        'longterm_tax': capital_tax(qualified_capital_income, capital_bracket_income, longterm_brackets),
+        'income_rate': rate(ordinary_income, federal_brackets) + rate(state_income, state_brackets),
+    }
+
+
+def total_tax(taxes):
+    return taxes['federal_tax'] + taxes['state_tax'] + taxes['nit_tax'] + taxes['longterm_tax']